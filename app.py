@@ -1,8 +1,16 @@
-from flask import Flask, jsonify, send_from_directory, request
+from flask import Flask, Response, jsonify, send_from_directory, request
 from flask_cors import CORS
+from werkzeug.middleware.proxy_fix import ProxyFix
 from config import config
 from models import db
 from sqlalchemy import text
+from utils.auth import token_cache, get_password_pool
+from utils.db_pool import install_pool_metrics, pool_stats
+from utils.sqlite_profile import install_sqlite_pragmas
+from utils.replica import install_replica, replica_state
+from utils.metrics import install_request_metrics, render_prometheus
+from utils.profiler import install_profiler
+import hmac
 import os
 import ssl
 
@@ -10,6 +18,7 @@ import ssl
 from routes.student_routes import student_bp
 from routes.teacher_routes import teacher_bp
 from routes.attendance_routes import attendance_bp
+from routes.auth_routes import auth_bp
 
 
 def create_app(config_name='development'):
@@ -29,16 +38,29 @@ def create_app(config_name='development'):
                 response.headers['Expires'] = '0'
             return response
     
+    # Take the client address from X-Forwarded-For set by trusted reverse proxies (Render's router),
+    # so audit logs and proxy attendance detection see each student's own IP
+    if app.config.get('TRUSTED_PROXY_COUNT'):
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=app.config['TRUSTED_PROXY_COUNT'],
+                                x_proto=app.config['TRUSTED_PROXY_COUNT'])
+    
     # Enable CORS
     CORS(app, resources={r"/api/*": {"origins": "*"}})
     
     # Initialize database
     db.init_app(app)
+    with app.app_context():
+        install_sqlite_pragmas(db.engine)
+        install_pool_metrics(db.engine)
+    replica_engine = install_replica(app, db)
+    install_request_metrics(app, db)
+    install_profiler(app)
     
     # Register blueprints
     app.register_blueprint(student_bp, url_prefix='/api/student')
     app.register_blueprint(teacher_bp, url_prefix='/api/teacher')
     app.register_blueprint(attendance_bp, url_prefix='/api/attendance')
+    app.register_blueprint(auth_bp, url_prefix='/api/auth')
     
     # Health check endpoint
     @app.route('/api/health', methods=['GET'])
@@ -54,19 +76,41 @@ def create_app(config_name='development'):
             db_error = str(e)
         
         if db_status == 'connected':
-            return jsonify({
+            health = {
                 'status': 'healthy',
                 'message': 'API is running',
-                'database': 'connected'
-            }), 200
+                'database': 'connected',
+                'database_pool': pool_stats(db.engine),
+                'token_cache': token_cache.stats(),
+                'password_pool': get_password_pool().stats()
+            }
+            if replica_engine is not None:
+                health['database_replica'] = {**replica_state.stats(), 'pool': pool_stats(replica_engine)}
+            return jsonify(health), 200
         else:
             return jsonify({
                 'status': 'unhealthy',
                 'message': 'API is running but database is not accessible',
                 'database': 'disconnected',
+                'database_pool': pool_stats(db.engine),
                 'error': db_error
             }), 503
     
+    # Prometheus metrics endpoint
+    @app.route('/api/metrics', methods=['GET'])
+    def metrics():
+        """Request, SQL and pool metrics of all workers in Prometheus text format"""
+        if not app.config.get('METRICS_ENABLED', True):
+            return jsonify({'error': 'Metrics are disabled'}), 404
+        token = app.config.get('METRICS_TOKEN')
+        if not token:
+            # Only the development server serves metrics without a scrape token
+            if not app.debug:
+                return jsonify({'error': 'Resource not found'}), 404
+        elif not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+            return jsonify({'error': 'Unauthorized access'}), 401
+        return Response(render_prometheus(), mimetype='text/plain; version=0.0.4')
+    
     # Serve frontend pages
     @app.route('/')
     def index():
@@ -109,15 +153,7 @@ def create_ssl_context():
 try:
     config_name = os.getenv('FLASK_ENV', 'production')
     app = create_app(config_name)
-    
-    # Initialize database tables on startup
-    with app.app_context():
-        try:
-            db.create_all()
-            print("Database tables created successfully!")
-        except Exception as e:
-            print(f"Warning: Error creating tables: {e}")
-            print("App will continue without database initialization")
+    # No database work here: schema migrations run once per deploy through `python migrate.py`
 except Exception as e:
     print(f"FATAL ERROR: Failed to create app: {e}")
     import traceback
@@ -129,6 +165,18 @@ except Exception as e:
         return jsonify({'error': 'Application initialization failed', 'details': str(e)}), 500
 
 if __name__ == '__main__':
+    # The development server applies pending migrations itself
+    from utils.migrations import upgrade
+    with app.app_context():
+        try:
+            applied = upgrade()
+            if applied:
+                print(f"Applied database migrations: {', '.join(applied)}")
+            print("Database schema is up to date!")
+        except Exception as e:
+            print(f"Warning: Error creating tables: {e}")
+            print("App will continue without database initialization")
+    
     # Check if SSL is enabled
     ssl_enabled = app.config.get('SSL_ENABLED', False)
     ssl_context = None
@@ -0,0 +1,22 @@
+"""Archive old audit logs - Run daily (e.g. from cron) to keep audit_logs small"""
+import argparse
+from app import create_app
+from config import Config
+from utils.audit_archive import archive_closed_buckets
+
+parser = argparse.ArgumentParser(description='Move audit logs older than the retention window into compressed archives')
+parser.add_argument('--retention-days', type=int, default=Config.AUDIT_RETENTION_DAYS,
+                    help=f'Days of audit logs kept in the database (default: {Config.AUDIT_RETENTION_DAYS})')
+args = parser.parse_args()
+
+app = create_app()
+
+with app.app_context():
+    archived = archive_closed_buckets(args.retention_days)
+    
+    if not archived:
+        print("Nothing to archive.")
+    else:
+        print(f"Archived {sum(archived.values())} audit log rows to {Config.AUDIT_ARCHIVE_DIR}")
+        for bucket, count in archived.items():
+            print(f"   - {bucket}: {count} rows")
@@ -0,0 +1,311 @@
+"""
+Synthetic Dataset Generator
+Fills a database with a production-sized term so the benchmarks and reports
+run against realistic volumes: branches x semesters x divisions of students,
+teachers, a timetable of sessions over the term, attendance at a per-student
+rate spread around --attendance-rate (so some students are defaulters) and
+the audit trail those sessions leave under the default AUDIT_SAMPLING policy
+(QR rotations, per-minute scan aggregates, attendance marks, failed scans).
+
+Rows are written with multi-row INSERTs in batches; the default size (about
+3,800 students and 2.4 million rows) takes about a minute on SQLite or a local
+PostgreSQL. Generated IDs start with --prefix, and every account gets the
+password given by --password.
+
+Usage:
+    python benchmarks/generate_dataset.py [--database sqlite:////tmp/bench.db] [--reset]
+        [--branches 4] [--semesters 8] [--divisions 2] [--students 60] [--teachers 10]
+        [--subjects 5] [--lectures 3] [--weeks 16] [--attendance-rate 0.8] [--seed 42]
+"""
+import os
+import sys
+import json
+import time
+import random
+import hashlib
+import argparse
+from datetime import date, datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+BRANCHES = [('Computer Science', 'CS'), ('Information Technology', 'IT'), ('Electronics', 'EC'),
+            ('Mechanical', 'ME'), ('Civil', 'CE'), ('Electrical', 'EE')]
+FIRST_NAMES = [('Rahul', 'Male'), ('Priya', 'Female'), ('Arjun', 'Male'), ('Ananya', 'Female'),
+               ('Vikram', 'Male'), ('Sneha', 'Female'), ('Rohan', 'Male'), ('Kavya', 'Female'),
+               ('Aditya', 'Male'), ('Ishita', 'Female'), ('Karan', 'Male'), ('Meera', 'Female'),
+               ('Siddharth', 'Male'), ('Pooja', 'Female'), ('Nikhil', 'Male'), ('Divya', 'Female')]
+LAST_NAMES = ['Sharma', 'Patel', 'Kumar', 'Singh', 'Mehta', 'Gupta', 'Reddy', 'Iyer',
+              'Nair', 'Joshi', 'Desai', 'Verma', 'Rao', 'Chopra', 'Kulkarni', 'Bose']
+USER_AGENTS = [
+    'Mozilla/5.0 (Linux; Android 14; SM-A546E) AppleWebKit/537.36 (KHTML, like Gecko) '
+    'Chrome/124.0.0.0 Mobile Safari/537.36',
+    'Mozilla/5.0 (Linux; Android 13; Redmi Note 12) AppleWebKit/537.36 (KHTML, like Gecko) '
+    'Chrome/123.0.0.0 Mobile Safari/537.36',
+    'Mozilla/5.0 (iPhone; CPU iPhone OS 17_4 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) '
+    'Version/17.4 Mobile/15E148 Safari/604.1',
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) '
+    'Chrome/124.0.0.0 Safari/537.36',
+]
+SLOTS_PER_WEEK = 5 * 8                  # Monday-Friday, 9:00-17:00, one-hour lectures
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Generate a synthetic term of attendance data')
+    parser.add_argument('--database', help='Database URL (default: DATABASE_URL / the configured database)')
+    parser.add_argument('--reset', action='store_true', help='Drop and recreate all tables first')
+    parser.add_argument('--branches', type=int, default=4, help='Branches')
+    parser.add_argument('--semesters', type=int, default=8, help='Semesters per branch')
+    parser.add_argument('--divisions', type=int, default=2, help='Divisions per semester')
+    parser.add_argument('--students', type=int, default=60, help='Students per division')
+    parser.add_argument('--teachers', type=int, default=10, help='Teachers per branch')
+    parser.add_argument('--subjects', type=int, default=5, help='Subjects per semester')
+    parser.add_argument('--lectures', type=int, default=3, help='Lectures per subject per week')
+    parser.add_argument('--weeks', type=int, default=16, help='Weeks of term, ending last week')
+    parser.add_argument('--attendance-rate', type=float, default=0.8, help='Mean attendance rate')
+    parser.add_argument('--failure-rate', type=float, default=0.02, help='Share of scans that fail (expired QR)')
+    parser.add_argument('--scan-window', type=int, default=5, help='Minutes the QR is shown per lecture')
+    parser.add_argument('--batch-size', type=int, default=5000, help='Rows per INSERT')
+    parser.add_argument('--prefix', default='GEN', help='Prefix of generated student and teacher IDs')
+    parser.add_argument('--password', default='student123', help='Password of every generated account')
+    parser.add_argument('--seed', type=int, default=42, help='Random seed (same seed, same data)')
+    args = parser.parse_args()
+
+    if args.subjects * args.lectures > SLOTS_PER_WEEK:
+        parser.error(f'--subjects x --lectures must fit the {SLOTS_PER_WEEK} weekly slots')
+    if not 0 < args.attendance_rate < 1:
+        parser.error('--attendance-rate must be between 0 and 1')
+    return args
+
+
+class BulkWriter:
+    """Buffers rows per table and writes each full buffer as one multi-row INSERT"""
+
+    def __init__(self, db, batch_size):
+        self.db = db
+        self.batch_size = batch_size
+        self.buffers = {}
+        self.counts = {}
+
+    def add(self, model, row):
+        buffer = self.buffers.setdefault(model.__table__, [])
+        buffer.append(row)
+        if len(buffer) >= self.batch_size:
+            self.flush(model.__table__)
+
+    def flush(self, table=None):
+        for table in ([table] if table is not None else list(self.buffers)):
+            rows = self.buffers.get(table)
+            if rows:
+                self.db.session.execute(table.insert(), rows)
+                self.db.session.commit()
+                self.counts[table.name] = self.counts.get(table.name, 0) + len(rows)
+                self.buffers[table] = []
+
+
+def term_start(weeks):
+    """Monday `weeks` weeks before the current week"""
+    today = date.today()
+    return today - timedelta(days=today.weekday(), weeks=weeks)
+
+
+def generate(args, db, models, password_hash):
+    Student, Teacher, Session, Attendance, AuditLog, UserAgent, WiFiNetwork = models
+    rng = random.Random(args.seed)
+    writer = BulkWriter(db, args.batch_size)
+    prefix = args.prefix
+    start_monday = term_start(args.weeks)
+    now = datetime.utcnow()
+
+    for user_agent in USER_AGENTS:
+        if not UserAgent.query.filter_by(user_agent=user_agent).first():
+            db.session.add(UserAgent(ua_hash=hashlib.sha256(user_agent.encode('utf-8')).hexdigest(),
+                                     user_agent=user_agent))
+    db.session.commit()
+    user_agent_ids = [row.id for row in UserAgent.query.filter(UserAgent.user_agent.in_(USER_AGENTS))]
+
+    for b in range(args.branches):
+        branch, code = BRANCHES[b] if b < len(BRANCHES) else (f'Branch {b + 1}', f'B{b + 1}')
+        branch_started = time.perf_counter()
+
+        # Teachers and the branch's classroom network
+        teacher_codes = [f'{prefix}T{code}{t + 1:03d}' for t in range(args.teachers)]
+        for teacher_id in teacher_codes:
+            first, gender = rng.choice(FIRST_NAMES)
+            writer.add(Teacher, {
+                'teacher_id': teacher_id, 'email': f'{teacher_id.lower()}@college.edu',
+                'password_hash': password_hash, 'full_name': f'Dr. {first} {rng.choice(LAST_NAMES)}',
+                'branch': branch, 'designation': rng.choice(['Professor', 'Associate Professor',
+                                                             'Assistant Professor']),
+                'phone': f'9{rng.randrange(10 ** 9):09d}', 'gender': gender,
+                'joining_date': date(rng.randint(2005, 2022), 7, 1), 'experience_years': rng.randint(1, 25)
+            })
+        writer.flush(Teacher.__table__)
+        teacher_ids = [pk for pk, in db.session.query(Teacher.id).filter(
+            Teacher.teacher_id.in_(teacher_codes)).order_by(Teacher.teacher_id)]
+        writer.add(WiFiNetwork, {'ssid': f'{prefix}-{code}-Campus', 'location': f'{branch} Block',
+                                 'branch': branch, 'created_by': teacher_ids[0]})
+
+        for semester in range(1, args.semesters + 1):
+            subjects = [(f'{code}{semester}{n + 1:02d}',
+                         teacher_ids[(semester * args.subjects + n) % len(teacher_ids)])
+                        for n in range(args.subjects)]
+            for d in range(args.divisions):
+                division = f'Division {chr(65 + d % 26)}'
+                class_prefix = f'{prefix}{code}{semester}{chr(65 + d % 26)}'
+
+                # Students, each with their own attendance propensity
+                student_codes = [f'{class_prefix}{n + 1:03d}' for n in range(args.students)]
+                for student_id in student_codes:
+                    first, gender = rng.choice(FIRST_NAMES)
+                    total_fee = 50000
+                    paid_fee = rng.choice([total_fee, total_fee, total_fee, 30000, 0])
+                    writer.add(Student, {
+                        'student_id': student_id, 'email': f'{student_id.lower()}@students.college.edu',
+                        'password_hash': password_hash, 'full_name': f'{first} {rng.choice(LAST_NAMES)}',
+                        'branch': branch, 'semester': semester, 'year': now.year, 'division': division,
+                        'phone': f'9{rng.randrange(10 ** 9):09d}', 'gender': gender,
+                        'admission_date': date(now.year - (semester - 1) // 2, 8, 1),
+                        'fee_status': 'Paid' if paid_fee == total_fee else ('Partial' if paid_fee else 'Pending'),
+                        'total_fee': total_fee, 'paid_fee': paid_fee, 'backlogs': rng.choice([0, 0, 0, 1, 2]),
+                        'cgpa': round(rng.uniform(5.5, 9.8), 2)
+                    })
+                writer.flush(Student.__table__)
+                students = db.session.query(Student.id).filter(
+                    Student.student_id.in_(student_codes)).order_by(Student.student_id).all()
+                concentration = 8
+                propensity = {pk: rng.betavariate(args.attendance_rate * concentration,
+                                                  (1 - args.attendance_rate) * concentration)
+                              for pk, in students}
+
+                # The division's weekly timetable, repeated over the term
+                slots = rng.sample(range(SLOTS_PER_WEEK), args.subjects * args.lectures)
+                lectures = []
+                for week in range(args.weeks):
+                    for index, slot in enumerate(slots):
+                        subject, teacher_pk = subjects[index % args.subjects]
+                        day = start_monday + timedelta(weeks=week, days=slot // 8)
+                        started_at = datetime.combine(day, datetime.min.time()) + timedelta(hours=9 + slot % 8)
+                        turnout = rng.uniform(0.9, 1.1)     # some lectures are just emptier
+                        present = [pk for pk, in students if rng.random() < propensity[pk] * turnout]
+                        lectures.append((f'SES{day:%Y%m%d}{class_prefix}{week:02d}{index:02d}', subject,
+                                         teacher_pk, started_at, present))
+
+                for session_id, subject, teacher_pk, started_at, present in lectures:
+                    last_qr = started_at + timedelta(minutes=args.scan_window)
+                    writer.add(Session, {
+                        'session_id': session_id, 'teacher_id': teacher_pk, 'subject': subject,
+                        'branch': branch, 'semester': semester, 'division': division,
+                        'session_date': started_at.date(), 'start_time': started_at.time(),
+                        'end_time': (started_at + timedelta(hours=1)).time(), 'qr_token': None,
+                        'token_generated_at': last_qr, 'token_expires_at': last_qr + timedelta(seconds=6),
+                        'is_active': False, 'total_students': len(students), 'present_count': len(present),
+                        'created_at': started_at
+                    })
+                writer.flush(Session.__table__)
+                session_pks = dict(db.session.query(Session.session_id, Session.id).filter(
+                    Session.session_id.in_([lecture[0] for lecture in lectures])))
+
+                for session_id, subject, teacher_pk, started_at, present in lectures:
+                    session_pk = session_pks[session_id]
+                    write_lecture(writer, rng, args, models, session_pk, teacher_pk, started_at, present,
+                                  user_agent_ids, b)
+
+        writer.flush()
+        print(f"   {branch}: {args.semesters * args.divisions * args.students} students in "
+              f"{time.perf_counter() - branch_started:.1f}s")
+
+    writer.flush()
+    return writer.counts
+
+
+def write_lecture(writer, rng, args, models, session_pk, teacher_pk, started_at, present, user_agent_ids, b):
+    """Attendance rows and the audit trail of one lecture"""
+    _, _, _, Attendance, AuditLog, _, _ = models
+
+    def audit(event_type, created_at, user_id=None, user_type='student', details=None, success=True,
+              failure_reason=None, event_count=1, ip_address=None, user_agent_id=None):
+        writer.add(AuditLog, {
+            'event_type': event_type, 'user_id': user_id, 'user_type': user_type, 'session_id': session_pk,
+            'details': json.dumps(details) if details else None, 'ip_address': ip_address,
+            'user_agent_id': user_agent_id, 'success': success, 'failure_reason': failure_reason,
+            'event_count': event_count, 'created_at': created_at
+        })
+
+    # The QR is regenerated every QR_TOKEN_EXPIRY (6s) while it is shown
+    for tick in range(0, args.scan_window * 60, 6):
+        generated_at = started_at + timedelta(seconds=tick)
+        audit('QR_GENERATED', generated_at, teacher_pk, 'teacher', details={
+            'qr_token': f'{rng.getrandbits(64):016x}...',
+            'expires_at': (generated_at + timedelta(seconds=6)).isoformat(),
+            'generated_at': generated_at.isoformat()})
+
+    scans_per_minute = {}
+    for student_pk in present:
+        marked_at = started_at + timedelta(seconds=min(rng.expovariate(1 / 90), args.scan_window * 60 - 1))
+        ip_address = f'10.{b}.{rng.randrange(256)}.{rng.randrange(1, 255)}'
+        user_agent_id = rng.choice(user_agent_ids)
+
+        if rng.random() < args.failure_rate:
+            # A stale QR first; the retry succeeds
+            audit('QR_SCANNED', marked_at, student_pk, details={'qr_data_received': True,
+                                                                'scan_time': marked_at.isoformat()},
+                  success=False, failure_reason='QR code has expired', ip_address=ip_address,
+                  user_agent_id=user_agent_id)
+            marked_at += timedelta(seconds=rng.randint(3, 15))
+
+        minute = marked_at.replace(second=0, microsecond=0)
+        bucket = scans_per_minute.setdefault(minute, [0, marked_at])
+        bucket[0] += 1
+        bucket[1] = max(bucket[1], marked_at)
+
+        writer.add(Attendance, {'student_id': student_pk, 'session_id': session_pk, 'teacher_id': teacher_pk,
+                                'marked_at': marked_at, 'status': 'Present', 'ip_address': ip_address})
+        audit('ATTENDANCE_MARKED', marked_at, student_pk, details={'marked_at': marked_at.isoformat(),
+                                                                   'attendance_status': 'Present'},
+              ip_address=ip_address, user_agent_id=user_agent_id)
+
+    # Successful scans and WiFi checks are aggregated per minute (AUDIT_SAMPLING default)
+    for minute, (count, last_at) in sorted(scans_per_minute.items()):
+        details = {'aggregated': True, 'window_start': minute.isoformat(),
+                   'window_end': (minute + timedelta(minutes=1)).isoformat(), 'distinct_users': count}
+        for event_type in ('QR_SCANNED', 'WIFI_VERIFIED'):
+            audit(event_type, last_at, details=details, event_count=count)
+
+
+def main():
+    args = parse_args()
+    if args.database:
+        os.environ['DATABASE_URL'] = args.database
+    os.environ.setdefault('METRICS_ENABLED', 'false')   # no per-statement timing or slow-query output
+
+    from app import create_app
+    from models import db, Student, Teacher, Session, Attendance, AuditLog, UserAgent, WiFiNetwork
+    from utils.auth import hash_password
+    from utils.migrations import upgrade
+
+    app = create_app()
+    with app.app_context():
+        print(f"Database: {db.engine.url.render_as_string(hide_password=True)}")
+        if args.reset:
+            db.drop_all()
+        upgrade()
+
+        if Student.query.filter(Student.student_id.like(f'{args.prefix}%')).first():
+            print(f"Students with the prefix '{args.prefix}' already exist; use --reset or another --prefix")
+            sys.exit(1)
+
+        started = time.perf_counter()
+        counts = generate(args, db, (Student, Teacher, Session, Attendance, AuditLog, UserAgent, WiFiNetwork),
+                          hash_password(args.password))
+        elapsed = time.perf_counter() - started
+
+    total = sum(counts.values())
+    print(f"[OK] {total:,} rows in {elapsed:.1f}s ({total / elapsed:,.0f} rows/s)")
+    for table, count in sorted(counts.items(), key=lambda item: -item[1]):
+        print(f"   {table:<16} {count:>12,}")
+    print(f"\nEvery generated account has the password '{args.password}'")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,161 @@
+"""
+SQLite Profile Benchmark
+Simulates concurrent attendance scans from several gunicorn workers against
+a SQLite file, once with SQLite's default settings and once with the
+production profile from utils/sqlite_profile.py, and reports throughput,
+latency and "database is locked" failures for each.
+
+Usage:
+    python benchmarks/sqlite_profile.py [--workers 2] [--scans 500] [--readers 1]
+"""
+import os
+import sys
+import time
+import argparse
+import shutil
+import tempfile
+import multiprocessing
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.sqlite_profile import install_sqlite_pragmas, sqlite_pragmas, current_pragmas  # noqa: E402
+
+
+SCHEMA = [
+    'CREATE TABLE attendance (id INTEGER PRIMARY KEY, session_id INTEGER NOT NULL, '
+    'student_id INTEGER NOT NULL, status TEXT NOT NULL, marked_at REAL NOT NULL, '
+    'UNIQUE (session_id, student_id))',
+    'CREATE INDEX idx_attendance_session_status ON attendance (session_id, status)',
+]
+
+
+def make_engine(path, profile):
+    engine = create_engine(f'sqlite:///{path}')
+    install_sqlite_pragmas(engine, sqlite_pragmas(profile))
+    return engine
+
+
+def scan_worker(path, profile, worker_id, scans, results):
+    """Mark attendance like /api/attendance/mark: duplicate check, insert, commit"""
+    engine = make_engine(path, profile)
+    latencies, locked = [], 0
+    for i in range(scans):
+        student_id = worker_id * scans + i
+        started = time.perf_counter()
+        try:
+            with engine.begin() as connection:
+                exists = connection.execute(
+                    text('SELECT 1 FROM attendance WHERE session_id = 1 AND student_id = :sid'),
+                    {'sid': student_id}).first()
+                if exists is None:
+                    connection.execute(
+                        text("INSERT INTO attendance (session_id, student_id, status, marked_at) "
+                             "VALUES (1, :sid, 'Present', :ts)"),
+                        {'sid': student_id, 'ts': time.time()})
+        except OperationalError as e:
+            if 'locked' not in str(e):
+                raise
+            locked += 1
+            continue
+        latencies.append(time.perf_counter() - started)
+    engine.dispose()
+    results.put(('scan', latencies, locked))
+
+
+def stats_reader(path, profile, stop, results):
+    """Poll the present count like the live session view on the teacher dashboard"""
+    engine = make_engine(path, profile)
+    reads, locked = 0, 0
+    while not stop.is_set():
+        try:
+            with engine.connect() as connection:
+                connection.execute(text(
+                    "SELECT COUNT(*) FROM attendance WHERE session_id = 1 AND status = 'Present'")).scalar()
+            reads += 1
+        except OperationalError as e:
+            if 'locked' not in str(e):
+                raise
+            locked += 1
+        time.sleep(0.005)
+    engine.dispose()
+    results.put(('read', reads, locked))
+
+
+def run(profile, workers, scans, readers):
+    directory = tempfile.mkdtemp(prefix='sqlite-bench-')
+    path = os.path.join(directory, 'attendance.db')
+
+    engine = make_engine(path, profile)
+    with engine.begin() as connection:
+        for statement in SCHEMA:
+            connection.execute(text(statement))
+    pragmas = current_pragmas(engine)
+    engine.dispose()
+
+    results = multiprocessing.Queue()
+    stop = multiprocessing.Event()
+    reader_procs = [multiprocessing.Process(target=stats_reader, args=(path, profile, stop, results))
+                    for _ in range(readers)]
+    scan_procs = [multiprocessing.Process(target=scan_worker, args=(path, profile, w, scans, results))
+                  for w in range(workers)]
+
+    for proc in reader_procs:
+        proc.start()
+    started = time.perf_counter()
+    for proc in scan_procs:
+        proc.start()
+
+    latencies, scan_locked, reads, read_locked = [], 0, 0, 0
+    for _ in scan_procs:
+        _, worker_latencies, locked = results.get()
+        latencies.extend(worker_latencies)
+        scan_locked += locked
+    elapsed = time.perf_counter() - started
+    stop.set()
+    for _ in reader_procs:
+        _, count, locked = results.get()
+        reads += count
+        read_locked += locked
+    for proc in scan_procs + reader_procs:
+        proc.join()
+
+    shutil.rmtree(directory, ignore_errors=True)
+
+    latencies.sort()
+    return {
+        'profile': profile,
+        'journal_mode': pragmas['journal_mode'],
+        'synchronous': pragmas['synchronous'],
+        'scans': len(latencies),
+        'locked': scan_locked,
+        'scans_per_sec': len(latencies) / elapsed if elapsed else 0,
+        'p50_ms': latencies[len(latencies) // 2] * 1000 if latencies else 0,
+        'p99_ms': latencies[int(len(latencies) * 0.99)] * 1000 if latencies else 0,
+        'reads_per_sec': reads / elapsed if elapsed else 0,
+        'read_locked': read_locked,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare the default and production SQLite profiles')
+    parser.add_argument('--workers', type=int, default=2, help='Concurrent scan processes (gunicorn workers)')
+    parser.add_argument('--scans', type=int, default=500, help='Scans per worker')
+    parser.add_argument('--readers', type=int, default=1, help='Concurrent dashboard readers')
+    args = parser.parse_args()
+
+    print(f"{args.workers} workers x {args.scans} scans, {args.readers} reader(s)\n")
+    header = f"{'profile':<12}{'journal':<9}{'sync':<6}{'scans/s':>10}{'p50 ms':>9}{'p99 ms':>9}" \
+             f"{'locked':>8}{'reads/s':>10}{'r-locked':>10}"
+    print(header)
+    print('-' * len(header))
+    for profile in ('default', 'production'):
+        r = run(profile, args.workers, args.scans, args.readers)
+        print(f"{r['profile']:<12}{r['journal_mode']:<9}{r['synchronous']:<6}{r['scans_per_sec']:>10.1f}"
+              f"{r['p50_ms']:>9.2f}{r['p99_ms']:>9.2f}{r['locked']:>8}{r['reads_per_sec']:>10.1f}"
+              f"{r['read_locked']:>10}")
+
+
+if __name__ == '__main__':
+    main()
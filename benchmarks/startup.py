@@ -0,0 +1,98 @@
+"""
+Worker Startup Benchmark
+Boots the app in fresh interpreters, the way a gunicorn worker or an
+autoscaled dyno does, and reports how long `import app` and the first
+request take, plus whether importing opened a database connection.
+
+Usage:
+    python benchmarks/startup.py [--runs 5] [--path /api/health] [--budget 1.0]
+"""
+import os
+import sys
+import json
+import shutil
+import argparse
+import tempfile
+import subprocess
+import statistics
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Runs in a fresh interpreter; prints one JSON line of timings
+CHILD = """
+import json, sys, time
+started = time.perf_counter()
+import app as app_module
+imported = time.perf_counter()
+
+from models import db
+app = app_module.app
+with app.app_context():
+    connections_at_import = db.engine.pool_metrics.connections_opened
+heavy = sorted(name for name in ('qrcode', 'PIL', 'numpy') if name in sys.modules)
+
+client = app.test_client()
+before = time.perf_counter()
+status = client.get(sys.argv[1]).status_code
+first = time.perf_counter()
+client.get(sys.argv[1])
+second = time.perf_counter()
+
+print(json.dumps({
+    'import': imported - started,
+    'first_request': first - before,
+    'second_request': second - first,
+    'status': status,
+    'connections_at_import': connections_at_import,
+    'heavy_modules': heavy
+}))
+"""
+
+
+def boot(path, env):
+    result = subprocess.run([sys.executable, '-c', CHILD, path], cwd=ROOT, env=env,
+                            capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure worker import time and first-request latency')
+    parser.add_argument('--runs', type=int, default=5, help='Fresh interpreters to boot')
+    parser.add_argument('--path', default='/api/health', help='Endpoint for the first request')
+    parser.add_argument('--budget', type=float, default=1.0,
+                        help='Fail if median import + first request exceeds this many seconds')
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    directory = None
+    if 'DATABASE_URL' not in env:
+        # Migrated throwaway SQLite database, so the first request hits real tables
+        directory = tempfile.mkdtemp(prefix='startup-bench-')
+        env['DATABASE_URL'] = f"sqlite:///{os.path.join(directory, 'attendance.db')}"
+        subprocess.run([sys.executable, 'migrate.py'], cwd=ROOT, env=env, capture_output=True, check=True)
+
+    try:
+        runs = [boot(args.path, env) for _ in range(args.runs)]
+    finally:
+        if directory:
+            shutil.rmtree(directory, ignore_errors=True)
+
+    def median_ms(key):
+        return statistics.median(run[key] for run in runs) * 1000
+
+    total = statistics.median(run['import'] + run['first_request'] for run in runs)
+    print(f"{args.runs} fresh interpreters, first request GET {args.path} -> {runs[0]['status']}")
+    print(f"   import app          {median_ms('import'):8.1f} ms (median)")
+    print(f"   first request       {median_ms('first_request'):8.1f} ms")
+    print(f"   second request      {median_ms('second_request'):8.1f} ms")
+    print(f"   import + first      {total * 1000:8.1f} ms (budget {args.budget * 1000:.0f} ms)")
+    print(f"   DB connections at import: {max(run['connections_at_import'] for run in runs)}")
+    print(f"   heavy modules loaded: {', '.join(runs[0]['heavy_modules']) or 'none'}")
+
+    if total > args.budget:
+        print("Startup is over budget")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -4,6 +4,34 @@ from dotenv import load_dotenv
 load_dotenv()
 
 
+def engine_options(database_uri):
+    """
+    SQLAlchemy engine/pool options for the database backend, overridable through env
+    
+    Server databases get a sized pool with pre-ping and recycling, so connections
+    dropped by the server while idle (e.g. managed Postgres on Render) are replaced
+    before use instead of failing the first request. SQLite keeps the defaults.
+    """
+    backend = database_uri.split(':', 1)[0].split('+', 1)[0]
+    if backend == 'sqlite':
+        return {}
+    
+    options = {
+        'pool_size': int(os.getenv('DB_POOL_SIZE', 5)),
+        'max_overflow': int(os.getenv('DB_MAX_OVERFLOW', 5)),
+        'pool_timeout': int(os.getenv('DB_POOL_TIMEOUT', 10)),  # seconds to wait for a free connection
+        'pool_pre_ping': os.getenv('DB_POOL_PRE_PING', 'true').lower() == 'true',
+        # Below the server's idle timeout (Render Postgres ~5 min, MySQL wait_timeout)
+        'pool_recycle': int(os.getenv('DB_POOL_RECYCLE', 280 if backend == 'postgresql' else 3600))
+    }
+    connect_timeout = int(os.getenv('DB_CONNECT_TIMEOUT', 10))
+    if backend == 'postgresql':
+        options['connect_args'] = {'connect_timeout': connect_timeout}
+    elif backend == 'mysql':
+        options['connect_args'] = {'connection_timeout': connect_timeout}
+    return options
+
+
 class Config:
     """Base configuration"""
     SECRET_KEY = os.getenv('SECRET_KEY', 'dev-secret-key-change-in-production')
@@ -31,12 +59,113 @@ class Config:
         # For SQLite (development/testing)
         SQLALCHEMY_DATABASE_URI = 'sqlite:///attendance.db'
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    SQLALCHEMY_ENGINE_OPTIONS = engine_options(SQLALCHEMY_DATABASE_URI)
+    
+    # Optional read replica for reports, dashboards and audit logs (see utils/replica.py)
+    _replica_url = os.getenv('DATABASE_REPLICA_URL')
+    if _replica_url and _replica_url.startswith('postgres://'):
+        _replica_url = _replica_url.replace('postgres://', 'postgresql://', 1)
+    DATABASE_REPLICA_URL = _replica_url
+    SQLALCHEMY_BINDS = {'replica': {'url': _replica_url, **engine_options(_replica_url)}} if _replica_url else {}
+    REPLICA_READ_YOUR_WRITES_SECONDS = int(os.getenv('REPLICA_READ_YOUR_WRITES_SECONDS', 10))  # > replica lag
+    REPLICA_RETRY_SECONDS = int(os.getenv('REPLICA_RETRY_SECONDS', 30))  # primary-only after a replica failure
+    
+    # SQLite profile: 'production' (WAL and tuned PRAGMAs, see utils/sqlite_profile.py) or 'default'
+    SQLITE_PROFILE = os.getenv('SQLITE_PROFILE', 'production').lower()
+    SQLITE_JOURNAL_MODE = os.getenv('SQLITE_JOURNAL_MODE', 'WAL')
+    SQLITE_SYNCHRONOUS = os.getenv('SQLITE_SYNCHRONOUS', 'NORMAL')
+    SQLITE_BUSY_TIMEOUT_MS = int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', 5000))
+    SQLITE_MMAP_SIZE = int(os.getenv('SQLITE_MMAP_SIZE', 256 * 1024 * 1024))
+    SQLITE_CACHE_SIZE_KB = int(os.getenv('SQLITE_CACHE_SIZE_KB', 64 * 1024))
     
     # QR Code settings
     QR_TOKEN_EXPIRY = int(os.getenv('QR_TOKEN_EXPIRY', 6))  # seconds
     
+    # Defaulter detection settings
+    DEFAULTER_THRESHOLD = float(os.getenv('DEFAULTER_THRESHOLD', 75))  # percent
+    DEFAULTER_CACHE_MINUTES = int(os.getenv('DEFAULTER_CACHE_MINUTES', 60))  # reuse stored results for this long
+    
+    # Background report job settings
+    REPORT_JOBS_DIR = os.getenv('REPORT_JOBS_DIR', os.path.join(os.getcwd(), 'report_jobs'))
+    REPORT_JOB_WORKERS = int(os.getenv('REPORT_JOB_WORKERS', 1))  # processes per web worker
+    REPORT_JOB_RETENTION_HOURS = int(os.getenv('REPORT_JOB_RETENTION_HOURS', 24))
+    # Larger /report and /matrix requests are queued as background jobs (202) instead of built inline
+    REPORT_SYNC_MAX_ROWS = int(os.getenv('REPORT_SYNC_MAX_ROWS', 5000))  # filtered report rows
+    MATRIX_SYNC_MAX_CELLS = int(os.getenv('MATRIX_SYNC_MAX_CELLS', 100000))  # students x sessions
+    
+    # Report cache settings
+    REPORT_CACHE_SIZE = int(os.getenv('REPORT_CACHE_SIZE', 256))  # entries kept in memory per worker
+    REPORT_CACHE_DIR = os.getenv('REPORT_CACHE_DIR', '')  # set to also keep finished session reports on disk
+    
+    # Audit log retention settings
+    AUDIT_RETENTION_DAYS = int(os.getenv('AUDIT_RETENTION_DAYS', 30))  # days kept in the database
+    AUDIT_ARCHIVE_DIR = os.getenv('AUDIT_ARCHIVE_DIR', os.path.join(os.getcwd(), 'audit_archive'))
+    
+    # Audit backend: 'db' writes audit_logs rows, 'file' appends to local segment files
+    AUDIT_BACKEND = os.getenv('AUDIT_BACKEND', 'db').lower()
+    AUDIT_SINK_DIR = os.getenv('AUDIT_SINK_DIR', os.path.join(os.getcwd(), 'audit_segments'))
+    AUDIT_SEGMENT_MAX_BYTES = int(os.getenv('AUDIT_SEGMENT_MAX_BYTES', 16 * 1024 * 1024))
+    AUDIT_FSYNC_INTERVAL_MS = int(os.getenv('AUDIT_FSYNC_INTERVAL_MS', 200))
+    AUDIT_FSYNC_BATCH = int(os.getenv('AUDIT_FSYNC_BATCH', 64))
+    
+    # Per event type policy for successful events: 'full', 'aggregate' (one row per
+    # session per minute with a count) or N (keep one in N). Failures are always kept.
+    # Off by default: aggregated rows drop the per-student user_id
+    AUDIT_SAMPLING = os.getenv('AUDIT_SAMPLING', '')
+    USER_AGENT_CACHE_SIZE = int(os.getenv('USER_AGENT_CACHE_SIZE', 1024))  # User-Agent ids cached per worker
+    
+    # Rolling security metrics shared between workers through snapshot files
+    SECURITY_METRICS_DIR = os.getenv('SECURITY_METRICS_DIR', os.path.join(os.getcwd(), 'security_metrics'))
+    SECURITY_METRICS_FLUSH_SECONDS = int(os.getenv('SECURITY_METRICS_FLUSH_SECONDS', 5))
+    
+    # Request/SQL metrics served at /api/metrics (see utils/metrics.py)
+    METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'true').lower() == 'true'
+    METRICS_DIR = os.getenv('METRICS_DIR', os.path.join(os.getcwd(), 'request_metrics'))
+    METRICS_FLUSH_SECONDS = int(os.getenv('METRICS_FLUSH_SECONDS', 10))
+    METRICS_TOKEN = os.getenv('METRICS_TOKEN')  # scrapers send "Authorization: Bearer <token>"; required outside development
+    SLOW_QUERY_MS = int(os.getenv('SLOW_QUERY_MS', 200))
+    
+    # Opt-in sampling profiler for slow requests (see utils/profiler.py)
+    PROFILER_ENABLED = os.getenv('PROFILER_ENABLED', 'false').lower() == 'true'
+    PROFILER_SAMPLE_RATE = float(os.getenv('PROFILER_SAMPLE_RATE', 0.05))  # share of requests sampled
+    PROFILER_SLOW_MS = int(os.getenv('PROFILER_SLOW_MS', 500))  # only sampled requests this slow are dumped
+    PROFILER_INTERVAL_MS = float(os.getenv('PROFILER_INTERVAL_MS', 5))
+    PROFILER_DIR = os.getenv('PROFILER_DIR', os.path.join(os.getcwd(), 'profiles'))
+    PROFILER_MAX_FILES = int(os.getenv('PROFILER_MAX_FILES', 200))
+    SECURITY_RECENT_FAILURES = int(os.getenv('SECURITY_RECENT_FAILURES', 50))
+    
+    # Proxy attendance detection thresholds
+    PROXY_MAX_STUDENTS_PER_IP = int(os.getenv('PROXY_MAX_STUDENTS_PER_IP', 3))
+    PROXY_MIN_SCAN_INTERVAL_SECONDS = float(os.getenv('PROXY_MIN_SCAN_INTERVAL_SECONDS', 5))
+    PROXY_MAX_DISTANCE_METERS = float(os.getenv('PROXY_MAX_DISTANCE_METERS', 300))
+    PROXY_MAX_SESSIONS = int(os.getenv('PROXY_MAX_SESSIONS', 500))  # sessions tracked per worker
+    # Reverse proxies in front of the app whose X-Forwarded-For is trusted (1 on Render); 0 = connect directly
+    TRUSTED_PROXY_COUNT = int(os.getenv('TRUSTED_PROXY_COUNT', 0))
+    
     # JWT settings
-    JWT_EXPIRY_HOURS = 24
+    JWT_EXPIRY_MINUTES = int(os.getenv('JWT_EXPIRY_MINUTES', 60))  # access tokens; renewed via /api/auth/refresh
+    REFRESH_TOKEN_DAYS = int(os.getenv('REFRESH_TOKEN_DAYS', 30))
+    REFRESH_REUSE_GRACE_SECONDS = int(os.getenv('REFRESH_REUSE_GRACE_SECONDS', 10))  # concurrent refreshes from two tabs
+    
+    # Scan tickets: signed student class details used by /mark instead of loading the student
+    SCAN_TICKET_EXPIRY = int(os.getenv('SCAN_TICKET_EXPIRY', 900))  # seconds
+    SCAN_TICKET_KEY_VERSION = int(os.getenv('SCAN_TICKET_KEY_VERSION', 1))  # bump to revoke all tickets
+    TOKEN_CACHE_SIZE = int(os.getenv('TOKEN_CACHE_SIZE', 4096))  # verified tokens cached per worker (0 disables)
+    
+    # Request threads per gunicorn worker (start.sh runs gthread workers)
+    WEB_THREADS = int(os.getenv('WEB_THREADS', 4))
+    
+    # Password hashing: bcrypt cost, and the process pool doing the work (0 workers = inline)
+    BCRYPT_ROUNDS = int(os.getenv('BCRYPT_ROUNDS', 12))
+    BCRYPT_POOL_WORKERS = int(os.getenv('BCRYPT_POOL_WORKERS', os.cpu_count() or 1))
+    # Logins waiting on bcrypt per worker before answering 503; half the threads, so the rest keep serving scans
+    BCRYPT_MAX_PENDING = int(os.getenv('BCRYPT_MAX_PENDING', max(WEB_THREADS // 2, 1)))
+    
+    # Bulk roster import (see utils/roster_import.py)
+    ROSTER_HASH_WORKERS = int(os.getenv('ROSTER_HASH_WORKERS', os.cpu_count() or 1))
+    ROSTER_BCRYPT_ROUNDS = int(os.getenv('ROSTER_BCRYPT_ROUNDS', 6))  # initial passwords only; raised to BCRYPT_ROUNDS on first login
+    ROSTER_BATCH_SIZE = int(os.getenv('ROSTER_BATCH_SIZE', 500))  # rows per INSERT
+    ROSTER_MAX_ROWS = int(os.getenv('ROSTER_MAX_ROWS', 20000))
     
     # SSL/HTTPS settings
     SSL_ENABLED = os.getenv('SSL_ENABLED', 'false').lower() == 'true'
@@ -24,7 +24,8 @@ CREATE TABLE IF NOT EXISTS students (
     backlogs INT DEFAULT 0,
     cgpa DECIMAL(3, 2) DEFAULT 0.00,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    INDEX idx_students_class (branch, semester, division)
 );
 
 -- Teachers Table
@@ -71,7 +72,9 @@ CREATE TABLE IF NOT EXISTS sessions (
     FOREIGN KEY (teacher_id) REFERENCES teachers(id) ON DELETE CASCADE,
     INDEX idx_session_id (session_id),
     INDEX idx_teacher_id (teacher_id),
-    INDEX idx_token (qr_token)
+    INDEX idx_token (qr_token),
+    INDEX idx_sessions_teacher_date (teacher_id, session_date),
+    INDEX idx_sessions_teacher_active (teacher_id, is_active)
 );
 
 -- Attendance Table
@@ -91,7 +94,8 @@ CREATE TABLE IF NOT EXISTS attendance (
     UNIQUE KEY unique_attendance (student_id, session_id),
     INDEX idx_student_id (student_id),
     INDEX idx_session_id (session_id),
-    INDEX idx_teacher_id (teacher_id)
+    INDEX idx_teacher_id (teacher_id),
+    INDEX idx_attendance_session_status (session_id, status)
 );
 
 -- Lesson Plans Table (Optional - for teacher dashboard)
@@ -0,0 +1,30 @@
+"""Detect attendance defaulters for a branch/semester - Run before exams"""
+import argparse
+from app import create_app
+from config import Config
+from utils.defaulters import get_defaulters
+
+parser = argparse.ArgumentParser(description='List students below the attendance threshold per subject')
+parser.add_argument('--branch', required=True, help='Branch, e.g. "Computer Science"')
+parser.add_argument('--semester', required=True, type=int, help='Semester number')
+parser.add_argument('--division', help='Restrict to one division')
+parser.add_argument('--threshold', type=float, default=Config.DEFAULTER_THRESHOLD,
+                    help=f'Attendance percentage threshold (default: {Config.DEFAULTER_THRESHOLD})')
+parser.add_argument('--refresh', action='store_true', help='Ignore stored results and recompute')
+args = parser.parse_args()
+
+app = create_app()
+
+with app.app_context():
+    run, cached = get_defaulters(args.branch, args.semester, args.division, args.threshold, refresh=args.refresh)
+    
+    source = 'stored result' if cached else 'fresh computation'
+    print(f"Defaulters for {run.branch}, Semester {run.semester}"
+          f"{', ' + run.division if run.division else ''} (< {float(run.threshold)}%)")
+    print(f"Computed at {run.computed_at.isoformat()} ({source})")
+    print(f"{run.defaulter_count} of {run.total_students} students below threshold\n")
+    
+    for defaulter in sorted(run.defaulters, key=lambda d: (d.student.student_id, d.subject)):
+        print(f"   - {defaulter.student.student_id} {defaulter.student.full_name}: "
+              f"{defaulter.subject} {defaulter.attended}/{defaulter.total_sessions} "
+              f"({float(defaulter.percentage)}%)")
@@ -0,0 +1,46 @@
+"""Bulk-register students from a roster CSV - Run at term start"""
+import sys
+import json
+import argparse
+from app import create_app
+from config import Config
+from utils.roster_import import import_roster, REQUIRED_COLUMNS, OPTIONAL_COLUMNS
+
+parser = argparse.ArgumentParser(
+    description='Import students from a CSV roster',
+    epilog=f"Columns: {', '.join(REQUIRED_COLUMNS)} (required); {', '.join(OPTIONAL_COLUMNS)} (optional)"
+)
+parser.add_argument('csv_file', help='Roster CSV with a header row')
+parser.add_argument('--dry-run', action='store_true', help='Validate and check for existing students only')
+parser.add_argument('--workers', type=int, default=Config.ROSTER_HASH_WORKERS,
+                    help=f'Password hashing processes (default: {Config.ROSTER_HASH_WORKERS})')
+parser.add_argument('--batch-size', type=int, default=Config.ROSTER_BATCH_SIZE,
+                    help=f'Rows per INSERT (default: {Config.ROSTER_BATCH_SIZE})')
+parser.add_argument('--errors-json', help='Also write the per-row errors to this file')
+args = parser.parse_args()
+
+app = create_app()
+
+with app.app_context():
+    try:
+        with open(args.csv_file, encoding='utf-8-sig', newline='') as f:
+            summary = import_roster(f, dry_run=args.dry_run, workers=args.workers, batch_size=args.batch_size)
+    except (OSError, ValueError) as e:
+        print(f"Import failed: {e}")
+        sys.exit(1)
+
+    action = 'would be created' if args.dry_run else 'created'
+    print(f"{summary['total_rows']} rows: {summary['valid'] if args.dry_run else summary['created']} students "
+          f"{action}, {summary['failed']} rejected")
+    print('Timings: ' + ', '.join(f'{stage} {seconds}s' for stage, seconds in summary['timings'].items()))
+
+    for error in summary['errors'][:50]:
+        print(f"   - row {error['row']} ({error['student_id'] or 'no student ID'}): {'; '.join(error['errors'])}")
+    if len(summary['errors']) > 50:
+        print(f"   ... and {len(summary['errors']) - 50} more")
+
+    if args.errors_json:
+        with open(args.errors_json, 'w') as f:
+            json.dump(summary['errors'], f, indent=2)
+
+    sys.exit(1 if summary['failed'] else 0)
@@ -2,6 +2,7 @@
 from app import create_app
 from models import db, Student, Teacher
 from utils.auth import hash_password
+from utils.migrations import upgrade
 from datetime import date
 
 app = create_app()
@@ -9,7 +10,7 @@ app = create_app()
 with app.app_context():
     # Drop all tables and recreate
     db.drop_all()
-    db.create_all()
+    upgrade()
     
     print("Creating tables...")
     
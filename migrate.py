@@ -0,0 +1,39 @@
+"""Apply database schema migrations - Run on every deploy"""
+import sys
+import argparse
+from app import create_app
+from utils.migrations import upgrade, get_migration_status
+
+parser = argparse.ArgumentParser(description='Apply pending schema migrations')
+parser.add_argument('--status', action='store_true', help='List migrations and whether they are applied')
+parser.add_argument('--check-plans', action='store_true',
+                    help='EXPLAIN the hot queries and fail if any does a full table scan')
+args = parser.parse_args()
+
+app = create_app()
+
+with app.app_context():
+    if args.status:
+        for entry in get_migration_status():
+            state = f"applied {entry['applied_at']}" if entry['applied_at'] else 'pending'
+            print(f"   {entry['version']}  {entry['description']}  ({state})")
+        sys.exit(0)
+    
+    applied = upgrade()
+    if applied:
+        print(f"Applied migrations: {', '.join(applied)}")
+    else:
+        print("Database schema is up to date")
+    
+    if args.check_plans:
+        from utils.query_plans import check_query_plans
+        
+        results = check_query_plans()
+        for result in results:
+            status = 'FULL SCAN' if result['full_scan'] else 'ok'
+            print(f"   [{status}] {result['name']}: {' | '.join(result['plan'])}")
+        
+        failed = [result['name'] for result in results if result['full_scan']]
+        if failed:
+            print(f"Hot queries doing full table scans: {', '.join(failed)}")
+            sys.exit(1)
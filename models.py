@@ -1,12 +1,16 @@
 from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime
 from sqlalchemy import Enum
+from utils.replica import RoutingSession
 
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 
 
 class Student(db.Model):
     __tablename__ = 'students'
+    __table_args__ = (
+        db.Index('idx_students_class', 'branch', 'semester', 'division'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     student_id = db.Column(db.String(20), unique=True, nullable=False)
@@ -104,6 +108,10 @@ class Teacher(db.Model):
 
 class Session(db.Model):
     __tablename__ = 'sessions'
+    __table_args__ = (
+        db.Index('idx_sessions_teacher_date', 'teacher_id', 'session_date'),
+        db.Index('idx_sessions_teacher_active', 'teacher_id', 'is_active'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     session_id = db.Column(db.String(50), unique=True, nullable=False)
@@ -146,6 +154,9 @@ class Session(db.Model):
 
 class Attendance(db.Model):
     __tablename__ = 'attendance'
+    __table_args__ = (
+        db.Index('idx_attendance_session_status', 'session_id', 'status'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     student_id = db.Column(db.Integer, db.ForeignKey('students.id'), nullable=False)
@@ -228,8 +239,44 @@ class WiFiNetwork(db.Model):
         }
 
 
+class SchemaMigration(db.Model):
+    """Migrations from utils/migrations.py that have been applied"""
+    __tablename__ = 'schema_migrations'
+    
+    version = db.Column(db.String(20), primary_key=True)
+    description = db.Column(db.String(200))
+    applied_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+class RefreshToken(db.Model):
+    __tablename__ = 'refresh_tokens'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    token_hash = db.Column(db.String(64), unique=True, nullable=False, index=True)  # sha256 of the token
+    family_id = db.Column(db.String(32), nullable=False, index=True)  # shared by all rotations of one login
+    user_id = db.Column(db.Integer, nullable=False)
+    user_type = db.Column(Enum('student', 'teacher', name='refresh_user_type_enum'), nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False)
+    revoked_at = db.Column(db.DateTime, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+class UserAgent(db.Model):
+    """Distinct User-Agent strings, referenced from audit_logs by id"""
+    __tablename__ = 'user_agents'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    ua_hash = db.Column(db.String(64), unique=True, nullable=False, index=True)  # sha256 of user_agent
+    user_agent = db.Column(db.String(500), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
 class AuditLog(db.Model):
     __tablename__ = 'audit_logs'
+    __table_args__ = (
+        db.Index('idx_audit_created_event_success', 'created_at', 'event_type', 'success'),
+        db.Index('idx_audit_session_created', 'session_id', 'created_at'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     event_type = db.Column(Enum('QR_GENERATED', 'QR_SCANNED', 'ATTENDANCE_MARKED', 'QR_EXPIRED', 'INVALID_QR', 'UNAUTHORIZED_ACCESS',
@@ -240,11 +287,15 @@ class AuditLog(db.Model):
     session_id = db.Column(db.Integer, db.ForeignKey('sessions.id'), nullable=True)
     details = db.Column(db.Text)  # JSON string with event details
     ip_address = db.Column(db.String(45))
-    user_agent = db.Column(db.String(500))
+    user_agent = db.Column(db.String(500))  # only set on rows written before user_agent_id
+    user_agent_id = db.Column(db.Integer, db.ForeignKey('user_agents.id'), nullable=True)
     success = db.Column(db.Boolean, default=True)
     failure_reason = db.Column(db.String(500))
+    event_count = db.Column(db.Integer, default=1, server_default='1', nullable=False)  # events this row stands for
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
+    agent = db.relationship('UserAgent', lazy='joined')
+    
     def to_dict(self):
         return {
             'id': self.id,
@@ -254,9 +305,65 @@ class AuditLog(db.Model):
             'session_id': self.session_id,
             'details': self.details,
             'ip_address': self.ip_address,
-            'user_agent': self.user_agent,
+            'user_agent': self.user_agent or (self.agent.user_agent if self.agent else None),
             'success': self.success,
             'failure_reason': self.failure_reason,
+            'event_count': self.event_count,
             'created_at': self.created_at.isoformat() if self.created_at else None,
         }
 
+
+
+class DefaulterRun(db.Model):
+    __tablename__ = 'defaulter_runs'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    branch = db.Column(db.String(50), nullable=False)
+    semester = db.Column(db.Integer, nullable=False)
+    division = db.Column(db.String(10))
+    threshold = db.Column(db.Numeric(5, 2), nullable=False)
+    total_students = db.Column(db.Integer, default=0)
+    defaulter_count = db.Column(db.Integer, default=0)
+    computed_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    
+    # Relationships
+    defaulters = db.relationship('Defaulter', backref='run', lazy=True, cascade='all, delete-orphan')
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'branch': self.branch,
+            'semester': self.semester,
+            'division': self.division,
+            'threshold': float(self.threshold) if self.threshold is not None else None,
+            'total_students': self.total_students,
+            'defaulter_count': self.defaulter_count,
+            'computed_at': self.computed_at.isoformat() if self.computed_at else None,
+        }
+
+
+class Defaulter(db.Model):
+    __tablename__ = 'defaulters'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    run_id = db.Column(db.Integer, db.ForeignKey('defaulter_runs.id'), nullable=False, index=True)
+    student_id = db.Column(db.Integer, db.ForeignKey('students.id'), nullable=False)
+    subject = db.Column(db.String(100), nullable=False)
+    attended = db.Column(db.Integer, default=0)
+    total_sessions = db.Column(db.Integer, default=0)
+    percentage = db.Column(db.Numeric(5, 2), default=0.00)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    # Relationships
+    student = db.relationship('Student', lazy='joined')
+    
+    def to_dict(self):
+        return {
+            'student_id': self.student.student_id if self.student else None,
+            'student_name': self.student.full_name if self.student else None,
+            'division': self.student.division if self.student else None,
+            'subject': self.subject,
+            'attended': self.attended,
+            'total_sessions': self.total_sessions,
+            'percentage': float(self.percentage) if self.percentage is not None else 0,
+        }
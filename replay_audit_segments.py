@@ -0,0 +1,16 @@
+"""Load file audit segments into the database - Run when AUDIT_BACKEND=file"""
+from app import create_app
+from config import Config
+from utils.audit_sink import replay_segments_into_db
+
+app = create_app()
+
+with app.app_context():
+    loaded = replay_segments_into_db()
+    
+    if not loaded:
+        print(f"No closed segments to load in {Config.AUDIT_SINK_DIR}")
+    else:
+        print(f"Loaded {sum(loaded.values())} audit events into audit_logs")
+        for segment, count in loaded.items():
+            print(f"   - {segment}: {count} events")
@@ -1,13 +1,21 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, Response, send_file, stream_with_context
 from models import db, Session, Attendance, Teacher, Student, WiFiNetwork, AuditLog
-from utils.auth import token_required
+from utils.auth import token_required, generate_scan_ticket, verify_scan_ticket
+from utils.replica import read_replica
 from utils.qr_generator import generate_qr_data, create_qr_code_image, parse_qr_data, validate_qr_token
+from utils.reports import build_session_report, legacy_report_query, legacy_report_row
+from utils.report_cache import get_or_build_report
+from utils.proxy_detector import check_scan, get_proxy_detector
+from utils.security_metrics import get_security_metrics
+from utils.metrics import StageTimer
 from utils.audit_logger import (log_qr_generation, log_qr_scan, 
                                log_attendance_marking, log_wifi_verification, log_unauthorized_access)
 from datetime import datetime, date, time, timedelta
 from config import Config
 import secrets
 import json
+import io
+import re
 
 attendance_bp = Blueprint('attendance', __name__)
 
@@ -63,6 +71,7 @@ def create_session(current_user):
 def generate_qr(current_user, session_db_id):
     """Generate dynamic QR code for attendance"""
     try:
+        timer = StageTimer()
         teacher_id = current_user['user_id']
         
         # Get session and verify it belongs to teacher
@@ -76,6 +85,7 @@ def generate_qr(current_user, session_db_id):
         
         if not session.is_active:
             return jsonify({'error': 'Session is not active'}), 400
+        timer.lap('session_lookup')
         
         # Generate new QR data with token
         qr_token, qr_data_json, expires_at = generate_qr_data(
@@ -83,18 +93,22 @@ def generate_qr(current_user, session_db_id):
             session_id=session.session_id,
             session_db_id=session_db_id
         )
+        timer.lap('token')
         
         # Update session with new token
         session.qr_token = qr_token
         session.token_generated_at = datetime.utcnow()
         session.token_expires_at = expires_at
         db.session.commit()
+        timer.lap('db_write')
         
         # Log QR generation event
         log_qr_generation(teacher_id, session.id, qr_token, expires_at)
+        timer.lap('audit_log')
         
         # Create QR code image
         qr_image_base64 = create_qr_code_image(qr_data_json)
+        timer.lap('image')
         
         return jsonify({
             'qr_code': qr_image_base64,
@@ -114,11 +128,33 @@ def generate_qr(current_user, session_db_id):
         return jsonify({'error': f'Failed to generate QR code: {str(e)}'}), 500
 
 
+@attendance_bp.route('/scan-ticket', methods=['GET'])
+@token_required('student')
+def get_scan_ticket(current_user):
+    """Issue a scan ticket when the student opens the scanner"""
+    try:
+        student = Student.query.get(current_user['user_id'])
+        if not student:
+            return jsonify({'error': 'Student not found'}), 404
+        
+        ticket, expires_at = generate_scan_ticket(student)
+        
+        return jsonify({
+            'scan_ticket': ticket,
+            'expires_at': expires_at.isoformat(),
+            'expires_in_seconds': Config.SCAN_TICKET_EXPIRY
+        }), 200
+        
+    except Exception as e:
+        return jsonify({'error': f'Failed to issue scan ticket: {str(e)}'}), 500
+
+
 @attendance_bp.route('/mark', methods=['POST'])
 @token_required('student')
 def mark_attendance(current_user):
     """Enhanced attendance marking with comprehensive security validation"""
     try:
+        timer = StageTimer()
         student_id = current_user['user_id']
         data = request.get_json()
         
@@ -152,6 +188,7 @@ def mark_attendance(current_user):
         
         # Log successful QR scan
         log_qr_scan(student_id, session.id, data['qr_data'], success=True)
+        timer.lap('qr_validation')
         
         # ========== STEP 2: SESSION VALIDATION ==========
         if not session.is_active:
@@ -165,11 +202,15 @@ def mark_attendance(current_user):
         
         if existing_attendance:
             return jsonify({'error': 'Attendance already marked for this session'}), 400
+        timer.lap('session')
         
         # ========== STEP 3: STUDENT VALIDATION ==========
-        student = Student.query.get(student_id)
+        # A valid scan ticket already carries the student's class details, so the row is not loaded
+        student = verify_scan_ticket(data.get('scan_ticket'), student_id)
         if not student:
-            return jsonify({'error': 'Student not found'}), 404
+            student = Student.query.get(student_id)
+            if not student:
+                return jsonify({'error': 'Student not found'}), 404
         
         # Validate student is registered for this class
         if student.branch != session.branch:
@@ -196,6 +237,7 @@ def mark_attendance(current_user):
                 'error': 'Unauthorized access',
                 'details': f'This session is for {session.division}, but you are in {student.division}'
             }), 403
+        timer.lap('student')
         
         # ========== STEP 4: WIFI AUTHENTICATION ==========
         # WiFi authentication is optional for testing/development
@@ -236,6 +278,7 @@ def mark_attendance(current_user):
             # No WiFi networks configured - skip WiFi check
             log_wifi_verification(student_id, session.id, wifi_ssid or 'N/A', success=True,
                                 failure_reason="WiFi check skipped - no networks configured")
+        timer.lap('wifi')
         
         # ========== STEP 5: MARK ATTENDANCE ==========
         # Get current server time for accurate timestamp
@@ -255,6 +298,11 @@ def mark_attendance(current_user):
         db.session.add(new_attendance)
         session.present_count += 1
         db.session.commit()
+        timer.lap('insert')
+        
+        # Flag proxy attendance patterns (shared IP, rapid scans, far-off location)
+        check_scan(session.id, student_id, request.remote_addr, current_time,
+                   data.get('latitude'), data.get('longitude'))
         
         # Log successful attendance marking
         log_attendance_marking(student_id, session.id, success=True)
@@ -273,6 +321,7 @@ def mark_attendance(current_user):
             },
             'wifi_location': authorized_network.location if authorized_network else None
         }
+        timer.lap('post_commit')
         
         return jsonify(response_payload), 200
         
@@ -306,6 +355,7 @@ def end_session(current_user, session_db_id):
         session.qr_token = None  # Invalidate token
         
         db.session.commit()
+        get_proxy_detector().evict(session.id)
         
         return jsonify({
             'message': 'Session ended successfully',
@@ -346,15 +396,33 @@ def get_session_stats(current_user, session_db_id):
             'present_count': present_count,
             'total_students': session.total_students,
             'attendance_percentage': round(attendance_percentage, 2),
-            'is_active': session.is_active
+            'is_active': session.is_active,
+            'proxy_alerts': get_security_metrics().get_alerts(session_id=session.id)
         }), 200
         
     except Exception as e:
         return jsonify({'error': f'Failed to fetch session stats: {str(e)}'}), 500
 
 
+def _wants_job():
+    """True when the client asked for a background job with ?async=true"""
+    return request.args.get('async', 'false').lower() == 'true'
+
+
+def _queue_report_job(kind, params, teacher_id):
+    """Submit a report as a background job and answer 202 with its status"""
+    from utils.report_jobs import submit_job
+    
+    job = submit_job(kind, params, teacher_id)
+    return jsonify({
+        'message': 'Report is large and is being built in the background',
+        'job': job
+    }), 202
+
+
 @attendance_bp.route('/report', methods=['GET'])
 @token_required('teacher')
+@read_replica
 def get_attendance_report(current_user):
     """Get attendance report for teacher with complete data of presentees and absentees"""
     try:
@@ -376,113 +444,25 @@ def get_attendance_report(current_user):
             if not session:
                 return jsonify({'error': 'Session not found'}), 404
             
-            # Get all students in the division for this session
-            division_filter = session.division if session.division else division
-            students_query = Student.query.filter_by(
-                branch=session.branch,
-                semester=session.semester
+            report = get_or_build_report(
+                'session_report',
+                session,
+                lambda: build_session_report(session, division),
+                variant=None if session.division else division
             )
             
-            if division_filter:
-                students_query = students_query.filter_by(division=division_filter)
-            
-            all_students = students_query.all()
-            
-            # Get all attendance records for this session
-            attendance_records = Attendance.query.filter_by(
-                session_id=session.id
-            ).all()
-            
-            # Create a map of student_id to attendance record
-            attendance_map = {att.student_id: att for att in attendance_records}
-            
-            # Build report with both presentees and absentees
-            report_data = []
-            present_count = 0
-            absent_count = 0
-            
-            for student in all_students:
-                attendance = attendance_map.get(student.id)
-                if attendance:
-                    # Student is present
-                    status = attendance.status
-                    marked_at = attendance.marked_at.isoformat() if attendance.marked_at else None
-                    present_count += 1
-                else:
-                    # Student is absent
-                    status = 'Absent'
-                    marked_at = None
-                    absent_count += 1
-                
-                report_data.append({
-                    'session_id': session.session_id,
-                    'subject': session.subject,
-                    'branch': session.branch,
-                    'semester': session.semester,
-                    'division': session.division or division_filter,
-                    'session_date': session.session_date.isoformat(),
-                    'student_id': student.student_id,
-                    'student_name': student.full_name,
-                    'student_email': student.email,
-                    'status': status,
-                    'marked_at': marked_at
-                })
-            
-            # Sort by student_id for better readability
-            report_data.sort(key=lambda x: x['student_id'])
-            
-            return jsonify({
-                'report': report_data,
-                'summary': {
-                    'total_students': len(all_students),
-                    'present': present_count,
-                    'absent': absent_count,
-                    'attendance_percentage': round((present_count / len(all_students) * 100) if all_students else 0, 2)
-                },
-                'session_info': {
-                    'session_id': session.session_id,
-                    'subject': session.subject,
-                    'branch': session.branch,
-                    'semester': session.semester,
-                    'division': session.division or division_filter,
-                    'session_date': session.session_date.isoformat()
-                }
-            }), 200
+            return jsonify(report), 200
         
         # If no session_id, return filtered list (legacy behavior)
-        query = db.session.query(
-            Session, Attendance, Student
-        ).join(
-            Attendance, Session.id == Attendance.session_id
-        ).join(
-            Student, Attendance.student_id == Student.id
-        ).filter(
-            Session.teacher_id == teacher_id
-        )
+        query = legacy_report_query(teacher_id, branch, subject, division)
         
-        # Apply filters
-        if branch:
-            query = query.filter(Session.branch == branch)
-        if subject:
-            query = query.filter(Session.subject == subject)
-        if division:
-            query = query.filter(Session.division == division)
+        # Large reports are built by a background job instead of this request
+        if _wants_job() or query.order_by(None).count() > Config.REPORT_SYNC_MAX_ROWS:
+            return _queue_report_job('report', {'branch': branch, 'subject': subject, 'division': division},
+                                     teacher_id)
         
-        results = query.order_by(Session.session_date.desc()).all()
-        
-        report_data = []
-        for session, attendance, student in results:
-            report_data.append({
-                'session_id': session.session_id,
-                'subject': session.subject,
-                'session_date': session.session_date.isoformat(),
-                'student_id': student.student_id,
-                'student_name': student.full_name,
-                'branch': student.branch,
-                'division': student.division,
-                'status': attendance.status,
-                'marked_at': attendance.marked_at.isoformat() if attendance.marked_at else None
-            })
+        results = query.all()
+        report_data = [legacy_report_row(session, attendance, student) for session, attendance, student in results]
         
         return jsonify({'report': report_data}), 200
         
@@ -490,60 +470,270 @@ def get_attendance_report(current_user):
         return jsonify({'error': f'Failed to generate report: {str(e)}'}), 500
 
 
-@attendance_bp.route('/audit/logs', methods=['GET'])
+@attendance_bp.route('/matrix', methods=['GET'])
 @token_required('teacher')
-def get_audit_logs(current_user):
-    """Get audit logs for security monitoring"""
+def get_attendance_matrix(current_user):
+    """Get the students x sessions attendance matrix for a subject"""
     try:
-        from utils.audit_logger import get_audit_logs, get_security_summary
+        from utils.analytics import build_attendance_matrix, count_matrix_cells
         
-        # Get query parameters
-        session_id = request.args.get('session_id', type=int)
-        event_type = request.args.get('event_type')
-        hours = request.args.get('hours', 24, type=int)
-        
-        # Get audit logs
-        logs = get_audit_logs(
-            user_id=current_user['user_id'],
-            session_id=session_id,
-            event_type=event_type,
-            limit=1000
+        branch = request.args.get('branch')
+        semester = request.args.get('semester', type=int)
+        subject = request.args.get('subject')
+        division = request.args.get('division')
+        threshold = request.args.get('threshold', 75.0, type=float)
+        export_format = request.args.get('format', 'json')
+        
+        if not branch or not semester or not subject:
+            return jsonify({'error': 'branch, semester and subject are required'}), 400
+        
+        if export_format not in ('json', 'csv', 'xlsx'):
+            return jsonify({'error': 'format must be one of json, csv, xlsx'}), 400
+        
+        if _wants_job() or count_matrix_cells(branch, semester, subject, division,
+                                              current_user['user_id']) > Config.MATRIX_SYNC_MAX_CELLS:
+            return _queue_report_job('matrix', {
+                'branch': branch, 'semester': semester, 'subject': subject, 'division': division,
+                'threshold': threshold, 'format': export_format
+            }, current_user['user_id'])
+        
+        matrix = build_attendance_matrix(
+            branch=branch,
+            semester=semester,
+            subject=subject,
+            division=division,
+            teacher_id=current_user['user_id'],
+            threshold=threshold
         )
         
-        # Get security summary
-        summary = get_security_summary(session_id=session_id, hours=hours)
+        # Subject and branch come from the query string; keep only safe filename characters
+        filename = re.sub(r'[^A-Za-z0-9._-]+', '_', f"attendance_{subject}_{branch}_sem{semester}")
+        
+        if export_format == 'csv':
+            return send_file(
+                io.BytesIO(matrix.to_csv().encode('utf-8')),
+                mimetype='text/csv',
+                as_attachment=True,
+                download_name=f"{filename}.csv"
+            )
+        
+        if export_format == 'xlsx':
+            try:
+                content = matrix.to_xlsx()
+            except RuntimeError as e:
+                return jsonify({'error': str(e)}), 400
+            return send_file(
+                io.BytesIO(content),
+                mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+                as_attachment=True,
+                download_name=f"{filename}.xlsx"
+            )
         
         return jsonify({
+            'subject': subject,
+            'branch': branch,
+            'semester': semester,
+            'division': division,
+            'matrix': matrix.to_dict()
+        }), 200
+        
+    except Exception as e:
+        return jsonify({'error': f'Failed to build attendance matrix: {str(e)}'}), 500
+
+
+@attendance_bp.route('/jobs', methods=['POST'])
+@token_required('teacher')
+def submit_report_job(current_user):
+    """Submit a long-running report build as a background job"""
+    try:
+        from utils.report_jobs import submit_job, JOB_KINDS
+        
+        data = request.get_json() or {}
+        kind = data.get('kind')
+        
+        if kind not in JOB_KINDS:
+            return jsonify({'error': f"kind must be one of {', '.join(JOB_KINDS)}"}), 400
+        
+        job = submit_job(kind, data.get('params') or {}, current_user['user_id'])
+        
+        return jsonify({
+            'message': 'Report job submitted',
+            'job': job
+        }), 202
+        
+    except Exception as e:
+        return jsonify({'error': f'Failed to submit report job: {str(e)}'}), 500
+
+
+@attendance_bp.route('/jobs/<job_id>', methods=['GET'])
+@token_required('teacher')
+def get_report_job(current_user, job_id):
+    """Get the status of a background report job"""
+    from utils.report_jobs import get_job
+    
+    job = get_job(job_id)
+    if not job or job['owner_id'] != current_user['user_id']:
+        return jsonify({'error': 'Job not found'}), 404
+    
+    return jsonify({'job': job}), 200
+
+
+@attendance_bp.route('/jobs/<job_id>/download', methods=['GET'])
+@token_required('teacher')
+def download_report_job(current_user, job_id):
+    """Download the result of a finished background report job"""
+    from utils.report_jobs import get_job, get_job_result_path
+    
+    job = get_job(job_id)
+    if not job or job['owner_id'] != current_user['user_id']:
+        return jsonify({'error': 'Job not found'}), 404
+    
+    if job['status'] != 'done':
+        return jsonify({'error': f"Job is {job['status']}", 'job': job}), 409
+    
+    return send_file(
+        get_job_result_path(job),
+        mimetype=job['mimetype'],
+        as_attachment=True,
+        download_name=f"{job['kind']}_{job['id']}.{job['result_file'].rsplit('.', 1)[-1]}"
+    )
+
+
+def _parse_audit_filters(current_user):
+    """
+    Read audit log filters from the query string
+    
+    The logs are always scoped to the requesting teacher's own events, as the
+    baseline endpoint was; user_id/user_type may only name the caller.
+    
+    Raises:
+        ValueError: Bad filter values
+        PermissionError: user_id/user_type names someone else
+    """
+    from utils.audit_logger import AUDIT_LOG_FIELDS
+    
+    def parse_time(name):
+        value = request.args.get(name)
+        if not value:
+            return None
+        try:
+            return datetime.fromisoformat(value)
+        except ValueError:
+            raise ValueError(f'{name} must be an ISO 8601 timestamp')
+    
+    fields = None
+    if request.args.get('fields'):
+        fields = [field.strip() for field in request.args['fields'].split(',') if field.strip()]
+        unknown = [field for field in fields if field not in AUDIT_LOG_FIELDS]
+        if unknown:
+            raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    
+    event_types = None
+    if request.args.get('event_type'):
+        event_types = [event.strip() for event in request.args['event_type'].split(',') if event.strip()]
+    
+    # Teacher and student ids are separate id spaces, so the scope is the (id, type) pair
+    requested_id = request.args.get('user_id', type=int)
+    requested_type = request.args.get('user_type')
+    if (requested_id is not None and requested_id != current_user['user_id']) or \
+            (requested_type and requested_type != current_user['user_type']):
+        raise PermissionError("Audit logs are limited to your own events")
+    
+    return {
+        'user_id': current_user['user_id'],
+        'user_type': current_user['user_type'],
+        'session_id': request.args.get('session_id', type=int),
+        'event_type': event_types,
+        'start_time': parse_time('start'),
+        'end_time': parse_time('end'),
+        'fields': fields,
+        # Archived days are gzip files; reading them is opt-in
+        'include_archive': request.args.get('include_archive', 'false').lower() == 'true'
+    }
+
+
+@attendance_bp.route('/audit/logs', methods=['GET'])
+@token_required('teacher')
+@read_replica
+def get_audit_logs(current_user):
+    """Get a page of audit logs for security monitoring"""
+    try:
+        from utils.audit_logger import query_audit_logs, get_security_summary
+        
+        try:
+            filters = _parse_audit_filters(current_user)
+            limit = min(max(request.args.get('limit', 100, type=int), 1), 1000)
+            cursor = request.args.get('cursor')
+            
+            # Get audit logs
+            logs, next_cursor = query_audit_logs(cursor=cursor, limit=limit, **filters)
+        except PermissionError as e:
+            return jsonify({'error': str(e)}), 403
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        response = {
             'audit_logs': logs,
-            'security_summary': summary,
+            'next_cursor': next_cursor,
             'total_logs': len(logs)
-        }), 200
+        }
+        
+        # Get security summary
+        if request.args.get('include_summary', 'true').lower() == 'true':
+            hours = request.args.get('hours', 24, type=int)
+            response['security_summary'] = get_security_summary(session_id=filters['session_id'], hours=hours)
+        
+        return jsonify(response), 200
         
     except Exception as e:
         return jsonify({'error': f'Failed to retrieve audit logs: {str(e)}'}), 500
 
 
+@attendance_bp.route('/audit/logs/export', methods=['GET'])
+@token_required('teacher')
+@read_replica
+def export_audit_logs(current_user):
+    """Stream matching audit logs as JSON lines"""
+    from utils.audit_logger import iter_audit_logs
+    
+    try:
+        filters = _parse_audit_filters(current_user)
+    except PermissionError as e:
+        return jsonify({'error': str(e)}), 403
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    def generate():
+        for log in iter_audit_logs(**filters):
+            yield json.dumps(log) + '\n'
+    
+    return Response(
+        stream_with_context(generate()),
+        mimetype='application/x-ndjson',
+        headers={'Content-Disposition': 'attachment; filename="audit_logs.jsonl"'}
+    )
+
+
 @attendance_bp.route('/security/status', methods=['GET'])
 @token_required('teacher')
 def get_security_status(current_user):
     """Get current security status and alerts"""
     try:
-        from utils.audit_logger import get_security_summary
+        # Rolling in-memory counters, merged across workers (no audit_logs scan)
+        metrics = get_security_metrics()
         
         # Get security summary for last 24 hours
-        summary = get_security_summary(hours=24)
+        summary = metrics.get_summary(hours=24)
         
         # Get recent failed attempts
-        recent_failures = AuditLog.query.filter(
-            AuditLog.created_at >= datetime.utcnow() - timedelta(hours=1),
-            AuditLog.success == False
-        ).order_by(AuditLog.created_at.desc()).limit(10).all()
+        recent_failures = metrics.get_recent_failures(hours=1, limit=10)
         
         return jsonify({
             'security_status': 'active',
             'summary': summary,
-            'recent_failures': [log.to_dict() for log in recent_failures],
+            'recent_failures': recent_failures,
             'alerts': summary.get('security_alerts', []),
+            'proxy_alerts': metrics.get_alerts(limit=20),
             'last_updated': datetime.utcnow().isoformat()
         }), 200
         
@@ -0,0 +1,51 @@
+from flask import Blueprint, request, jsonify
+from models import db
+from utils.auth import rotate_refresh_token, revoke_refresh_token
+
+auth_bp = Blueprint('auth', __name__)
+
+
+@auth_bp.route('/refresh', methods=['POST'])
+def refresh_token():
+    """Exchange a refresh token for a new access token (and a new refresh token)"""
+    try:
+        data = request.get_json(silent=True) or {}
+
+        if not data.get('refresh_token'):
+            return jsonify({'error': 'refresh_token is required'}), 400
+
+        tokens = rotate_refresh_token(data['refresh_token'])
+        if not tokens:
+            return jsonify({
+                'error': 'Refresh token is invalid or expired',
+                'details': 'Please login again to get a new token'
+            }), 401
+
+        return jsonify({
+            'message': 'Token refreshed',
+            'token': tokens['token'],
+            'refresh_token': tokens['refresh_token'],
+            'user_type': tokens['user_type']
+        }), 200
+
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': f'Failed to refresh token: {str(e)}'}), 500
+
+
+@auth_bp.route('/logout', methods=['POST'])
+def logout():
+    """Revoke a refresh token (and every token rotated from the same login)"""
+    try:
+        data = request.get_json(silent=True) or {}
+
+        if not data.get('refresh_token'):
+            return jsonify({'error': 'refresh_token is required'}), 400
+
+        revoke_refresh_token(data['refresh_token'])
+
+        return jsonify({'message': 'Logged out successfully'}), 200
+
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': f'Failed to logout: {str(e)}'}), 500
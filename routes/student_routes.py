@@ -1,6 +1,7 @@
 from flask import Blueprint, request, jsonify
 from models import db, Student, Attendance, Session
-from utils.auth import hash_password, verify_password, generate_token, token_required
+from utils.auth import hash_password, verify_password, rehash_password_if_needed, generate_token, issue_refresh_token, token_required, PasswordPoolBusy
+from utils.replica import read_replica
 from utils.validators import validate_registration_data, validate_email
 from utils.audit_logger import log_security_event
 from sqlalchemy import func, case
@@ -54,13 +55,17 @@ def register_student():
         
         # Generate token
         token = generate_token(new_student.id, 'student')
+        refresh_token = issue_refresh_token(new_student.id, 'student')
         
         return jsonify({
             'message': 'Student registered successfully',
             'token': token,
+            'refresh_token': refresh_token,
             'student': new_student.to_dict()
         }), 201
         
+    except PasswordPoolBusy as e:
+        return jsonify({'error': str(e)}), 503
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': f'Registration failed: {str(e)}'}), 500
@@ -94,15 +99,22 @@ def login_student():
         if not verify_password(password, student.password_hash):
             return jsonify({'error': 'Invalid email or password'}), 401
         
+        # Upgrade plain text or outdated-cost hashes
+        rehash_password_if_needed(student, password)
+        
         # Generate token
         token = generate_token(student.id, 'student')
+        refresh_token = issue_refresh_token(student.id, 'student')
         
         return jsonify({
             'message': 'Login successful',
             'token': token,
+            'refresh_token': refresh_token,
             'student': student.to_dict()
         }), 200
         
+    except PasswordPoolBusy as e:
+        return jsonify({'error': str(e)}), 503
     except Exception as e:
         import traceback
         print(f"Student login error: {str(e)}")
@@ -128,6 +140,7 @@ def get_student_profile(current_user):
 
 @student_bp.route('/attendance', methods=['GET'])
 @token_required('student')
+@read_replica
 def get_student_attendance(current_user):
     """Get student attendance records"""
     try:
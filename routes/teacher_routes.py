@@ -1,6 +1,10 @@
 from flask import Blueprint, request, jsonify
 from models import db, Teacher, Session, Attendance, Student, LessonPlan, WiFiNetwork
-from utils.auth import verify_password, generate_token, token_required
+from utils.auth import verify_password, rehash_password_if_needed, generate_token, issue_refresh_token, token_required, PasswordPoolBusy
+from utils.replica import read_replica
+from utils.reports import build_session_attendance
+from utils.report_cache import get_or_build_report
+from config import Config
 from datetime import datetime, date, time
 from sqlalchemy import func, text
 
@@ -58,15 +62,22 @@ def login_teacher():
         if not verify_password(password, teacher.password_hash):
             return jsonify({'error': 'Invalid email or password'}), 401
         
+        # Upgrade plain text or outdated-cost hashes
+        rehash_password_if_needed(teacher, password)
+        
         # Generate token
         token = generate_token(teacher.id, 'teacher')
+        refresh_token = issue_refresh_token(teacher.id, 'teacher')
         
         return jsonify({
             'message': 'Login successful',
             'token': token,
+            'refresh_token': refresh_token,
             'teacher': teacher.to_dict()
         }), 200
         
+    except PasswordPoolBusy as e:
+        return jsonify({'error': str(e)}), 503
     except Exception as e:
         import traceback
         print(f"Teacher login error: {str(e)}")
@@ -124,30 +135,14 @@ def get_session_attendance(current_user, session_id):
         if not session:
             return jsonify({'error': 'Session not found'}), 404
         
-        # Get attendance records with student details
-        attendance_records = db.session.query(
-            Attendance, Student
-        ).join(
-            Student, Attendance.student_id == Student.id
-        ).filter(
-            Attendance.session_id == session_id
-        ).all()
+        payload = get_or_build_report(
+            'session_attendance',
+            session,
+            lambda: build_session_attendance(session, include_session=False)
+        )
         
-        attendance_data = []
-        for att, student in attendance_records:
-            attendance_data.append({
-                'attendance_id': att.id,
-                'student_id': student.student_id,
-                'student_name': student.full_name,
-                'status': att.status,
-                'marked_at': att.marked_at.isoformat() if att.marked_at else None
-            })
-        
-        return jsonify({
-            'session': session.to_dict(),
-            'attendance': attendance_data,
-            'total_present': len([a for a in attendance_data if a['status'] == 'Present'])
-        }), 200
+        # Session details (QR token state, counts) are always read fresh, never cached
+        return jsonify(dict(payload, session=session.to_dict())), 200
         
     except Exception as e:
         return jsonify({'error': f'Failed to fetch attendance: {str(e)}'}), 500
@@ -201,6 +196,7 @@ def manage_lesson_plans(current_user):
 
 @teacher_bp.route('/dashboard/stats', methods=['GET'])
 @token_required('teacher')
+@read_replica
 def get_teacher_dashboard_stats(current_user):
     """Get teacher dashboard statistics"""
     try:
@@ -263,6 +259,73 @@ def get_teacher_dashboard_stats(current_user):
         return jsonify({'error': f'Failed to fetch dashboard stats: {str(e)}'}), 500
 
 
+@teacher_bp.route('/defaulters', methods=['GET'])
+@token_required('teacher')
+def get_defaulters_list(current_user):
+    """Get students below the attendance threshold per subject for a branch/semester"""
+    try:
+        from utils.defaulters import get_defaulters
+        
+        branch = request.args.get('branch')
+        semester = request.args.get('semester', type=int)
+        division = request.args.get('division')
+        threshold = request.args.get('threshold', type=float)
+        refresh = request.args.get('refresh', 'false').lower() == 'true'
+        
+        if not branch or not semester:
+            return jsonify({'error': 'branch and semester are required'}), 400
+        
+        run, cached = get_defaulters(branch, semester, division, threshold, refresh=refresh)
+        
+        return jsonify({
+            'run': run.to_dict(),
+            'cached': cached,
+            'defaulters': [defaulter.to_dict() for defaulter in run.defaulters]
+        }), 200
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': f'Failed to detect defaulters: {str(e)}'}), 500
+
+
+@teacher_bp.route('/students/import', methods=['POST'])
+@token_required('teacher')
+def import_students(current_user):
+    """Bulk-register students from a roster CSV (checked inline with dry_run, imported as a background job)"""
+    try:
+        from utils.roster_import import parse_roster_csv, import_roster
+        from utils.report_jobs import submit_job, write_job_input
+        
+        upload = request.files.get('file')
+        content = upload.read().decode('utf-8') if upload else request.get_data(as_text=True)
+        content = content.lstrip('\ufeff')  # Excel's UTF-8 byte order mark
+        
+        if not content.strip():
+            return jsonify({'error': 'A roster CSV is required (multipart field "file" or a text/csv body)'}), 400
+        
+        try:
+            if request.args.get('dry_run', 'false').lower() == 'true':
+                return jsonify(import_roster(content, dry_run=True)), 200
+            
+            rows = parse_roster_csv(content)
+            if len(rows) > Config.ROSTER_MAX_ROWS:
+                raise ValueError(f'The roster has {len(rows)} rows, the limit is {Config.ROSTER_MAX_ROWS}')
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        job = submit_job('roster', {'input_file': write_job_input(content), 'rows': len(rows)},
+                         current_user['user_id'])
+        
+        return jsonify({
+            'message': 'Roster import submitted',
+            'job': job
+        }), 202
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': f'Failed to import roster: {str(e)}'}), 500
+
+
 @teacher_bp.route('/wifi-networks', methods=['GET', 'POST'])
 @token_required('teacher')
 def manage_wifi_networks(current_user):
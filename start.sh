@@ -1,3 +1,4 @@
 #!/bin/bash
-python -m gunicorn app:app --bind 0.0.0.0:$PORT --workers 2 --timeout 120
-
+# Apply pending migrations, but keep serving /api/health and the static pages if the database is unreachable
+python migrate.py || echo "Warning: database migration failed; starting the app anyway (run python migrate.py once the database is reachable)"
+exec python -m gunicorn app:app --bind 0.0.0.0:$PORT --workers 2 --worker-class gthread --threads ${WEB_THREADS:-4} --timeout 120
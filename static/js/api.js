@@ -101,7 +101,7 @@ function validateTokenUserType(expectedType) {
 }
 
 // Helper function to make API calls
-async function apiCall(endpoint, method = 'GET', body = null, requiresAuth = false) {
+async function apiCall(endpoint, method = 'GET', body = null, requiresAuth = false, isRetry = false) {
     const headers = {
         'Content-Type': 'application/json'
     };
@@ -279,6 +279,12 @@ async function apiCall(endpoint, method = 'GET', body = null, requiresAuth = fal
         
         console.log(`Response status: ${response.status} ${response.statusText}`);
         
+        // Expired access token: get a new one with the refresh token and retry once
+        if (response.status === 401 && requiresAuth && !isRetry && await refreshAccessToken()) {
+            console.log('Access token refreshed, retrying request');
+            return apiCall(endpoint, method, body, requiresAuth, true);
+        }
+        
         if (!response.ok) {
             let errorData;
             try {
@@ -457,13 +463,18 @@ const TeacherAPI = {
     getSessionAttendance: (sessionId) => apiCall(`/teacher/session/${sessionId}/attendance`, 'GET', null, true),
     getDashboardStats: () => apiCall('/teacher/dashboard/stats', 'GET', null, true),
     getLessonPlans: () => apiCall('/teacher/lesson-plans', 'GET', null, true),
-    createLessonPlan: (data) => apiCall('/teacher/lesson-plans', 'POST', data, true)
+    createLessonPlan: (data) => apiCall('/teacher/lesson-plans', 'POST', data, true),
+    getWiFiNetworks: () => apiCall('/teacher/wifi-networks', 'GET', null, true),
+    addWiFiNetwork: (data) => apiCall('/teacher/wifi-networks', 'POST', data, true),
+    updateWiFiNetwork: (networkId, data) => apiCall(`/teacher/wifi-networks/${networkId}`, 'PUT', data, true),
+    deactivateWiFiNetwork: (networkId) => apiCall(`/teacher/wifi-networks/${networkId}`, 'DELETE', null, true)
 };
 
 // Attendance API calls
 const AttendanceAPI = {
     createSession: (data) => apiCall('/attendance/create-session', 'POST', data, true),
     generateQR: (sessionId) => apiCall(`/attendance/generate-qr/${sessionId}`, 'GET', null, true),
+    getScanTicket: () => apiCall('/attendance/scan-ticket', 'GET', null, true),
     markAttendance: (data) => apiCall('/attendance/mark', 'POST', data, true),
     endSession: (sessionId) => apiCall(`/attendance/session/${sessionId}/end`, 'POST', null, true),
     getSessionStats: (sessionId) => apiCall(`/attendance/session/${sessionId}/stats`, 'GET', null, true),
@@ -592,10 +603,56 @@ function getUserData() {
 // Clear auth data
 function clearAuthData() {
     localStorage.removeItem('token');
+    localStorage.removeItem('refreshToken');
     localStorage.removeItem('userType');
     localStorage.removeItem('userData');
 }
 
+// Save the refresh token returned by login/registration
+function saveRefreshToken(refreshToken) {
+    if (refreshToken) {
+        localStorage.setItem('refreshToken', refreshToken);
+    }
+}
+
+// Get a new access token using the refresh token.
+// Concurrent callers share one request, since each refresh token can only be used once.
+let refreshInFlight = null;
+
+function refreshAccessToken() {
+    const refreshToken = localStorage.getItem('refreshToken');
+    if (!refreshToken) {
+        return Promise.resolve(false);
+    }
+    
+    if (!refreshInFlight) {
+        refreshInFlight = fetch(`${API_BASE_URL}/auth/refresh`, {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ refresh_token: refreshToken })
+        })
+            .then(async (response) => {
+                if (!response.ok) {
+                    console.warn('Token refresh failed:', response.status);
+                    return false;
+                }
+                const data = await response.json();
+                localStorage.setItem('token', data.token);
+                saveRefreshToken(data.refresh_token);
+                return true;
+            })
+            .catch((error) => {
+                console.error('Token refresh error:', error);
+                return false;
+            })
+            .finally(() => {
+                refreshInFlight = null;
+            });
+    }
+    
+    return refreshInFlight;
+}
+
 // Check if user is authenticated
 function isAuthenticated() {
     return !!getAuthToken();
@@ -603,6 +660,17 @@ function isAuthenticated() {
 
 // Logout function
 function logout() {
+    // Revoke the refresh token so it cannot be used after logout
+    const refreshToken = localStorage.getItem('refreshToken');
+    if (refreshToken) {
+        fetch(`${API_BASE_URL}/auth/logout`, {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ refresh_token: refreshToken }),
+            keepalive: true
+        }).catch((error) => console.error('Logout request failed:', error));
+    }
+    
     clearAuthData();
     window.location.href = '/';
 }
@@ -20,6 +20,7 @@ async function studentLogin() {
         }
         
         saveAuthData(response.token, 'student', response.student);
+        saveRefreshToken(response.refresh_token);
         showAlert('studentLoginAlert', 'Login successful! Redirecting...', 'success');
         setTimeout(() => {
             window.location.href = '/student/dashboard';
@@ -75,6 +76,7 @@ async function studentRegister() {
     try {
         const response = await StudentAPI.register(data);
         saveAuthData(response.token, 'student', response.student);
+        saveRefreshToken(response.refresh_token);
         showAlert('studentLoginAlert', '✓ Registration successful! Redirecting...', 'success');
         setTimeout(() => {
             window.location.href = '/student/dashboard';
@@ -122,6 +124,7 @@ async function teacherLogin() {
         
         // Save auth data
         saveAuthData(response.token, 'teacher', response.teacher);
+        saveRefreshToken(response.refresh_token);
         
         // Verify it was saved
         const savedToken = localStorage.getItem('token');
@@ -403,8 +403,31 @@ async function loadAttendanceHistory() {
     }
 }
 
+// Scan ticket: signed class details so marking does not need a student lookup.
+// Fetched when the scanner opens and reused until shortly before it expires.
+let scanTicket = null;
+let scanTicketExpiresAt = 0;
+
+async function getScanTicket() {
+    if (scanTicket && Date.now() < scanTicketExpiresAt - 30000) {
+        return scanTicket;
+    }
+    try {
+        const response = await AttendanceAPI.getScanTicket();
+        scanTicket = response.scan_ticket;
+        scanTicketExpiresAt = Date.now() + response.expires_in_seconds * 1000;
+        return scanTicket;
+    } catch (error) {
+        // Marking still works without a ticket (the server looks the student up)
+        console.log('Scan ticket not available:', error);
+        return null;
+    }
+}
+
 // Start QR code scanner with camera (mobile-friendly version)
 async function startScanner() {
+    getScanTicket();
+    
     try {
         // Check if HTML5 QR Code library is loaded
         if (typeof Html5Qrcode === 'undefined') {
@@ -697,7 +720,8 @@ async function markAttendanceWithData(qrData) {
             latitude,
             longitude,
             wifi_ssid: wifi_ssid,
-            wifi_bssid: wifi_bssid
+            wifi_bssid: wifi_bssid,
+            scan_ticket: await getScanTicket()
         });
         
         const wifiMsg = response.wifi_location ? `<br>WiFi: ${response.wifi_location}` : '';
@@ -1396,17 +1396,7 @@ window.addEventListener('beforeunload', () => {
 // Load WiFi networks
 async function loadWiFiNetworks() {
     try {
-        const response = await fetch('/api/teacher/wifi-networks', {
-            headers: {
-                'Authorization': `Bearer ${getAuthToken()}`
-            }
-        });
-        
-        const data = await response.json();
-        
-        if (!response.ok) {
-            throw new Error(data.error || 'Failed to load WiFi networks');
-        }
+        const data = await TeacherAPI.getWiFiNetworks();
         
         const tbody = document.getElementById('wifiNetworksBody');
         
@@ -1463,27 +1453,14 @@ async function addWiFiNetwork() {
         
         showAlert('wifiAlert', 'Adding WiFi network...', 'info');
         
-        const response = await fetch('/api/teacher/wifi-networks', {
-            method: 'POST',
-            headers: {
-                'Authorization': `Bearer ${getAuthToken()}`,
-                'Content-Type': 'application/json'
-            },
-            body: JSON.stringify({
-                ssid: ssid,
-                bssid: bssid || null,
-                location: location,
-                branch: branch,
-                room_number: roomNumber || null
-            })
+        await TeacherAPI.addWiFiNetwork({
+            ssid: ssid,
+            bssid: bssid || null,
+            location: location,
+            branch: branch,
+            room_number: roomNumber || null
         });
         
-        const data = await response.json();
-        
-        if (!response.ok) {
-            throw new Error(data.error || 'Failed to add WiFi network');
-        }
-        
         showAlert('wifiAlert', '✓ WiFi network added successfully!', 'success');
         
         // Clear form
@@ -1505,18 +1482,7 @@ async function deactivateWiFiNetwork(networkId) {
     }
     
     try {
-        const response = await fetch(`/api/teacher/wifi-networks/${networkId}`, {
-            method: 'DELETE',
-            headers: {
-                'Authorization': `Bearer ${getAuthToken()}`
-            }
-        });
-        
-        const data = await response.json();
-        
-        if (!response.ok) {
-            throw new Error(data.error || 'Failed to deactivate WiFi network');
-        }
+        await TeacherAPI.deactivateWiFiNetwork(networkId);
         
         showAlert('wifiAlert', '✓ WiFi network deactivated', 'success');
         await loadWiFiNetworks();
@@ -1530,22 +1496,7 @@ async function deactivateWiFiNetwork(networkId) {
 // Activate WiFi network
 async function activateWiFiNetwork(networkId) {
     try {
-        const response = await fetch(`/api/teacher/wifi-networks/${networkId}`, {
-            method: 'PUT',
-            headers: {
-                'Authorization': `Bearer ${getAuthToken()}`,
-                'Content-Type': 'application/json'
-            },
-            body: JSON.stringify({
-                is_active: true
-            })
-        });
-        
-        const data = await response.json();
-        
-        if (!response.ok) {
-            throw new Error(data.error || 'Failed to activate WiFi network');
-        }
+        await TeacherAPI.updateWiFiNetwork(networkId, { is_active: true });
         
         showAlert('wifiAlert', '✓ WiFi network activated', 'success');
         await loadWiFiNetworks();
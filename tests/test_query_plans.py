@@ -0,0 +1,55 @@
+"""Hot queries must keep using their indexes on a migrated schema"""
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask  # noqa: E402
+from models import db  # noqa: E402
+from utils.migrations import upgrade  # noqa: E402
+from utils.query_plans import check_query_plans, hot_queries  # noqa: E402
+
+
+# Index each hot query is expected to be served by
+EXPECTED_INDEXES = {
+    'students_by_class': 'idx_students_class',
+    'teacher_sessions_by_date': 'idx_sessions_teacher_date',
+    'teacher_active_sessions': 'idx_sessions_teacher_active',
+    'session_present_count': 'idx_attendance_session_status',
+    'mark_duplicate_check': 'idx_attendance_session_status',
+    'session_report_attendance': 'idx_attendance_session_status',
+    'recent_audit_logs': 'idx_audit_created_event_success',
+    'audit_keyset_page': 'idx_audit_created_event_success',
+}
+
+
+class QueryPlanTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        # A bare app on in-memory SQLite: only the schema built by the migrations matters here
+        cls.app = Flask(__name__)
+        cls.app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+        db.init_app(cls.app)
+        with cls.app.app_context():
+            upgrade()
+            cls.results = {result['name']: result for result in check_query_plans()}
+
+    def test_every_hot_query_is_checked(self):
+        self.assertEqual({name for name, _, _ in hot_queries()}, set(EXPECTED_INDEXES))
+
+    def test_no_full_table_scans(self):
+        for name, result in self.results.items():
+            with self.subTest(query=name):
+                self.assertFalse(result['full_scan'], result['plan'])
+
+    def test_hot_queries_use_their_index(self):
+        for name, index in EXPECTED_INDEXES.items():
+            with self.subTest(query=name):
+                plan = ' | '.join(self.results[name]['plan'])
+                self.assertIn(index, plan)
+
+
+if __name__ == '__main__':
+    unittest.main()
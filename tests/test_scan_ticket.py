@@ -0,0 +1,50 @@
+"""Scan ticket expiry must not depend on the host's timezone"""
+import os
+import sys
+import json
+import time
+import base64
+import unittest
+from datetime import datetime
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import Config  # noqa: E402
+from utils.auth import generate_scan_ticket, verify_scan_ticket  # noqa: E402
+
+
+STUDENT = SimpleNamespace(id=7, branch='Computer Science', semester=6, division='Division A')
+
+
+class ScanTicketTimezoneTest(unittest.TestCase):
+
+    def setUp(self):
+        self._tz = os.environ.get('TZ')
+
+    def tearDown(self):
+        if self._tz is None:
+            os.environ.pop('TZ', None)
+        else:
+            os.environ['TZ'] = self._tz
+        time.tzset()
+
+    def test_ticket_valid_for_scan_ticket_expiry_in_any_timezone(self):
+        for tz in ('UTC', 'Asia/Kolkata', 'America/Los_Angeles', 'Pacific/Kiritimati'):
+            with self.subTest(tz=tz):
+                os.environ['TZ'] = tz
+                time.tzset()
+                issued = time.time()
+                ticket, expires_at = generate_scan_ticket(STUDENT)
+
+                self.assertIsNotNone(verify_scan_ticket(ticket, STUDENT.id))
+                body = ticket.rsplit('.', 1)[0]
+                exp = json.loads(base64.urlsafe_b64decode(body + '=' * (-len(body) % 4)))['exp']
+                self.assertAlmostEqual(exp, issued + Config.SCAN_TICKET_EXPIRY, delta=2)
+                # The returned expiry is naive UTC, like the rest of the app's timestamps
+                self.assertAlmostEqual((expires_at - datetime.utcfromtimestamp(issued)).total_seconds(),
+                                       Config.SCAN_TICKET_EXPIRY, delta=2)
+
+
+if __name__ == '__main__':
+    unittest.main()
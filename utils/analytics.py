@@ -0,0 +1,255 @@
+"""
+Attendance Analytics
+Builds students x sessions attendance matrices for a subject with NumPy
+"""
+import csv
+import io
+import numpy as np
+from models import db, Student, Session, Attendance
+
+
+# Attendance statuses that count as attended in the matrix
+ATTENDED_STATUSES = ('Present', 'Late')
+
+
+class AttendanceMatrix:
+    """Boolean students x sessions matrix with vectorised aggregates"""
+
+    def __init__(self, students, sessions, present, threshold=75.0):
+        self.students = students    # list of (id, student_id, full_name, division)
+        self.sessions = sessions    # list of (id, session_id, session_date, division)
+        self.present = present      # np.ndarray[bool] shaped (len(students), len(sessions))
+        self.threshold = threshold
+        self.applicable = self._applicable_cells()
+        self._compute_aggregates()
+
+    def _applicable_cells(self):
+        """
+        Mask of the sessions each student was expected to attend
+
+        A session held for one division only counts for that division's students;
+        sessions without a division count for everyone (as in utils/defaulters.py).
+        """
+        student_divisions = np.array([s[3] for s in self.students], dtype=object)
+        session_divisions = np.array([s[3] for s in self.sessions], dtype=object)
+        applicable = student_divisions[:, None] == session_divisions[None, :]
+        applicable |= np.array([d is None for d in session_divisions], dtype=bool)[None, :]
+        return applicable.reshape(self.present.shape)
+
+    def _compute_aggregates(self):
+        """Compute per-student and per-session aggregates over the applicable cells"""
+        n_students, n_sessions = self.present.shape
+        present = self.present & self.applicable
+
+        self.student_present = present.sum(axis=1)
+        self.session_present = present.sum(axis=0)
+        self.student_total = self.applicable.sum(axis=1)
+        self.session_total = self.applicable.sum(axis=0)
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            self.student_percentage = np.where(
+                self.student_total > 0, self.student_present * 100.0 / self.student_total, 0.0)
+            self.session_percentage = np.where(
+                self.session_total > 0, self.session_present * 100.0 / self.session_total, 0.0)
+
+        # Students with no applicable sessions yet are not defaulters
+        self.below_threshold = (self.student_total > 0) & (self.student_percentage < self.threshold)
+
+        # Streaks are scanned column by column (sessions are few) while each
+        # step is vectorised across every student; other divisions' sessions
+        # leave a student's runs untouched
+        absent_run = np.zeros(n_students, dtype=np.int32)
+        present_run = np.zeros(n_students, dtype=np.int32)
+        self.longest_absent_streak = np.zeros(n_students, dtype=np.int32)
+        self.longest_present_streak = np.zeros(n_students, dtype=np.int32)
+        for column in range(n_sessions):
+            attended = present[:, column]
+            expected = self.applicable[:, column]
+            absent_run = np.where(expected, np.where(attended, 0, absent_run + 1), absent_run)
+            present_run = np.where(expected, np.where(attended, present_run + 1, 0), present_run)
+            np.maximum(self.longest_absent_streak, absent_run, out=self.longest_absent_streak)
+            np.maximum(self.longest_present_streak, present_run, out=self.longest_present_streak)
+        self.current_absent_streak = absent_run
+        self.current_present_streak = present_run
+
+    def average_percentage(self):
+        """Mean attendance percentage of the students who had at least one session"""
+        measured = self.student_total > 0
+        if not measured.any():
+            return 0
+        return round(float(self.student_percentage[measured].mean()), 2)
+
+    def session_labels(self):
+        """Column labels for the session axis"""
+        return [f"{session_date.isoformat()} {session_id}" for _, session_id, session_date, _ in self.sessions]
+
+    def to_dict(self):
+        return {
+            'threshold': self.threshold,
+            'sessions': [
+                {
+                    'session_id': session_id,
+                    'session_date': session_date.isoformat(),
+                    'division': session_division,
+                    'present': int(self.session_present[col]),
+                    'expected': int(self.session_total[col]),
+                    'percentage': round(float(self.session_percentage[col]), 2),
+                }
+                for col, (_, session_id, session_date, session_division) in enumerate(self.sessions)
+            ],
+            'students': [
+                {
+                    'student_id': student_id,
+                    'student_name': full_name,
+                    'division': division,
+                    'attendance': ''.join(self._cells(row)),
+                    'present': int(self.student_present[row]),
+                    'total_sessions': int(self.student_total[row]),
+                    'percentage': round(float(self.student_percentage[row]), 2),
+                    'longest_absent_streak': int(self.longest_absent_streak[row]),
+                    'current_absent_streak': int(self.current_absent_streak[row]),
+                    'longest_present_streak': int(self.longest_present_streak[row]),
+                    'below_threshold': bool(self.below_threshold[row]),
+                }
+                for row, (_, student_id, full_name, division) in enumerate(self.students)
+            ],
+            'summary': {
+                'total_students': len(self.students),
+                'total_sessions': len(self.sessions),
+                'below_threshold': int(self.below_threshold.sum()),
+                'average_percentage': self.average_percentage(),
+            }
+        }
+
+    def _cells(self, row):
+        """P/A per session for one student, '-' for sessions of another division"""
+        return ['-' if not expected else 'P' if cell else 'A'
+                for cell, expected in zip(self.present[row], self.applicable[row])]
+
+    def rows(self):
+        """Yield tabular rows (header first) for CSV/XLSX export"""
+        yield (['student_id', 'student_name', 'division'] + self.session_labels() +
+               ['present', 'total_sessions', 'percentage', 'longest_absent_streak',
+                'current_absent_streak', 'below_threshold'])
+
+        for row, (_, student_id, full_name, division) in enumerate(self.students):
+            yield ([student_id, full_name, division or ''] +
+                   self._cells(row) +
+                   [int(self.student_present[row]), int(self.student_total[row]),
+                    round(float(self.student_percentage[row]), 2),
+                    int(self.longest_absent_streak[row]), int(self.current_absent_streak[row]),
+                    'YES' if self.below_threshold[row] else 'NO'])
+
+        yield (['', 'Session attendance %', ''] +
+               [round(float(value), 2) for value in self.session_percentage] +
+               ['', '', '', '', '', ''])
+
+    def to_csv(self):
+        """Export as CSV text (with a BOM so Excel detects UTF-8)"""
+        buffer = io.StringIO()
+        buffer.write('\ufeff')
+        writer = csv.writer(buffer)
+        for row in self.rows():
+            writer.writerow(row)
+        return buffer.getvalue()
+
+    def to_xlsx(self):
+        """Export as XLSX bytes (requires openpyxl)"""
+        try:
+            from openpyxl import Workbook
+        except ImportError:
+            raise RuntimeError('XLSX export requires openpyxl to be installed')
+
+        workbook = Workbook(write_only=True)
+        sheet = workbook.create_sheet('Attendance')
+        for row in self.rows():
+            sheet.append(row)
+
+        buffer = io.BytesIO()
+        workbook.save(buffer)
+        return buffer.getvalue()
+
+
+def _matrix_queries(branch, semester, subject, division=None, teacher_id=None):
+    """The roster and session queries that form the matrix rows and columns"""
+    students_query = db.session.query(
+        Student.id, Student.student_id, Student.full_name, Student.division
+    ).filter(
+        Student.branch == branch,
+        Student.semester == semester
+    )
+
+    sessions_query = db.session.query(
+        Session.id, Session.session_id, Session.session_date, Session.division
+    ).filter(
+        Session.branch == branch,
+        Session.semester == semester,
+        Session.subject == subject
+    )
+
+    if division:
+        students_query = students_query.filter(Student.division == division)
+        sessions_query = sessions_query.filter(Session.division == division)
+    if teacher_id:
+        sessions_query = sessions_query.filter(Session.teacher_id == teacher_id)
+
+    return students_query, sessions_query
+
+
+def count_matrix_cells(branch, semester, subject, division=None, teacher_id=None):
+    """Number of cells (students x sessions) the matrix would have, from two COUNT queries"""
+    students_query, sessions_query = _matrix_queries(branch, semester, subject, division, teacher_id)
+    return students_query.count() * sessions_query.count()
+
+
+def build_attendance_matrix(branch, semester, subject, division=None, teacher_id=None, threshold=75.0):
+    """
+    Build the attendance matrix for one subject of a branch/semester
+
+    Args:
+        branch: Branch of the class
+        semester: Semester of the class
+        subject: Subject whose sessions form the columns
+        division: Restrict to one division (optional); without it each student is
+            only measured against sessions of their own division
+        teacher_id: Restrict to sessions taken by this teacher (optional)
+        threshold: Attendance percentage below which a student is flagged
+
+    Returns:
+        AttendanceMatrix
+    """
+    students_query, sessions_query = _matrix_queries(branch, semester, subject, division, teacher_id)
+
+    students = students_query.order_by(Student.student_id).all()
+    sessions = sessions_query.order_by(Session.session_date, Session.start_time, Session.id).all()
+
+    # All (student, session) pairs for the selected sessions in one round trip
+    session_ids = sessions_query.with_entities(Session.id)
+    pairs = db.session.query(
+        Attendance.student_id, Attendance.session_id
+    ).filter(
+        Attendance.session_id.in_(session_ids.scalar_subquery()),
+        Attendance.status.in_(ATTENDED_STATUSES)
+    ).all()
+
+    present = np.zeros((len(students), len(sessions)), dtype=bool)
+
+    if pairs and students and sessions:
+        student_pks = np.array([s[0] for s in students], dtype=np.int64)
+        session_pks = np.array([s[0] for s in sessions], dtype=np.int64)
+        student_order = np.argsort(student_pks)
+        session_order = np.argsort(session_pks)
+
+        pair_array = np.array(pairs, dtype=np.int64)
+        rows = np.searchsorted(student_pks, pair_array[:, 0], sorter=student_order)
+        cols = np.searchsorted(session_pks, pair_array[:, 1], sorter=session_order)
+
+        # Drop pairs for students outside the roster (e.g. moved division)
+        rows = np.clip(rows, 0, len(student_pks) - 1)
+        cols = np.clip(cols, 0, len(session_pks) - 1)
+        matched = ((student_pks[student_order[rows]] == pair_array[:, 0]) &
+                   (session_pks[session_order[cols]] == pair_array[:, 1]))
+
+        present[student_order[rows[matched]], session_order[cols[matched]]] = True
+
+    return AttendanceMatrix(students, sessions, present, threshold=threshold)
@@ -0,0 +1,179 @@
+"""
+Audit Log Archival
+Moves closed daily buckets of audit_logs into compressed JSON lines files and
+reads them back for queries that reach past the retention window
+"""
+import os
+import re
+import gzip
+import json
+from datetime import datetime, date, time, timedelta
+from models import db, AuditLog
+from config import Config
+
+
+_ARCHIVE_NAME = re.compile(r'^audit-(\d{4}-\d{2}-\d{2})\.jsonl\.gz$')
+
+
+def _archive_dir():
+    os.makedirs(Config.AUDIT_ARCHIVE_DIR, exist_ok=True)
+    return Config.AUDIT_ARCHIVE_DIR
+
+
+def _archive_path(bucket):
+    return os.path.join(_archive_dir(), f'audit-{bucket.isoformat()}.jsonl.gz')
+
+
+def list_archived_buckets():
+    """Dates of all archived daily buckets, oldest first"""
+    if not os.path.isdir(Config.AUDIT_ARCHIVE_DIR):
+        return []
+    buckets = []
+    for name in os.listdir(Config.AUDIT_ARCHIVE_DIR):
+        match = _ARCHIVE_NAME.match(name)
+        if match:
+            buckets.append(date.fromisoformat(match.group(1)))
+    return sorted(buckets)
+
+
+def _iter_bucket(bucket):
+    """Stream archived records of one bucket, newest first"""
+    try:
+        with gzip.open(_archive_path(bucket), 'rt', encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+    except OSError:
+        return
+
+
+def _write_bucket(bucket, records):
+    """
+    Write records (newest first by created_at, id) to a bucket's archive file atomically
+
+    If the bucket was already archived (a rerun after a crash between writing
+    the file and deleting the rows) the old records are merged in by id.
+    """
+    path = _archive_path(bucket)
+    if os.path.exists(path):
+        merged = {record['id']: record for record in _iter_bucket(bucket)}
+        merged.update((record['id'], record) for record in records)
+        records = sorted(merged.values(), key=lambda record: (record['created_at'], record['id']), reverse=True)
+
+    count = 0
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'wb') as raw:
+        with gzip.open(raw, 'wt', encoding='utf-8') as f:
+            for record in records:
+                f.write(json.dumps(record))
+                f.write('\n')
+                count += 1
+        raw.flush()
+        os.fsync(raw.fileno())
+    os.replace(tmp_path, path)
+    return count
+
+
+def archive_closed_buckets(retention_days=None):
+    """
+    Archive and delete audit rows from days older than the retention window
+
+    Args:
+        retention_days: Days of audit logs kept in the database
+
+    Returns:
+        dict: Bucket date -> number of rows archived
+    """
+    if retention_days is None:
+        retention_days = Config.AUDIT_RETENTION_DAYS
+
+    # created_at is UTC, so the retention window is counted in UTC days
+    cutoff = datetime.combine(datetime.utcnow().date() - timedelta(days=retention_days), time.min)
+
+    def next_bucket(after):
+        oldest = db.session.query(db.func.min(AuditLog.created_at)).filter(
+            AuditLog.created_at >= after,
+            AuditLog.created_at < cutoff
+        ).scalar()
+        return oldest.date() if oldest else None
+
+    archived = {}
+    bucket = next_bucket(datetime.min)
+    while bucket:
+        bucket_start = datetime.combine(bucket, time.min)
+        bucket_end = bucket_start + timedelta(days=1)
+        in_bucket = (AuditLog.created_at >= bucket_start) & (AuditLog.created_at < bucket_end)
+
+        # Same order as the (created_at, id) keyset readers page by; aggregate
+        # rows carry an earlier created_at than rows inserted before them
+        rows = AuditLog.query.filter(in_bucket).order_by(
+            AuditLog.created_at.desc(), AuditLog.id.desc()
+        ).yield_per(1000)
+
+        # The file is durable before the rows are deleted
+        count = _write_bucket(bucket, (log.to_dict() for log in rows))
+        AuditLog.query.filter(in_bucket).delete(synchronize_session=False)
+        db.session.commit()
+        archived[bucket.isoformat()] = count
+
+        bucket = next_bucket(bucket_end)
+
+    return archived
+
+
+def audit_id_key(log_id):
+    """
+    Sort key for audit log ids
+
+    Table and archive ids are integers; file sink ids are 'pid-segment-counter'
+    strings, compared part by part as integers so '1-1-10' sorts after '1-1-9'.
+    """
+    if isinstance(log_id, str):
+        return tuple(int(part) for part in log_id.split('-'))
+    return (log_id,)
+
+
+def record_matches(record, user_id, session_id, event_type, start_time, end_time, user_type=None):
+    """
+    Check a serialised audit record (AuditLog.to_dict shape) against query filters
+
+    event_type may be a single event type or a list of them.
+    """
+    if user_id and record.get('user_id') != user_id:
+        return False
+    if user_type and record.get('user_type') != user_type:
+        return False
+    if session_id and record.get('session_id') != session_id:
+        return False
+    if event_type:
+        event_types = event_type if isinstance(event_type, (list, tuple)) else (event_type,)
+        if record.get('event_type') not in event_types:
+            return False
+    if start_time or end_time:
+        created_at = datetime.fromisoformat(record['created_at']) if record.get('created_at') else None
+        if created_at is None:
+            return False
+        if start_time and created_at < start_time:
+            return False
+        if end_time and created_at >= end_time:
+            return False
+    return True
+
+
+def iter_archived_logs(user_id=None, session_id=None, event_type=None, start_time=None, end_time=None,
+                       user_type=None):
+    """
+    Stream archived audit logs (newest first) matching the filters
+
+    Only bucket files overlapping [start_time, end_time) are opened.
+    """
+    for bucket in reversed(list_archived_buckets()):
+        bucket_start = datetime.combine(bucket, time.min)
+        if end_time and bucket_start >= end_time:
+            continue
+        if start_time and bucket_start + timedelta(days=1) <= start_time:
+            break
+
+        for record in _iter_bucket(bucket):
+            if record_matches(record, user_id, session_id, event_type, start_time, end_time, user_type):
+                yield record
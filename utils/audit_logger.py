@@ -2,10 +2,177 @@
 Audit Logging Utility for Security Events
 Tracks all security-related events and authentication attempts
 """
+import os
 import json
-from datetime import datetime
-from models import db, AuditLog
-from flask import request
+import time
+import base64
+import atexit
+import threading
+from datetime import datetime, timedelta
+from models import db, AuditLog, UserAgent
+from sqlalchemy import func, or_, and_, cast, Integer
+from flask import request, current_app
+from config import Config
+from utils.audit_archive import audit_id_key
+from utils.security_metrics import get_security_metrics, build_security_summary
+from utils.metrics import add_request_time
+
+
+# Always written in full, whatever the sampling policy says
+ALWAYS_KEPT_EVENTS = ('UNAUTHORIZED_ACCESS',)
+
+
+def parse_audit_sampling(spec):
+    """
+    Parse an AUDIT_SAMPLING policy such as 'QR_SCANNED=aggregate,WIFI_VERIFIED=10'
+    
+    Returns:
+        dict: Event type -> 'aggregate' or N (keep one in N); 'full' entries are left out
+    """
+    policy = {}
+    for entry in (spec or '').split(','):
+        if not entry.strip():
+            continue
+        event_type, _, mode = entry.partition('=')
+        event_type, mode = event_type.strip().upper(), mode.strip().lower()
+        if event_type in ALWAYS_KEPT_EVENTS or mode in ('', 'full'):
+            continue
+        if mode == 'aggregate':
+            policy[event_type] = mode
+        elif mode.isdigit() and int(mode) > 1:
+            policy[event_type] = int(mode)
+        elif mode != '1':
+            print(f"Ignoring invalid audit sampling entry: {entry.strip()}")
+    return policy
+
+
+def _write_audit_records(records):
+    """Write serialised audit records to the configured backend; returns their ids"""
+    if Config.AUDIT_BACKEND == 'file':
+        from utils.audit_sink import get_file_sink
+        
+        sink = get_file_sink()
+        return [sink.append(record) for record in records]
+    
+    from utils.user_agents import intern_user_agent
+    
+    entries = []
+    for record in records:
+        row = dict(record, created_at=datetime.fromisoformat(record['created_at']))
+        row['user_agent_id'] = intern_user_agent(row.pop('user_agent', None))
+        entries.append(AuditLog(**row))
+    db.session.add_all(entries)
+    db.session.commit()
+    return [entry.id for entry in entries]
+
+
+class AuditAggregator:
+    """
+    Collapses successful events of aggregated types into one row per
+    (event type, session, minute) carrying the event count
+    
+    Buckets are written when their minute is over (checked on every event and
+    by a background thread) and when the process exits.
+    """
+    
+    def __init__(self, app):
+        self.pid = os.getpid()
+        self._app = app
+        self._lock = threading.Lock()
+        self._buckets = {}
+        self._closed = []  # buckets replaced on minute rollover, waiting to be written
+        
+        self._stop = threading.Event()
+        self._flusher = threading.Thread(target=self._flush_loop, daemon=True)
+        self._flusher.start()
+        atexit.register(self.close)
+    
+    def add(self, event_type, user_id, user_type, session_id, created_at):
+        minute = created_at.replace(second=0, microsecond=0)
+        key = (event_type, user_type, session_id)
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None or bucket['minute'] != minute:
+                if bucket is not None:
+                    self._closed.append(self._buckets.pop(key))
+                bucket = self._buckets[key] = {
+                    'event_type': event_type, 'user_type': user_type, 'session_id': session_id,
+                    'minute': minute, 'count': 0, 'users': set(), 'last_at': created_at
+                }
+            bucket['count'] += 1
+            bucket['last_at'] = created_at
+            if user_id is not None:
+                bucket['users'].add(user_id)
+        self.flush(created_at)
+    
+    def flush(self, now=None, everything=False):
+        """Write every bucket whose minute has ended (or all of them)"""
+        current_minute = (now or datetime.utcnow()).replace(second=0, microsecond=0)
+        with self._lock:
+            done = self._closed[:]
+            self._closed.clear()
+            for key, bucket in list(self._buckets.items()):
+                if everything or bucket['minute'] < current_minute:
+                    done.append(self._buckets.pop(key))
+        if not done:
+            return
+        
+        records = [{
+            'event_type': bucket['event_type'],
+            'user_id': None,
+            'user_type': bucket['user_type'],
+            'session_id': bucket['session_id'],
+            'details': json.dumps({
+                'aggregated': True,
+                'window_start': bucket['minute'].isoformat(),
+                'window_end': (bucket['minute'] + timedelta(minutes=1)).isoformat(),
+                'distinct_users': len(bucket['users'])
+            }),
+            'ip_address': None,
+            'user_agent': None,
+            'success': True,
+            'failure_reason': None,
+            'event_count': bucket['count'],
+            'created_at': bucket['last_at'].isoformat()
+        } for bucket in done]
+        
+        try:
+            # Own app context (and so its own session) so a request's pending work is not committed
+            with self._app.app_context():
+                _write_audit_records(records)
+        except Exception as e:
+            print(f"Audit aggregate flush failed: {str(e)}")
+    
+    def _flush_loop(self):
+        while not self._stop.wait(15):
+            self.flush()
+    
+    def close(self):
+        self._stop.set()
+        self.flush(everything=True)
+
+
+_sampling_policy = None
+_sample_counters = {}
+_aggregator = None
+_aggregator_lock = threading.Lock()
+
+
+def get_sampling_policy():
+    """The parsed AUDIT_SAMPLING policy (parsed once per process)"""
+    global _sampling_policy
+    if _sampling_policy is None:
+        _sampling_policy = parse_audit_sampling(Config.AUDIT_SAMPLING)
+    return _sampling_policy
+
+
+def get_audit_aggregator():
+    """The current process's aggregator (recreated after a fork)"""
+    global _aggregator
+    with _aggregator_lock:
+        if _aggregator is None or _aggregator.pid != os.getpid():
+            _aggregator = AuditAggregator(current_app._get_current_object())
+        return _aggregator
 
 
 def log_security_event(event_type, user_id=None, user_type=None, session_id=None, 
@@ -13,6 +180,10 @@ def log_security_event(event_type, user_id=None, user_type=None, session_id=None
     """
     Log security events to audit trail
     
+    Successful events are sampled or aggregated according to AUDIT_SAMPLING;
+    failures and UNAUTHORIZED_ACCESS are always written in full. The rolling
+    security metrics count every event either way.
+    
     Args:
         event_type: Type of security event
         user_id: ID of user involved
@@ -21,34 +192,65 @@ def log_security_event(event_type, user_id=None, user_type=None, session_id=None
         details: Additional event details (dict)
         success: Whether the event was successful
         failure_reason: Reason for failure if unsuccessful
+    
+    Returns:
+        ID of the audit entry, or None if the event was sampled out or aggregated
     """
+    started = time.perf_counter()
     try:
-        # Get request information
-        ip_address = request.remote_addr if request else None
-        user_agent = request.headers.get('User-Agent') if request else None
+        created_at = datetime.utcnow()
+        entry_id = None
+        record = None
+        event_count = 1
         
-        # Create audit log entry
-        audit_entry = AuditLog(
-            event_type=event_type,
-            user_id=user_id,
-            user_type=user_type,
-            session_id=session_id,
-            details=json.dumps(details) if details else None,
-            ip_address=ip_address,
-            user_agent=user_agent,
-            success=success,
-            failure_reason=failure_reason
-        )
+        mode = get_sampling_policy().get(event_type) if success else None
+        
+        if mode == 'aggregate':
+            get_audit_aggregator().add(event_type, user_id, user_type, session_id, created_at)
+        else:
+            keep = True
+            if mode:
+                # Keep one in N, standing for all N
+                # Request threads and the aggregator thread share this module's state lock
+                with _aggregator_lock:
+                    seen = _sample_counters.get(event_type, 0)
+                    _sample_counters[event_type] = seen + 1
+                keep = seen % mode == 0
+                event_count = mode
+            
+            if keep:
+                # Get request information
+                ip_address = request.remote_addr if request else None
+                user_agent = request.headers.get('User-Agent') if request else None
+                
+                record = {
+                    'event_type': event_type,
+                    'user_id': user_id,
+                    'user_type': user_type,
+                    'session_id': session_id,
+                    'details': json.dumps(details) if details else None,
+                    'ip_address': ip_address,
+                    'user_agent': user_agent[:500] if user_agent else None,
+                    'success': success,
+                    'failure_reason': failure_reason,
+                    'event_count': event_count,
+                    'created_at': created_at.isoformat()
+                }
+                entry_id, = _write_audit_records([record])
+                record = dict(record, id=entry_id)
         
-        db.session.add(audit_entry)
-        db.session.commit()
+        # Keep the rolling dashboard counters current
+        get_security_metrics().record(event_type, success, record if not success else None)
         
-        return audit_entry.id
+        return entry_id
         
     except Exception as e:
         # If logging fails, we don't want to break the main flow
         print(f"Audit logging failed: {str(e)}")
         return None
+    
+    finally:
+        add_request_time('audit', time.perf_counter() - started)
 
 
 def log_qr_generation(teacher_id, session_id, qr_token, expires_at):
@@ -136,7 +338,153 @@ def log_unauthorized_access(user_id, user_type, session_id, details=None):
     )
 
 
-def get_audit_logs(user_id=None, session_id=None, event_type=None, limit=100):
+# Fields of a serialised audit log (AuditLog.to_dict), selectable via `fields`
+AUDIT_LOG_FIELDS = ('id', 'event_type', 'user_id', 'user_type', 'session_id', 'details',
+                    'ip_address', 'user_agent', 'success', 'failure_reason', 'event_count', 'created_at')
+
+
+def encode_audit_cursor(log):
+    """Opaque keyset cursor pointing just after a serialised audit log"""
+    raw = json.dumps([log['created_at'], log['id']]).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii')
+
+
+def decode_audit_cursor(cursor):
+    """Decode a cursor into (created_at ISO string, id); raises ValueError if malformed"""
+    try:
+        created_at, log_id = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        datetime.fromisoformat(created_at)
+        return created_at, log_id
+    except Exception:
+        raise ValueError('Invalid cursor')
+
+
+def _project(record, fields):
+    if not fields:
+        return record
+    return {field: record.get(field) for field in fields}
+
+
+def _before_cursor(record, after):
+    """Keyset test for serialised records: (created_at, id) < after"""
+    if after is None:
+        return True
+    created_at, log_id = after
+    if record['created_at'] != created_at:
+        return record['created_at'] < created_at
+    return audit_id_key(record['id']) < audit_id_key(log_id)
+
+
+def iter_audit_logs(user_id=None, session_id=None, event_type=None, start_time=None, end_time=None,
+                    user_type=None, after=None, fields=None, limit=None, batch_size=1000, include_archive=False):
+    """
+    Stream audit logs newest first, ordered by (created_at, id) descending
+    
+    With AUDIT_BACKEND=file the segment files are read. Archived days are only
+    read with include_archive, since reaching them decompresses archive files.
+    
+    Args:
+        user_id: Filter by user ID
+        session_id: Filter by session ID
+        event_type: Filter by event type (or a list of event types)
+        start_time: Only logs created at or after this time
+        end_time: Only logs created before this time
+        user_type: Filter by user type (student/teacher)
+        after: Keyset position (created_at ISO string, id) to continue after
+        fields: Only include these AUDIT_LOG_FIELDS in each entry
+        limit: Stop after this many entries
+        batch_size: Number of rows fetched per round trip
+        include_archive: Continue into the archived days once the table is exhausted
+    
+    Yields:
+        dict: Audit log entries
+    """
+    if isinstance(event_type, str):
+        event_type = [event_type]
+    
+    count = 0
+    
+    if Config.AUDIT_BACKEND == 'file':
+        from utils.audit_sink import iter_sink_records
+        
+        for record in iter_sink_records(user_id, session_id, event_type, start_time, end_time, user_type,
+                                        after=after):
+            if limit is not None and count >= limit:
+                return
+            if _before_cursor(record, after):
+                count += 1
+                yield _project(record, fields)
+        return
+    
+    if fields:
+        columns = []
+        for field in AUDIT_LOG_FIELDS:
+            if field == 'user_agent' and field in fields:
+                columns.append(func.coalesce(AuditLog.user_agent, UserAgent.user_agent).label('user_agent'))
+            elif field in fields or field in ('id', 'created_at'):
+                columns.append(getattr(AuditLog, field))
+        query = db.session.query(*columns).select_from(AuditLog)
+        if 'user_agent' in fields:
+            query = query.outerjoin(UserAgent, AuditLog.user_agent_id == UserAgent.id)
+    else:
+        query = AuditLog.query
+    
+    if user_id:
+        query = query.filter(AuditLog.user_id == user_id)
+    if user_type:
+        query = query.filter(AuditLog.user_type == user_type)
+    if session_id:
+        query = query.filter(AuditLog.session_id == session_id)
+    if event_type:
+        query = query.filter(AuditLog.event_type.in_(event_type))
+    if start_time:
+        query = query.filter(AuditLog.created_at >= start_time)
+    if end_time:
+        query = query.filter(AuditLog.created_at < end_time)
+    if after:
+        after_created_at = datetime.fromisoformat(after[0])
+        query = query.filter(or_(
+            AuditLog.created_at < after_created_at,
+            and_(AuditLog.created_at == after_created_at, AuditLog.id < after[1])
+        ))
+    
+    query = query.order_by(AuditLog.created_at.desc(), AuditLog.id.desc())
+    if limit is not None:
+        query = query.limit(limit)
+    
+    oldest = None
+    for row in query.yield_per(batch_size):
+        if fields:
+            record = row._asdict()
+            record['created_at'] = record['created_at'].isoformat() if record['created_at'] else None
+        else:
+            record = row.to_dict()
+        oldest = record
+        count += 1
+        yield _project(record, fields)
+    
+    if not include_archive or (limit is not None and count >= limit):
+        return
+    
+    # Archived rows are all older than anything left in the table
+    from utils.audit_archive import iter_archived_logs
+    
+    archive_end = end_time
+    if oldest and oldest['created_at']:
+        oldest_created_at = datetime.fromisoformat(oldest['created_at'])
+        archive_end = min(archive_end, oldest_created_at) if archive_end else oldest_created_at
+        after = (oldest['created_at'], oldest['id'])
+    
+    for record in iter_archived_logs(user_id, session_id, event_type, start_time, archive_end, user_type):
+        if limit is not None and count >= limit:
+            return
+        if _before_cursor(record, after):
+            count += 1
+            yield _project(record, fields)
+
+
+def get_audit_logs(user_id=None, session_id=None, event_type=None, limit=100,
+                   start_time=None, end_time=None):
     """
     Retrieve audit logs with filtering
     
@@ -145,29 +493,84 @@ def get_audit_logs(user_id=None, session_id=None, event_type=None, limit=100):
         session_id: Filter by session ID
         event_type: Filter by event type
         limit: Maximum number of records to return
+        start_time: Only logs created at or after this time
+        end_time: Only logs created before this time
     
     Returns:
         list: Audit log entries
     """
     try:
-        query = AuditLog.query
-        
-        if user_id:
-            query = query.filter_by(user_id=user_id)
-        if session_id:
-            query = query.filter_by(session_id=session_id)
-        if event_type:
-            query = query.filter_by(event_type=event_type)
-        
-        logs = query.order_by(AuditLog.created_at.desc()).limit(limit).all()
-        
-        return [log.to_dict() for log in logs]
+        return list(iter_audit_logs(
+            user_id=user_id,
+            session_id=session_id,
+            event_type=event_type,
+            start_time=start_time,
+            end_time=end_time,
+            limit=limit
+        ))
         
     except Exception as e:
         print(f"Failed to retrieve audit logs: {str(e)}")
         return []
 
 
+def query_audit_logs(user_id=None, user_type=None, session_id=None, event_type=None,
+                     start_time=None, end_time=None, cursor=None, limit=100, fields=None, include_archive=False):
+    """
+    Retrieve one page of audit logs using keyset pagination on (created_at, id)
+    
+    Returns:
+        tuple: (list of audit log entries, cursor for the next page or None)
+    """
+    after = decode_audit_cursor(cursor) if cursor else None
+    
+    logs = list(iter_audit_logs(
+        user_id=user_id,
+        user_type=user_type,
+        session_id=session_id,
+        event_type=event_type,
+        start_time=start_time,
+        end_time=end_time,
+        after=after,
+        fields=tuple(fields) + ('id', 'created_at') if fields else None,
+        limit=limit + 1,
+        include_archive=include_archive
+    ))
+    
+    next_cursor = None
+    if len(logs) > limit:
+        logs = logs[:limit]
+        next_cursor = encode_audit_cursor(logs[-1])
+    
+    if fields:
+        logs = [{field: log[field] for field in fields} for log in logs]
+    
+    return logs, next_cursor
+
+
+def get_recent_failures(hours=1, limit=10):
+    """Most recent failed events within the last hours"""
+    since = datetime.utcnow() - timedelta(hours=hours)
+    
+    if Config.AUDIT_BACKEND == 'file':
+        from utils.audit_sink import iter_sink_records
+        
+        failures = []
+        for record in iter_sink_records(start_time=since):
+            if not record['success']:
+                failures.append(record)
+                if len(failures) >= limit:
+                    break
+        return failures
+    
+    recent_failures = AuditLog.query.filter(
+        AuditLog.created_at >= since,
+        AuditLog.success == False
+    ).order_by(AuditLog.created_at.desc()).limit(limit).all()
+    
+    return [log.to_dict() for log in recent_failures]
+
+
 def get_security_summary(session_id=None, hours=24):
     """
     Get security summary for a session or time period
@@ -180,56 +583,31 @@ def get_security_summary(session_id=None, hours=24):
         dict: Security summary statistics
     """
     try:
-        from datetime import timedelta
-        
         # Calculate time threshold
         time_threshold = datetime.utcnow() - timedelta(hours=hours)
         
-        # Base query
-        query = AuditLog.query.filter(AuditLog.created_at >= time_threshold)
-        
-        if session_id:
-            query = query.filter_by(session_id=session_id)
-        
-        # Get all logs
-        logs = query.all()
-        
-        # Calculate statistics
-        total_events = len(logs)
-        successful_events = len([log for log in logs if log.success])
-        failed_events = total_events - successful_events
+        if Config.AUDIT_BACKEND == 'file':
+            from collections import Counter
+            from utils.audit_sink import iter_sink_records
+            
+            counter = Counter()
+            for record in iter_sink_records(session_id=session_id, start_time=time_threshold):
+                counter[(record['event_type'], record['success'])] += record.get('event_count', 1)
+            counts = [(event_type, success, count) for (event_type, success), count in counter.items()]
+        else:
+            # Aggregate in the database; only (event_type, success, count) rows come back
+            query = db.session.query(
+                AuditLog.event_type,
+                AuditLog.success,
+                cast(func.sum(AuditLog.event_count), Integer)  # SUM is DECIMAL on MySQL/Postgres
+            ).filter(AuditLog.created_at >= time_threshold)
+            
+            if session_id:
+                query = query.filter(AuditLog.session_id == session_id)
+            
+            counts = query.group_by(AuditLog.event_type, AuditLog.success).all()
         
-        # Event type breakdown
-        event_types = {}
-        for log in logs:
-            event_type = log.event_type
-            if event_type not in event_types:
-                event_types[event_type] = {'total': 0, 'successful': 0, 'failed': 0}
-            event_types[event_type]['total'] += 1
-            if log.success:
-                event_types[event_type]['successful'] += 1
-            else:
-                event_types[event_type]['failed'] += 1
-        
-        # Security alerts
-        security_alerts = []
-        if failed_events > total_events * 0.1:  # More than 10% failure rate
-            security_alerts.append("High failure rate detected")
-        
-        unauthorized_access = len([log for log in logs if log.event_type == 'UNAUTHORIZED_ACCESS'])
-        if unauthorized_access > 0:
-            security_alerts.append(f"{unauthorized_access} unauthorized access attempts")
-        
-        return {
-            'total_events': total_events,
-            'successful_events': successful_events,
-            'failed_events': failed_events,
-            'success_rate': (successful_events / total_events * 100) if total_events > 0 else 0,
-            'event_types': event_types,
-            'security_alerts': security_alerts,
-            'time_period_hours': hours,
-            'generated_at': datetime.utcnow().isoformat()
-        }
+        return build_security_summary(counts, hours)
         
     except Exception as e:
         print(f"Failed to generate security summary: {str(e)}")
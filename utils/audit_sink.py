@@ -0,0 +1,309 @@
+"""
+Append-only File Audit Sink
+Alternative audit backend (AUDIT_BACKEND=file) that writes events as JSON
+lines to local segment files instead of the database.
+
+- Each process appends to its own segment, so workers never interleave writes
+- Writes are flushed immediately and fsynced in groups (every
+  AUDIT_FSYNC_BATCH events or AUDIT_FSYNC_INTERVAL_MS, whichever comes first)
+- Segments rotate at AUDIT_SEGMENT_MAX_BYTES; a sealed segment gets a small
+  sidecar index (time range, session ids, count) so readers can skip it
+- replay_audit_segments.py loads sealed segments into audit_logs later and
+  renames them to *.loaded; readers keep reading loaded segments, so events
+  stay visible while the file backend is active, but open sealed segments
+  newest first and only as far as the caller reads
+"""
+import os
+import re
+import json
+import time
+import heapq
+import atexit
+import threading
+from datetime import datetime
+from config import Config
+from utils.audit_archive import record_matches, audit_id_key
+
+
+_SEGMENT_NAME = re.compile(r'^segment-(\d+)-(\d+)\.jsonl$')
+_LOADED_SEGMENT_NAME = re.compile(r'^segment-(\d+)-(\d+)\.jsonl\.loaded$')
+
+
+class FileAuditSink:
+    """Per-process writer for append-only audit segment files"""
+
+    def __init__(self, directory, segment_max_bytes, fsync_interval_ms, fsync_batch):
+        self.directory = directory
+        self.segment_max_bytes = segment_max_bytes
+        self.fsync_interval = fsync_interval_ms / 1000.0
+        self.fsync_batch = fsync_batch
+        self.pid = os.getpid()
+
+        self._lock = threading.Lock()
+        self._file = None
+        self._segment_path = None
+        self._sequence = 0
+        self._record_counter = 0
+        self._pending = 0
+        self._last_fsync = time.monotonic()
+        self._index = None
+
+        os.makedirs(directory, exist_ok=True)
+
+        # Background group commit for events that never fill a batch
+        self._stop = threading.Event()
+        self._syncer = threading.Thread(target=self._sync_loop, daemon=True)
+        self._syncer.start()
+        atexit.register(self.close)
+
+    def _open_segment(self):
+        self._sequence += 1
+        name = f'segment-{self.pid}-{int(time.time() * 1000):015d}{self._sequence:04d}.jsonl'
+        self._segment_path = os.path.join(self.directory, name)
+        self._file = open(self._segment_path, 'a', encoding='utf-8')
+        self._index = {'segment': name, 'count': 0, 'min_created_at': None,
+                       'max_created_at': None, 'session_ids': set()}
+
+    def _fsync(self):
+        if self._file and self._pending:
+            os.fsync(self._file.fileno())
+            self._pending = 0
+        self._last_fsync = time.monotonic()
+
+    def _seal_segment(self):
+        """fsync and close the current segment and write its sidecar index"""
+        if not self._file:
+            return
+        self._fsync()
+        self._file.close()
+        self._file = None
+
+        index = dict(self._index, session_ids=sorted(self._index['session_ids']))
+        index_path = f'{self._segment_path[:-len(".jsonl")]}.idx.json'
+        with open(index_path, 'w') as f:
+            json.dump(index, f)
+
+    def append(self, record):
+        """Append one event and return its id"""
+        with self._lock:
+            if self._file is None:
+                self._open_segment()
+
+            self._record_counter += 1
+            record['id'] = f'{self.pid}-{self._sequence}-{self._record_counter}'
+
+            self._file.write(json.dumps(record))
+            self._file.write('\n')
+            self._file.flush()
+            self._pending += 1
+
+            index = self._index
+            index['count'] += 1
+            created_at = record['created_at']
+            if index['min_created_at'] is None or created_at < index['min_created_at']:
+                index['min_created_at'] = created_at
+            if index['max_created_at'] is None or created_at > index['max_created_at']:
+                index['max_created_at'] = created_at
+            if record.get('session_id') is not None:
+                index['session_ids'].add(record['session_id'])
+
+            if self._pending >= self.fsync_batch or time.monotonic() - self._last_fsync >= self.fsync_interval:
+                self._fsync()
+
+            if self._file.tell() >= self.segment_max_bytes:
+                self._seal_segment()
+
+            return record['id']
+
+    def _sync_loop(self):
+        while not self._stop.wait(self.fsync_interval):
+            with self._lock:
+                if self._pending:
+                    self._fsync()
+
+    def close(self):
+        self._stop.set()
+        with self._lock:
+            self._seal_segment()
+
+
+_sink = None
+_sink_lock = threading.Lock()
+
+
+def get_file_sink():
+    """The current process's sink (recreated after a fork)"""
+    global _sink
+    with _sink_lock:
+        if _sink is None or _sink.pid != os.getpid():
+            _sink = FileAuditSink(
+                Config.AUDIT_SINK_DIR,
+                Config.AUDIT_SEGMENT_MAX_BYTES,
+                Config.AUDIT_FSYNC_INTERVAL_MS,
+                Config.AUDIT_FSYNC_BATCH
+            )
+        return _sink
+
+
+def list_segments(directory=None, include_loaded=False):
+    """
+    All segments in the sink directory, oldest first
+
+    Args:
+        directory: Sink directory (default AUDIT_SINK_DIR)
+        include_loaded: Also list segments already replayed into the database
+
+    Returns:
+        list: (segment path, sidecar index or None if the segment is still open)
+    """
+    directory = directory or Config.AUDIT_SINK_DIR
+    if not os.path.isdir(directory):
+        return []
+
+    segments = []
+    for name in sorted(os.listdir(directory), key=lambda n: n.split('-')[-1].split('.')[0]):
+        if _SEGMENT_NAME.match(name):
+            index_path = os.path.join(directory, f'{name[:-len(".jsonl")]}.idx.json')
+        elif include_loaded and _LOADED_SEGMENT_NAME.match(name):
+            index_path = os.path.join(directory, f'{name[:-len(".jsonl.loaded")]}.idx.json.loaded')
+        else:
+            continue
+        path = os.path.join(directory, name)
+        index = None
+        try:
+            with open(index_path) as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            pass
+        segments.append((path, index))
+    return segments
+
+
+def read_segment(path):
+    """All complete records of one segment, in write order"""
+    records = []
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            # A torn final line (crash mid-write) is skipped
+            if line.endswith('\n'):
+                records.append(json.loads(line))
+    return records
+
+
+def _segment_may_match(index, session_id, start_time, end_time, after=None):
+    """Use a sealed segment's sidecar index to skip it without reading"""
+    if index is None or not index['count']:
+        return index is None
+    if session_id and session_id not in index['session_ids']:
+        return False
+    if start_time and index['max_created_at'] < start_time.isoformat():
+        return False
+    if end_time and index['min_created_at'] >= end_time.isoformat():
+        return False
+    if after and index['min_created_at'] > after[0]:
+        return False
+    return True
+
+
+class _Newest:
+    """Heap entry that pops the newest record first, by (created_at, id)"""
+    __slots__ = ('key', 'record')
+
+    def __init__(self, record):
+        self.key = (record['created_at'], audit_id_key(record['id']))
+        self.record = record
+
+    def __lt__(self, other):
+        return self.key > other.key
+
+
+def iter_sink_records(user_id=None, session_id=None, event_type=None, start_time=None, end_time=None,
+                      user_type=None, after=None):
+    """
+    Stream records from all segments matching the filters, newest first
+
+    Sealed segments are opened lazily, newest first by their index time range,
+    so a caller that stops after a page only reads the segments it reaches.
+
+    Args:
+        after: Keyset position (created_at ISO string, id); segments entirely
+            newer than it are skipped without reading
+    """
+    heap = []
+    sealed = []
+
+    def load(path):
+        for record in read_segment(path):
+            if record_matches(record, user_id, session_id, event_type, start_time, end_time, user_type):
+                heapq.heappush(heap, _Newest(record))
+
+    for path, index in list_segments(include_loaded=True):
+        if not _segment_may_match(index, session_id, start_time, end_time, after):
+            continue
+        if index is None:
+            # Open segments have no time range yet and are read up front
+            load(path)
+        elif index['count']:
+            sealed.append((index['max_created_at'], path))
+    sealed.sort(reverse=True)
+
+    position = 0
+    while heap or position < len(sealed):
+        # A sealed segment may hold the next record if it reaches the newest one pending
+        if position < len(sealed) and (not heap or sealed[position][0] >= heap[0].key[0]):
+            load(sealed[position][1])
+            position += 1
+            continue
+        yield heapq.heappop(heap).record
+
+
+def is_segment_closed(path, index):
+    """A segment can be replayed once sealed, or once its writer process is gone"""
+    if index is not None:
+        return True
+    pid = int(_SEGMENT_NAME.match(os.path.basename(path)).group(1))
+    if pid == os.getpid():
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return True
+    except PermissionError:
+        return False
+    return False
+
+
+def replay_segments_into_db(batch_size=1000):
+    """
+    Load closed segments into audit_logs and mark them as loaded
+
+    Returns:
+        dict: Segment file name -> number of rows inserted
+    """
+    from models import db, AuditLog
+    from utils.user_agents import intern_user_agent
+
+    loaded = {}
+    for path, index in list_segments():
+        if not is_segment_closed(path, index):
+            continue
+
+        rows = []
+        for record in read_segment(path):
+            row = {key: value for key, value in record.items() if key != 'id'}
+            row['created_at'] = datetime.fromisoformat(row['created_at'])
+            row['user_agent_id'] = intern_user_agent(row.pop('user_agent', None))
+            rows.append(row)
+
+        for start in range(0, len(rows), batch_size):
+            db.session.bulk_insert_mappings(AuditLog, rows[start:start + batch_size])
+        db.session.commit()
+
+        # Renamed only after the commit so a failed load is retried
+        os.replace(path, f'{path}.loaded')
+        index_path = f'{path[:-len(".jsonl")]}.idx.json'
+        if os.path.exists(index_path):
+            os.replace(index_path, f'{index_path}.loaded')
+        loaded[os.path.basename(path)] = len(rows)
+
+    return loaded
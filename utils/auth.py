@@ -1,15 +1,134 @@
 import bcrypt
 import jwt
+import os
+import hmac
+import json
+import base64
+import time
+import hashlib
+import secrets
+import threading
+import multiprocessing
+from collections import OrderedDict, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from datetime import datetime, timedelta
 from functools import wraps
-from flask import request, jsonify
+from flask import request, jsonify, g
 from config import Config
 
 
+class PasswordPoolBusy(Exception):
+    """Raised when too many password operations are already queued"""
+
+
+def _timed_hashpw(password, rounds):
+    started = time.perf_counter()
+    hashed = bcrypt.hashpw(password, bcrypt.gensalt(rounds=rounds))
+    return hashed, time.perf_counter() - started
+
+
+def _timed_checkpw(password, password_hash):
+    started = time.perf_counter()
+    matches = bcrypt.checkpw(password, password_hash)
+    return matches, time.perf_counter() - started
+
+
+class PasswordPool:
+    """
+    Bounded process pool for bcrypt work, so a burst of logins is spread over
+    the cores instead of pinning the web workers, with queueing metrics
+
+    A login thread waits for its result, so this frees the worker's other
+    threads (gthread workers) for scans; at most max_pending threads wait.
+    """
+    
+    def __init__(self, workers, max_pending):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.pid = os.getpid()
+        self._executor = None
+        self._lock = threading.Lock()
+        self.pending = 0
+        self.max_pending_seen = 0
+        self.completed = 0
+        self.rejected = 0
+        self.total_wait = 0.0
+        self.total_work = 0.0
+    
+    def _get_executor(self):
+        if self._executor is None:
+            # Never fork the web worker itself: it already runs background threads
+            # (audit aggregator, metrics, profiler) whose locks a fork could copy held
+            method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+            self._executor = ProcessPoolExecutor(max_workers=self.workers,
+                                                 mp_context=multiprocessing.get_context(method))
+        return self._executor
+    
+    def run(self, fn, *args):
+        """Run fn in the pool (inline when the pool is disabled) and return its result"""
+        if self.workers <= 0:
+            result, elapsed = fn(*args)
+            with self._lock:
+                self.completed += 1
+                self.total_work += elapsed
+            return result
+        
+        with self._lock:
+            if self.pending >= self.max_pending:
+                self.rejected += 1
+                raise PasswordPoolBusy('Too many login attempts in progress, please try again')
+            self.pending += 1
+            self.max_pending_seen = max(self.max_pending_seen, self.pending)
+        
+        started = time.perf_counter()
+        try:
+            try:
+                result, elapsed = self._get_executor().submit(fn, *args).result()
+            except BrokenProcessPool:
+                # A pool process died; start a fresh pool for the next call
+                with self._lock:
+                    self._executor = None
+                result, elapsed = fn(*args)
+        finally:
+            with self._lock:
+                self.pending -= 1
+        
+        with self._lock:
+            self.completed += 1
+            self.total_work += elapsed
+            self.total_wait += max(time.perf_counter() - started - elapsed, 0)
+        return result
+    
+    def stats(self):
+        with self._lock:
+            return {
+                'workers': self.workers,
+                'pending': self.pending,
+                'max_pending_seen': self.max_pending_seen,
+                'completed': self.completed,
+                'rejected': self.rejected,
+                'avg_wait_ms': round(self.total_wait / self.completed * 1000, 2) if self.completed else 0,
+                'avg_work_ms': round(self.total_work / self.completed * 1000, 2) if self.completed else 0
+            }
+
+
+_password_pool = None
+_password_pool_lock = threading.Lock()
+
+
+def get_password_pool():
+    """The current process's password pool (recreated after a fork)"""
+    global _password_pool
+    with _password_pool_lock:
+        if _password_pool is None or _password_pool.pid != os.getpid():
+            _password_pool = PasswordPool(Config.BCRYPT_POOL_WORKERS, Config.BCRYPT_MAX_PENDING)
+        return _password_pool
+
+
 def hash_password(password):
-    """Hash a password using bcrypt"""
-    salt = bcrypt.gensalt()
-    hashed = bcrypt.hashpw(password.encode('utf-8'), salt)
+    """Hash a password using bcrypt with BCRYPT_ROUNDS"""
+    hashed = get_password_pool().run(_timed_hashpw, password.encode('utf-8'), Config.BCRYPT_ROUNDS)
     return hashed.decode('utf-8')
 
 
@@ -22,7 +141,9 @@ def verify_password(password, password_hash):
     if password_hash.startswith('$2'):
         # It's a bcrypt hash, verify normally
         try:
-            return bcrypt.checkpw(password.encode('utf-8'), password_hash.encode('utf-8'))
+            return get_password_pool().run(_timed_checkpw, password.encode('utf-8'), password_hash.encode('utf-8'))
+        except PasswordPoolBusy:
+            raise
         except Exception as e:
             print(f"Error verifying bcrypt password: {e}")
             return False
@@ -31,6 +152,34 @@ def verify_password(password, password_hash):
         return password == password_hash
 
 
+def password_needs_rehash(password_hash):
+    """True for plain text passwords and bcrypt hashes whose cost differs from BCRYPT_ROUNDS"""
+    if not password_hash or not password_hash.startswith('$2'):
+        return True
+    try:
+        return int(password_hash.split('$')[2]) != Config.BCRYPT_ROUNDS
+    except (IndexError, ValueError):
+        return True
+
+
+def rehash_password_if_needed(user, password):
+    """
+    Upgrade a user's stored password after a successful login
+    
+    Plain text passwords and hashes with an outdated cost are re-hashed with
+    the current BCRYPT_ROUNDS. Failures are logged and never block the login.
+    """
+    if not password_needs_rehash(user.password_hash):
+        return
+    from models import db
+    try:
+        user.password_hash = hash_password(password)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        print(f"Password rehash failed: {str(e)}")
+
+
 def generate_token(user_id, user_type):
     """
     Generate JWT token for authenticated user
@@ -44,13 +193,13 @@ def generate_token(user_id, user_type):
             import os
             secret_key = os.getenv('SECRET_KEY', 'dev-secret-key-change-in-production')
         
-        # Get JWT expiry hours
-        jwt_expiry = getattr(Config, 'JWT_EXPIRY_HOURS', 24)
+        # Get JWT expiry minutes (access tokens are short-lived; see refresh tokens below)
+        jwt_expiry = getattr(Config, 'JWT_EXPIRY_MINUTES', 60)
         
         payload = {
             'user_id': user_id,
             'user_type': user_type,
-            'exp': datetime.utcnow() + timedelta(hours=jwt_expiry),
+            'exp': datetime.utcnow() + timedelta(minutes=jwt_expiry),
             'iat': datetime.utcnow()
         }
         
@@ -69,10 +218,224 @@ def generate_token(user_id, user_type):
         raise Exception(f"Failed to generate token: {str(e)}")
 
 
+def _hash_refresh_token(token):
+    return hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+
+def issue_refresh_token(user_id, user_type, family_id=None):
+    """
+    Create a refresh token; only its sha256 is stored
+    
+    Args:
+        user_id: ID of the user
+        user_type: 'student' or 'teacher'
+        family_id: Rotation family of the token being replaced (new login if None)
+    
+    Returns:
+        str: The refresh token to hand to the client
+    """
+    from models import db, RefreshToken
+    
+    token = secrets.token_urlsafe(32)
+    db.session.add(RefreshToken(
+        token_hash=_hash_refresh_token(token),
+        family_id=family_id or secrets.token_hex(16),
+        user_id=user_id,
+        user_type=user_type,
+        expires_at=datetime.utcnow() + timedelta(days=Config.REFRESH_TOKEN_DAYS)
+    ))
+    db.session.commit()
+    return token
+
+
+def rotate_refresh_token(token):
+    """
+    Exchange a refresh token for a new access token and refresh token
+    
+    The presented token is revoked with a conditional UPDATE, so of several
+    concurrent refreshes exactly one rotates. Presenting an already rotated
+    token again (outside a short grace period for concurrent refreshes) is
+    treated as theft and revokes the whole family.
+    
+    Returns:
+        dict: token, refresh_token, user_id and user_type, or None if the token is not usable
+    """
+    from models import db, RefreshToken
+    
+    now = datetime.utcnow()
+    stored = RefreshToken.query.filter_by(token_hash=_hash_refresh_token(token)).first()
+    if not stored:
+        return None
+    
+    if stored.revoked_at:
+        if (now - stored.revoked_at).total_seconds() > Config.REFRESH_REUSE_GRACE_SECONDS:
+            RefreshToken.query.filter_by(family_id=stored.family_id, revoked_at=None).update(
+                {'revoked_at': now}, synchronize_session=False
+            )
+            db.session.commit()
+        return None
+    
+    if stored.expires_at <= now:
+        return None
+    
+    # Conditional revoke: of two concurrent refreshes only the one whose UPDATE hits the row may rotate
+    revoked = RefreshToken.query.filter(
+        RefreshToken.id == stored.id, RefreshToken.revoked_at.is_(None)
+    ).update({'revoked_at': now}, synchronize_session=False)
+    if revoked != 1:
+        db.session.rollback()
+        return None
+    refresh_token = issue_refresh_token(stored.user_id, stored.user_type, stored.family_id)
+    
+    return {
+        'token': generate_token(stored.user_id, stored.user_type),
+        'refresh_token': refresh_token,
+        'user_id': stored.user_id,
+        'user_type': stored.user_type
+    }
+
+
+def revoke_refresh_token(token):
+    """Revoke a refresh token and the rest of its family (logout); returns False if unknown"""
+    from models import db, RefreshToken
+    
+    stored = RefreshToken.query.filter_by(token_hash=_hash_refresh_token(token)).first()
+    if not stored:
+        return False
+    RefreshToken.query.filter_by(family_id=stored.family_id, revoked_at=None).update(
+        {'revoked_at': datetime.utcnow()}, synchronize_session=False
+    )
+    db.session.commit()
+    return True
+
+
+# Class details of a student carried by a verified scan ticket
+ScanTicket = namedtuple('ScanTicket', ['id', 'branch', 'semester', 'division'])
+
+
+def _scan_ticket_key(key_version):
+    """Signing key for one key version; bumping SCAN_TICKET_KEY_VERSION revokes all tickets"""
+    return hmac.new(Config.SECRET_KEY.encode(), f'scan-ticket:{key_version}'.encode(), hashlib.sha256).digest()
+
+
+def generate_scan_ticket(student):
+    """
+    Issue a short-lived signed ticket with the student's class details
+    
+    Returns:
+        tuple: (ticket string, expiry datetime)
+    """
+    # exp is epoch seconds from time.time(), the clock verify_scan_ticket checks against; a naive
+    # utcnow().timestamp() would be read as local time and be off by the host's UTC offset
+    exp = int(time.time()) + Config.SCAN_TICKET_EXPIRY
+    expires_at = datetime.utcfromtimestamp(exp)
+    payload = {
+        'sid': student.id,
+        'branch': student.branch,
+        'semester': student.semester,
+        'division': student.division,
+        'exp': exp,
+        'kv': Config.SCAN_TICKET_KEY_VERSION
+    }
+    body = base64.urlsafe_b64encode(json.dumps(payload, sort_keys=True).encode()).decode().rstrip('=')
+    signature = hmac.new(_scan_ticket_key(payload['kv']), body.encode(), hashlib.sha256).hexdigest()
+    return f'{body}.{signature}', expires_at
+
+
+def verify_scan_ticket(ticket, student_id):
+    """
+    Verify a scan ticket with one HMAC
+    
+    Returns:
+        ScanTicket: The student's class details, or None if the ticket is missing,
+        forged, expired, from an old key version or for another student
+    """
+    if not ticket or not isinstance(ticket, str) or '.' not in ticket:
+        return None
+    try:
+        body, signature = ticket.rsplit('.', 1)
+        expected = hmac.new(_scan_ticket_key(Config.SCAN_TICKET_KEY_VERSION), body.encode(), hashlib.sha256).hexdigest()
+        if not hmac.compare_digest(signature, expected):
+            return None
+        payload = json.loads(base64.urlsafe_b64decode(body + '=' * (-len(body) % 4)))
+    except (ValueError, TypeError):
+        return None
+    
+    if payload.get('kv') != Config.SCAN_TICKET_KEY_VERSION or payload.get('sid') != student_id:
+        return None
+    if payload.get('exp', 0) <= time.time():
+        return None
+    return ScanTicket(payload['sid'], payload['branch'], payload['semester'], payload['division'])
+
+
+class TokenCache:
+    """Thread-safe LRU of recently verified tokens (by sha256) -> payload, honouring exp"""
+    
+    def __init__(self, max_entries=4096):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+    
+    @staticmethod
+    def key(token):
+        return hashlib.sha256(token.encode('utf-8')).hexdigest()
+    
+    def get(self, token):
+        key = self.key(token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry['exp'] > time.time():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return dict(entry['payload'])
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+    
+    def set(self, token, payload):
+        if self.max_entries <= 0 or 'exp' not in payload:
+            return
+        key = self.key(token)
+        with self._lock:
+            self._entries[key] = {'payload': dict(payload), 'exp': payload['exp']}
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+    
+    def evict(self, token):
+        with self._lock:
+            self._entries.pop(self.key(token), None)
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+    
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups * 100, 2) if lookups else 0
+            }
+
+
+token_cache = TokenCache(Config.TOKEN_CACHE_SIZE)
+
+
 def decode_token(token):
-    """Decode and verify JWT token"""
+    """Decode and verify JWT token (recently verified tokens skip the signature check)"""
+    payload = token_cache.get(token)
+    if payload is not None:
+        return payload
+    
     try:
         payload = jwt.decode(token, Config.SECRET_KEY, algorithms=['HS256'])
+        token_cache.set(token, payload)
         return payload
     except jwt.ExpiredSignatureError:
         return None
@@ -117,6 +480,7 @@ def token_required(user_type=None):
                 }), 403
             
             # Pass user info to route
+            g.current_user = payload
             return f(payload, *args, **kwargs)
         
         return decorated_function
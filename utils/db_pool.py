@@ -0,0 +1,107 @@
+"""
+Database Connection Pool Metrics
+Times every pool checkout and counts new and invalidated connections, so
+/api/health can show whether requests are waiting on the pool or reconnecting
+"""
+import time
+import threading
+from sqlalchemy import event
+
+
+# Checkouts slower than this are counted as slow
+SLOW_CHECKOUT_SECONDS = 0.1
+
+
+class PoolMetrics:
+    """Checkout latency and connection churn of one engine's pool"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.slow_checkouts = 0
+        self.total_checkout = 0.0
+        self.max_checkout = 0.0
+        self.connections_opened = 0
+        self.connections_invalidated = 0
+        self.checkout_errors = 0
+
+    def record_checkout(self, elapsed):
+        with self._lock:
+            self.checkouts += 1
+            self.total_checkout += elapsed
+            self.max_checkout = max(self.max_checkout, elapsed)
+            if elapsed >= SLOW_CHECKOUT_SECONDS:
+                self.slow_checkouts += 1
+
+    def count(self, name):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'checkouts': self.checkouts,
+                'slow_checkouts': self.slow_checkouts,
+                'avg_checkout_ms': round(self.total_checkout / self.checkouts * 1000, 3) if self.checkouts else 0,
+                'max_checkout_ms': round(self.max_checkout * 1000, 3),
+                'connections_opened': self.connections_opened,
+                'connections_invalidated': self.connections_invalidated,
+                'checkout_errors': self.checkout_errors
+            }
+
+
+def _time_checkouts(pool, metrics):
+    """Wrap pool.connect so the time spent waiting for a connection is recorded"""
+    connect = pool.connect
+
+    def timed_connect():
+        started = time.perf_counter()
+        try:
+            connection = connect()
+        except Exception:
+            metrics.count('checkout_errors')
+            raise
+        metrics.record_checkout(time.perf_counter() - started)
+        return connection
+
+    pool.connect = timed_connect
+
+
+def install_pool_metrics(engine):
+    """Attach metrics to an engine's pool (idempotent)"""
+    if getattr(engine, 'pool_metrics', None) is not None:
+        return engine.pool_metrics
+
+    metrics = PoolMetrics()
+    engine.pool_metrics = metrics
+    _time_checkouts(engine.pool, metrics)
+
+    event.listen(engine, 'connect', lambda dbapi_connection, record: metrics.count('connections_opened'))
+    event.listen(engine, 'invalidate',
+                 lambda dbapi_connection, record, exception: metrics.count('connections_invalidated'))
+
+    # dispose() swaps in a fresh pool
+    @event.listens_for(engine, 'engine_disposed')
+    def rewrap(disposed_engine):
+        _time_checkouts(disposed_engine.pool, metrics)
+
+    return metrics
+
+
+def pool_stats(engine):
+    """Current pool occupancy plus the recorded metrics"""
+    pool = engine.pool
+    stats = {'pool_class': type(pool).__name__}
+    for name in ('size', 'checkedin', 'checkedout', 'overflow'):
+        method = getattr(pool, name, None)
+        if callable(method):
+            stats[name] = method()
+    if 'checkedout' in stats:
+        stats['in_use'] = stats.pop('checkedout')
+    if 'overflow' in stats:
+        # QueuePool counts up from -pool_size; only connections beyond the pool size are overflow
+        stats['overflow'] = max(stats['overflow'], 0)
+    metrics = getattr(engine, 'pool_metrics', None)
+    if metrics is not None:
+        stats.update(metrics.stats())
+    return stats
@@ -0,0 +1,194 @@
+"""
+Defaulter Detection
+Finds students below the attendance threshold per subject for a whole
+branch/semester using a few set-based queries, and stores the results
+"""
+from datetime import datetime, timedelta
+from decimal import Decimal
+from sqlalchemy import func
+from models import db, Student, Session, Attendance, DefaulterRun, Defaulter
+from utils.analytics import ATTENDED_STATUSES
+from config import Config
+
+
+def compute_defaulters(branch, semester, division=None, threshold=None):
+    """
+    Compute per-student per-subject attendance and return the defaulters
+
+    Args:
+        branch: Branch to analyse
+        semester: Semester to analyse
+        division: Restrict to one division (optional)
+        threshold: Attendance percentage below which a student defaults
+
+    Returns:
+        tuple: (total_students, list of defaulter dicts keyed by student PK)
+    """
+    if threshold is None:
+        threshold = Config.DEFAULTER_THRESHOLD
+
+    # 1. Roster
+    students_query = db.session.query(Student.id, Student.division).filter(
+        Student.branch == branch,
+        Student.semester == semester
+    )
+    if division:
+        students_query = students_query.filter(Student.division == division)
+    students = students_query.all()
+
+    # 2. Sessions held per (subject, division); a NULL division covers everyone
+    sessions_held = db.session.query(
+        Session.subject,
+        Session.division,
+        func.count(Session.id)
+    ).filter(
+        Session.branch == branch,
+        Session.semester == semester
+    ).group_by(
+        Session.subject,
+        Session.division
+    ).all()
+
+    held = {}
+    for subject, session_division, count in sessions_held:
+        held.setdefault(subject, {})[session_division] = count
+
+    # 3. Sessions attended per (student, subject)
+    attended_query = db.session.query(
+        Attendance.student_id,
+        Session.subject,
+        func.count(Attendance.id)
+    ).join(
+        Session, Attendance.session_id == Session.id
+    ).filter(
+        Session.branch == branch,
+        Session.semester == semester,
+        Attendance.status.in_(ATTENDED_STATUSES)
+    ).group_by(
+        Attendance.student_id,
+        Session.subject
+    )
+    attended = {(student_pk, subject): count for student_pk, subject, count in attended_query.all()}
+
+    defaulters = []
+    for student_pk, student_division in students:
+        for subject, by_division in held.items():
+            total = by_division.get(None, 0)
+            if student_division is not None:
+                total += by_division.get(student_division, 0)
+            if total == 0:
+                continue
+
+            present = attended.get((student_pk, subject), 0)
+            percentage = present * 100.0 / total
+            if percentage < threshold:
+                defaulters.append({
+                    'student_pk': student_pk,
+                    'subject': subject,
+                    'attended': present,
+                    'total_sessions': total,
+                    'percentage': round(percentage, 2)
+                })
+
+    return len(students), defaulters
+
+
+def _stored_threshold(threshold):
+    """The threshold as DefaulterRun stores it (Numeric(5, 2)), so lookups match exactly"""
+    if threshold is None:
+        threshold = Config.DEFAULTER_THRESHOLD
+    return Decimal(str(threshold)).quantize(Decimal('0.01'))
+
+
+def _scope_filter(branch, semester, division):
+    return (
+        DefaulterRun.branch == branch,
+        DefaulterRun.semester == semester,
+        DefaulterRun.division == division if division else DefaulterRun.division.is_(None),
+    )
+
+
+def prune_runs(run):
+    """
+    Delete the runs a new run replaces
+
+    Older runs of the same scope and threshold, and runs of the scope too old
+    to be reused at any threshold, are removed along with their defaulters.
+    """
+    cutoff = datetime.utcnow() - timedelta(minutes=Config.DEFAULTER_CACHE_MINUTES)
+    stale_ids = [run_id for run_id, in db.session.query(DefaulterRun.id).filter(
+        *_scope_filter(run.branch, run.semester, run.division),
+        DefaulterRun.id != run.id,
+        (DefaulterRun.threshold == run.threshold) | (DefaulterRun.computed_at < cutoff)
+    ).all()]
+    if not stale_ids:
+        return 0
+
+    Defaulter.query.filter(Defaulter.run_id.in_(stale_ids)).delete(synchronize_session=False)
+    DefaulterRun.query.filter(DefaulterRun.id.in_(stale_ids)).delete(synchronize_session=False)
+    return len(stale_ids)
+
+
+def run_defaulter_detection(branch, semester, division=None, threshold=None):
+    """Compute defaulters and store them as a new run, replacing older ones"""
+    threshold = _stored_threshold(threshold)
+
+    total_students, defaulters = compute_defaulters(branch, semester, division, float(threshold))
+
+    run = DefaulterRun(
+        branch=branch,
+        semester=semester,
+        division=division,
+        threshold=threshold,
+        total_students=total_students,
+        defaulter_count=len({d['student_pk'] for d in defaulters}),
+        computed_at=datetime.utcnow()
+    )
+    db.session.add(run)
+    db.session.flush()
+
+    db.session.bulk_insert_mappings(Defaulter, [
+        {
+            'run_id': run.id,
+            'student_id': d['student_pk'],
+            'subject': d['subject'],
+            'attended': d['attended'],
+            'total_sessions': d['total_sessions'],
+            'percentage': d['percentage']
+        }
+        for d in defaulters
+    ])
+    prune_runs(run)
+    db.session.commit()
+
+    return run
+
+
+def get_latest_run(branch, semester, division=None, threshold=None, max_age_minutes=None):
+    """Return the newest stored run that is still within the reuse window"""
+    threshold = _stored_threshold(threshold)
+    if max_age_minutes is None:
+        max_age_minutes = Config.DEFAULTER_CACHE_MINUTES
+
+    cutoff = datetime.utcnow() - timedelta(minutes=max_age_minutes)
+
+    return DefaulterRun.query.filter(
+        *_scope_filter(branch, semester, division),
+        DefaulterRun.threshold == threshold,
+        DefaulterRun.computed_at >= cutoff
+    ).order_by(DefaulterRun.computed_at.desc()).first()
+
+
+def get_defaulters(branch, semester, division=None, threshold=None, refresh=False):
+    """
+    Get defaulters for a branch/semester, reusing a recent stored run
+
+    Returns:
+        tuple: (DefaulterRun, cached) where cached tells if the run was reused
+    """
+    if not refresh:
+        run = get_latest_run(branch, semester, division, threshold)
+        if run:
+            return run, True
+
+    return run_defaulter_detection(branch, semester, division, threshold), False
@@ -0,0 +1,361 @@
+"""
+Request and SQL Metrics
+SQLAlchemy cursor hooks count and time every statement of a request, and
+request hooks record latency and status per endpoint. Statements slower than
+SLOW_QUERY_MS are printed with their parameters redacted. Handlers can split
+their time into stages with StageTimer. Like the security metrics, each worker
+writes a snapshot to METRICS_DIR and /api/metrics merges them into Prometheus
+text format.
+"""
+import os
+import re
+import json
+import time
+import atexit
+import threading
+from flask import g, request, has_request_context
+from sqlalchemy import event
+from config import Config
+
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STATEMENT_BUCKETS = (1, 2, 3, 5, 10, 20, 50, 100)
+
+# Label for statements run outside a request (audit flush thread, CLI jobs)
+BACKGROUND = 'background'
+
+# Snapshots of workers gone for this long are dropped from the totals
+STALE_SNAPSHOT_SECONDS = 24 * 60 * 60
+
+_SNAPSHOT_NAME = re.compile(r'^requests-(\d+)\.json$')
+_WHITESPACE = re.compile(r'\s+')
+
+
+def _new_histogram(buckets):
+    return {'buckets': [0] * (len(buckets) + 1), 'sum': 0, 'count': 0}
+
+
+def _observe(histogram, bounds, value):
+    for i, bound in enumerate(bounds):
+        if value <= bound:
+            break
+    else:
+        i = len(bounds)
+    histogram['buckets'][i] += 1
+    histogram['sum'] += value
+    histogram['count'] += 1
+
+
+class RequestMetrics:
+    """Per-endpoint request and SQL counters for this worker"""
+
+    def __init__(self):
+        self.pid = os.getpid()
+        self._lock = threading.Lock()
+        self._requests = {}     # 'endpoint|method|status' -> count
+        self._latency = {}      # endpoint -> histogram of seconds
+        self._statements = {}   # endpoint -> histogram of statements per request
+        self._sql = {}          # endpoint -> {'count', 'seconds', 'slow'}
+        self._stages = {}       # 'endpoint|stage' -> histogram of seconds
+        self._last_flush = time.time()
+        self.engines = []
+        atexit.register(self.flush)
+
+    def _reset_after_fork(self):
+        if os.getpid() != self.pid:
+            engines = self.engines
+            self.__init__()
+            self.engines = engines
+
+    def observe_request(self, endpoint, method, status, seconds, statements, statement_seconds, slow, stages=()):
+        self._reset_after_fork()
+        key = f'{endpoint}|{method}|{status}'
+        with self._lock:
+            self._requests[key] = self._requests.get(key, 0) + 1
+            _observe(self._latency.setdefault(endpoint, _new_histogram(LATENCY_BUCKETS)), LATENCY_BUCKETS, seconds)
+            _observe(self._statements.setdefault(endpoint, _new_histogram(STATEMENT_BUCKETS)),
+                     STATEMENT_BUCKETS, statements)
+            self._add_sql(endpoint, statements, statement_seconds, slow)
+            for stage, stage_seconds in stages:
+                _observe(self._stages.setdefault(f'{endpoint}|{stage}', _new_histogram(LATENCY_BUCKETS)),
+                         LATENCY_BUCKETS, stage_seconds)
+        self._maybe_flush()
+
+    def observe_background_statement(self, seconds, slow):
+        self._reset_after_fork()
+        with self._lock:
+            self._add_sql(BACKGROUND, 1, seconds, int(slow))
+        self._maybe_flush()
+
+    def _add_sql(self, endpoint, count, seconds, slow):
+        sql = self._sql.setdefault(endpoint, {'count': 0, 'seconds': 0.0, 'slow': 0})
+        sql['count'] += count
+        sql['seconds'] += seconds
+        sql['slow'] += slow
+
+    def _maybe_flush(self):
+        if time.time() - self._last_flush >= Config.METRICS_FLUSH_SECONDS:
+            self.flush()
+
+    def _snapshot(self, now):
+        from utils.db_pool import pool_stats
+
+        with self._lock:
+            snapshot = json.loads(json.dumps({
+                'requests': self._requests,
+                'latency': self._latency,
+                'statements': self._statements,
+                'sql': self._sql,
+                'stages': self._stages
+            }))
+        snapshot.update({
+            'pid': self.pid,
+            'written_at': now,
+            'pools': {name: pool_stats(engine) for name, engine in self.engines}
+        })
+        return snapshot
+
+    def flush(self, now=None):
+        """Write this worker's snapshot for the other workers to merge"""
+        now = now or time.time()
+        self._last_flush = now
+        try:
+            os.makedirs(Config.METRICS_DIR, exist_ok=True)
+            path = os.path.join(Config.METRICS_DIR, f'requests-{self.pid}.json')
+            tmp_path = f'{path}.tmp'
+            with open(tmp_path, 'w') as f:
+                json.dump(self._snapshot(now), f)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"Request metrics flush failed: {str(e)}")
+
+    def all_snapshots(self):
+        """This worker's live snapshot plus the latest one of every other worker"""
+        self._reset_after_fork()
+        now = time.time()
+        snapshots = [self._snapshot(now)]
+        directory = Config.METRICS_DIR
+        if not os.path.isdir(directory):
+            return snapshots
+
+        for name in os.listdir(directory):
+            match = _SNAPSHOT_NAME.match(name)
+            if not match or int(match.group(1)) == self.pid:
+                continue
+            path = os.path.join(directory, name)
+            try:
+                with open(path) as f:
+                    snapshot = json.load(f)
+            except (OSError, ValueError):
+                continue
+            if now - snapshot.get('written_at', 0) > STALE_SNAPSHOT_SECONDS:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+                continue
+            snapshots.append(snapshot)
+        return snapshots
+
+
+request_metrics = RequestMetrics()
+
+
+class StageTimer:
+    """
+    Splits a handler's time into consecutive stages
+    
+    Each lap(stage) records the time since the previous lap (or since the timer
+    was created); the laps are recorded with the request's metrics, next to the
+    request's total audit and database time.
+    """
+
+    def __init__(self):
+        self._last = time.perf_counter()
+        g.stages = []
+
+    def lap(self, stage):
+        now = time.perf_counter()
+        g.stages.append((stage, now - self._last))
+        self._last = now
+
+
+def add_request_time(component, seconds):
+    """Accumulate time spent in a cross-cutting component (such as audit logging) during the request"""
+    if has_request_context():
+        components = g.setdefault('component_seconds', {})
+        components[component] = components.get(component, 0.0) + seconds
+
+
+def _redact(parameters):
+    """Describe bound parameters without their values"""
+    if isinstance(parameters, dict):
+        return '{' + ', '.join(f'{key}=?' for key in parameters) + '}'
+    if isinstance(parameters, (list, tuple)):
+        if parameters and isinstance(parameters[0], (list, tuple, dict)):
+            return f'<{len(parameters)} parameter sets>'
+        return '(' + ', '.join('?' for _ in parameters) + ')'
+    return '?'
+
+
+def install_sql_metrics(engine):
+    """Count and time every statement the engine executes"""
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def start_timer(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('metrics_started', []).append(time.perf_counter())
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def stop_timer(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info['metrics_started'].pop()
+        slow = elapsed * 1000 >= Config.SLOW_QUERY_MS
+        if slow:
+            endpoint = (request.endpoint or 'unmatched') if has_request_context() else BACKGROUND
+            sql = _WHITESPACE.sub(' ', statement).strip()[:500]
+            print(f"Slow SQL ({elapsed * 1000:.1f} ms, {endpoint}): {sql} params={_redact(parameters)}")
+
+        if has_request_context():
+            g.sql_statements = g.get('sql_statements', 0) + 1
+            g.sql_seconds = g.get('sql_seconds', 0.0) + elapsed
+            g.sql_slow = g.get('sql_slow', 0) + int(slow)
+        else:
+            request_metrics.observe_background_statement(elapsed, slow)
+
+    @event.listens_for(engine, 'handle_error')
+    def drop_timer(context):
+        # A failed statement never reaches after_cursor_execute
+        if context.connection is not None and context.connection.info.get('metrics_started'):
+            context.connection.info['metrics_started'].pop()
+
+
+def install_request_metrics(app, db):
+    """Time every request and instrument every engine of the app (no-op if METRICS_ENABLED is off)"""
+    if not app.config.get('METRICS_ENABLED', True):
+        return
+
+    with app.app_context():
+        engines = [('primary', db.engine)] + [(name, engine) for name, engine in db.engines.items()
+                                              if name is not None]
+    request_metrics.engines = engines
+    for _, engine in engines:
+        install_sql_metrics(engine)
+
+    @app.before_request
+    def start_request_timer():
+        g.request_started = time.perf_counter()
+
+    @app.after_request
+    def record_request(response):
+        started = g.get('request_started')
+        if started is None:
+            return response
+        elapsed = time.perf_counter() - started
+        statements = g.get('sql_statements', 0)
+        statement_seconds = g.get('sql_seconds', 0.0)
+
+        stages = g.get('stages') or []
+        if stages:
+            # Audit and DB time cut across the stages, so they are reported beside them
+            stages = stages + sorted(g.get('component_seconds', {}).items()) + [('db', statement_seconds)]
+
+        request_metrics.observe_request(request.endpoint or 'unmatched', request.method, response.status_code,
+                                        elapsed, statements, statement_seconds, g.get('sql_slow', 0), stages)
+        timings = [f'db;dur={statement_seconds * 1000:.1f};desc="{statements} queries"',
+                   f'app;dur={elapsed * 1000:.1f}']
+        timings += [f'{stage};dur={seconds * 1000:.1f}' for stage, seconds in stages if stage != 'db']
+        response.headers['Server-Timing'] = ', '.join(timings)
+        return response
+
+
+def _labels(**labels):
+    escaped = (f'{key}="{str(value).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"'
+               for key, value in labels.items())
+    return '{' + ','.join(escaped) + '}'
+
+
+def _merge_histograms(snapshots, key):
+    merged = {}
+    for snapshot in snapshots:
+        for endpoint, histogram in snapshot.get(key, {}).items():
+            total = merged.setdefault(endpoint, {'buckets': [0] * len(histogram['buckets']), 'sum': 0, 'count': 0})
+            total['buckets'] = [a + b for a, b in zip(total['buckets'], histogram['buckets'])]
+            total['sum'] += histogram['sum']
+            total['count'] += histogram['count']
+    return merged
+
+
+def _render_histogram(lines, name, help_text, histograms, bounds, label_names=('endpoint',)):
+    lines.append(f'# HELP {name} {help_text}')
+    lines.append(f'# TYPE {name} histogram')
+    for key, histogram in sorted(histograms.items()):
+        labels = dict(zip(label_names, key.split('|')))
+        cumulative = 0
+        for bound, count in zip(list(bounds) + ['+Inf'], histogram['buckets']):
+            cumulative += count
+            lines.append(f'{name}_bucket{_labels(**labels, le=bound)} {cumulative}')
+        lines.append(f'{name}_sum{_labels(**labels)} {histogram["sum"]}')
+        lines.append(f'{name}_count{_labels(**labels)} {histogram["count"]}')
+
+
+def render_prometheus():
+    """
+    All workers' metrics in Prometheus text exposition format
+
+    Returns:
+        str: Metrics text (version 0.0.4)
+    """
+    snapshots = request_metrics.all_snapshots()
+    lines = []
+
+    requests = {}
+    for snapshot in snapshots:
+        for key, count in snapshot['requests'].items():
+            requests[key] = requests.get(key, 0) + count
+    lines.append('# HELP http_requests_total Requests by endpoint, method and status code')
+    lines.append('# TYPE http_requests_total counter')
+    for key, count in sorted(requests.items()):
+        endpoint, method, status = key.rsplit('|', 2)
+        lines.append(f'http_requests_total{_labels(endpoint=endpoint, method=method, status=status)} {count}')
+
+    _render_histogram(lines, 'http_request_duration_seconds', 'Request latency by endpoint',
+                      _merge_histograms(snapshots, 'latency'), LATENCY_BUCKETS)
+    _render_histogram(lines, 'db_statements_per_request', 'SQL statements issued per request by endpoint',
+                      _merge_histograms(snapshots, 'statements'), STATEMENT_BUCKETS)
+    _render_histogram(lines, 'http_request_stage_seconds', 'Time per handler stage (audit and db span the stages)',
+                      _merge_histograms(snapshots, 'stages'), LATENCY_BUCKETS, ('endpoint', 'stage'))
+
+    sql = {}
+    for snapshot in snapshots:
+        for endpoint, totals in snapshot['sql'].items():
+            merged = sql.setdefault(endpoint, {'count': 0, 'seconds': 0.0, 'slow': 0})
+            for field in merged:
+                merged[field] += totals[field]
+    for name, field, help_text in (
+            ('db_statements_total', 'count', 'SQL statements executed by endpoint'),
+            ('db_statement_seconds_total', 'seconds', 'Time spent executing SQL by endpoint'),
+            ('db_slow_statements_total', 'slow', f'SQL statements slower than {Config.SLOW_QUERY_MS} ms')):
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} counter')
+        for endpoint, totals in sorted(sql.items()):
+            lines.append(f'{name}{_labels(endpoint=endpoint)} {totals[field]}')
+
+    # Pool occupancy is per worker, so it keeps a worker label instead of being summed
+    pool_metrics = (
+        ('db_pool_size', 'size', 'gauge', 'Configured pool size'),
+        ('db_pool_in_use', 'in_use', 'gauge', 'Connections checked out'),
+        ('db_pool_idle', 'checkedin', 'gauge', 'Idle connections in the pool'),
+        ('db_pool_overflow', 'overflow', 'gauge', 'Connections beyond the pool size'),
+        ('db_pool_checkouts_total', 'checkouts', 'counter', 'Pool checkouts'),
+        ('db_pool_slow_checkouts_total', 'slow_checkouts', 'counter', 'Pool checkouts that waited'),
+        ('db_pool_connections_opened_total', 'connections_opened', 'counter', 'New database connections'),
+        ('db_pool_connections_invalidated_total', 'connections_invalidated', 'counter', 'Dropped connections'),
+    )
+    for name, field, metric_type, help_text in pool_metrics:
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {metric_type}')
+        for snapshot in snapshots:
+            for bind, stats in sorted(snapshot['pools'].items()):
+                if field in stats:
+                    lines.append(f'{name}{_labels(bind=bind, worker=snapshot["pid"])} {stats[field]}')
+
+    return '\n'.join(lines) + '\n'
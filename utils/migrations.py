@@ -0,0 +1,101 @@
+"""
+Schema Migrations
+Ordered schema changes, each applied once and recorded in schema_migrations.
+Every step is idempotent (checkfirst), so a database created by the old
+db.create_all() startup, or two workers starting at once, are both safe.
+
+To change the schema, add a function decorated with @migration and the next
+version number; never edit a migration that has shipped.
+"""
+from sqlalchemy import text, inspect
+from sqlalchemy.exc import IntegrityError
+from models import db, SchemaMigration, Student, Session, Attendance, AuditLog
+
+
+MIGRATIONS = []
+
+
+def migration(version, description):
+    """Register a migration step"""
+    def decorator(fn):
+        MIGRATIONS.append((version, description, fn))
+        return fn
+    return decorator
+
+
+def add_missing_columns(model):
+    """Add columns that create_all cannot add to an existing table (they need a server default or NULL)"""
+    table = model.__table__
+    existing = {column['name'] for column in inspect(db.engine).get_columns(table.name)}
+    for column in table.columns:
+        if column.name in existing:
+            continue
+        column_type = column.type.compile(db.engine.dialect)
+        default = f" DEFAULT {column.server_default.arg}" if column.server_default is not None else ''
+        not_null = ' NOT NULL' if not column.nullable and default else ''
+        db.session.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}{default}{not_null}'))
+    db.session.commit()
+
+
+def create_indexes(*models):
+    """Create the declared indexes of existing tables"""
+    for model in models:
+        for index in model.__table__.indexes:
+            index.create(db.engine, checkfirst=True)
+
+
+@migration('0001', 'Create tables')
+def create_tables():
+    db.create_all()
+
+
+@migration('0002', 'Audit log event_count and user_agent_id columns, audit indexes')
+def audit_log_columns():
+    add_missing_columns(AuditLog)
+    create_indexes(AuditLog)
+
+
+@migration('0003', 'Composite indexes for hot query paths')
+def hot_path_indexes():
+    create_indexes(Student, Session, Attendance)
+
+
+def get_migration_status():
+    """
+    Every known migration and when it was applied
+
+    Returns:
+        list: dicts with version, description and applied_at (None if pending)
+    """
+    SchemaMigration.__table__.create(db.engine, checkfirst=True)
+    applied = {row.version: row.applied_at for row in SchemaMigration.query.all()}
+    return [{
+        'version': version,
+        'description': description,
+        'applied_at': applied[version].isoformat() if applied.get(version) else None
+    } for version, description, _ in MIGRATIONS]
+
+
+def upgrade():
+    """
+    Apply pending migrations in order
+
+    Returns:
+        list: Versions applied by this call
+    """
+    SchemaMigration.__table__.create(db.engine, checkfirst=True)
+    applied = {row.version for row in SchemaMigration.query.all()}
+
+    newly_applied = []
+    for version, description, apply in MIGRATIONS:
+        if version in applied:
+            continue
+        apply()
+        try:
+            db.session.add(SchemaMigration(version=version, description=description))
+            db.session.commit()
+            newly_applied.append(version)
+        except IntegrityError:
+            # Another process applied it at the same time
+            db.session.rollback()
+    return newly_applied
@@ -0,0 +1,134 @@
+"""
+Sampling Profiler for Slow Requests
+Opt-in (PROFILER_ENABLED). A random PROFILER_SAMPLE_RATE share of requests is
+sampled: one background thread reads the stack of every thread serving a
+sampled request each PROFILER_INTERVAL_MS. If the request took at least
+PROFILER_SLOW_MS, its stacks are written to PROFILER_DIR in folded format
+("frame;frame;frame count"), which flamegraph.pl and speedscope read directly.
+"""
+import os
+import sys
+import time
+import random
+import threading
+from flask import g, request
+from config import Config
+
+
+class SamplingProfiler:
+    """Samples the stacks of registered threads from one background thread"""
+
+    def __init__(self, interval):
+        self.pid = os.getpid()
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._active = {}                  # thread ident -> {folded stack: samples}
+        self._wakeup = threading.Event()
+        self._thread = None
+
+    def start(self, ident):
+        """Begin sampling a thread"""
+        with self._lock:
+            self._active[ident] = {}
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='request-profiler', daemon=True)
+                self._thread.start()
+        self._wakeup.set()
+
+    def stop(self, ident):
+        """Stop sampling a thread and return its stacks"""
+        with self._lock:
+            return self._active.pop(ident, {})
+
+    def _run(self):
+        own_ident = threading.get_ident()
+        while True:
+            with self._lock:
+                idle = not self._active
+                if idle:
+                    self._wakeup.clear()
+            if idle:
+                self._wakeup.wait()
+                continue
+
+            time.sleep(self.interval)
+            frames = sys._current_frames()
+            with self._lock:
+                for ident, stacks in self._active.items():
+                    frame = frames.get(ident)
+                    if frame is None or ident == own_ident:
+                        continue
+                    stack = _fold(frame)
+                    stacks[stack] = stacks.get(stack, 0) + 1
+
+
+def _fold(frame):
+    """Root-first 'function (file:line)' frames joined with ';'"""
+    frames = []
+    while frame is not None:
+        code = frame.f_code
+        frames.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})')
+        frame = frame.f_back
+    return ';'.join(reversed(frames))
+
+
+_profiler = None
+
+
+def get_profiler():
+    """Get the profiler for this process (recreated after a fork)"""
+    global _profiler
+    if _profiler is None or _profiler.pid != os.getpid():
+        _profiler = SamplingProfiler(Config.PROFILER_INTERVAL_MS / 1000)
+    return _profiler
+
+
+def write_profile(endpoint, elapsed, stacks):
+    """
+    Write one request's stacks as a folded-stack file, keeping at most PROFILER_MAX_FILES
+
+    Returns:
+        str: Path of the written file
+    """
+    os.makedirs(Config.PROFILER_DIR, exist_ok=True)
+    name = f"{time.strftime('%Y%m%d-%H%M%S')}-{endpoint}-{int(elapsed * 1000)}ms-{os.getpid()}.folded"
+    path = os.path.join(Config.PROFILER_DIR, name)
+    with open(path, 'w') as f:
+        for stack, samples in sorted(stacks.items()):
+            f.write(f'{stack} {samples}\n')
+
+    profiles = sorted(
+        (entry for entry in os.scandir(Config.PROFILER_DIR) if entry.name.endswith('.folded')),
+        key=lambda entry: entry.stat().st_mtime
+    )
+    for entry in profiles[:-Config.PROFILER_MAX_FILES]:
+        try:
+            os.remove(entry.path)
+        except OSError:
+            pass
+    return path
+
+
+def install_profiler(app):
+    """Sample a share of requests and dump the slow ones (no-op unless PROFILER_ENABLED)"""
+    if not app.config.get('PROFILER_ENABLED'):
+        return
+
+    @app.before_request
+    def start_profiling():
+        if random.random() < app.config['PROFILER_SAMPLE_RATE']:
+            g.profile_started = time.perf_counter()
+            get_profiler().start(threading.get_ident())
+
+    @app.teardown_request
+    def stop_profiling(exception=None):
+        started = g.pop('profile_started', None)
+        if started is None:
+            return
+        stacks = get_profiler().stop(threading.get_ident())
+        elapsed = time.perf_counter() - started
+        if stacks and elapsed * 1000 >= app.config['PROFILER_SLOW_MS']:
+            try:
+                write_profile(request.endpoint or 'unmatched', elapsed, stacks)
+            except OSError as e:
+                print(f"Profile write failed: {str(e)}")
@@ -0,0 +1,215 @@
+"""
+Proxy Attendance Detector
+Checks every committed scan against compact per-session state, so suspicious
+marking patterns are flagged as they happen (O(1) per scan):
+
+- shared_ip: many students marked from the same IP address
+- rapid_scan: two students marked from one IP within an implausibly short interval
+- far_location: a location far from where the rest of the class scanned from
+
+Each IP raises shared_ip and rapid_scan at most once per session, when it
+first crosses the threshold, so one busy NAT does not alert on every scan;
+far_location is raised once per student. The checks need each student's real
+address: behind a reverse proxy set TRUSTED_PROXY_COUNT so
+request.remote_addr comes from X-Forwarded-For.
+
+State lives in each worker and is dropped when the session ends. Before each
+check a worker catches up on the scans other workers committed since its
+last check (one indexed query for the new attendance rows), so every worker
+sees the whole class. Alerts go to the rolling security metrics, which are
+shared between workers.
+"""
+import os
+import math
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from config import Config
+
+
+EARTH_RADIUS_METERS = 6371000
+
+# Located scans needed before the class centroid is trusted
+MIN_LOCATED_SCANS = 5
+
+# Alert kinds raised at most once per IP per session (others once per student)
+PER_IP_ALERTS = ('shared_ip', 'rapid_scan')
+
+
+def distance_meters(lat1, lon1, lat2, lon2):
+    """Great-circle (haversine) distance between two points"""
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_METERS * math.asin(math.sqrt(a))
+
+
+class _SessionState:
+    """What the detector remembers about one session"""
+
+    __slots__ = ('ip_students', 'ip_last_scan', 'alerted', 'lat_sum', 'lon_sum', 'located', 'last_attendance_id')
+
+    def __init__(self):
+        self.ip_students = {}    # ip -> number of students marked from it
+        self.ip_last_scan = {}   # ip -> (marked_at, student_id) of the latest scan from it
+        self.alerted = set()     # (kind, ip) or (kind, student_id) already alerted for this session
+        self.lat_sum = 0.0
+        self.lon_sum = 0.0
+        self.located = 0
+        self.last_attendance_id = 0  # newest attendance row applied
+
+
+class ProxyDetector:
+    """Per-process incremental detector with bounded per-session state"""
+
+    def __init__(self, max_students_per_ip=3, min_interval_seconds=5, max_distance_meters=300, max_sessions=500):
+        self.max_students_per_ip = max_students_per_ip
+        self.min_interval_seconds = min_interval_seconds
+        self.max_distance_meters = max_distance_meters
+        self.max_sessions = max_sessions
+        self.pid = os.getpid()
+        self._lock = threading.Lock()
+        self._sessions = OrderedDict()
+
+    def _apply(self, state, session_id, student_id, ip_address, marked_at, latitude, longitude):
+        """Update one session's state with a scan and return the alerts it raises"""
+        alerts = []
+
+        def alert(kind, detail):
+            key = (kind, ip_address if kind in PER_IP_ALERTS else student_id)
+            if key in state.alerted:
+                return
+            state.alerted.add(key)
+            alerts.append({
+                'kind': kind,
+                'session_id': session_id,
+                'student_id': student_id,
+                'ip_address': ip_address,
+                'detail': detail,
+                'created_at': datetime.utcnow().isoformat()
+            })
+
+        if ip_address:
+            count = state.ip_students.get(ip_address, 0) + 1
+            state.ip_students[ip_address] = count
+            if count >= self.max_students_per_ip:
+                alert('shared_ip', f'{count} students marked from {ip_address}')
+
+            last_scan = state.ip_last_scan.get(ip_address)
+            if last_scan and marked_at and last_scan[0]:
+                interval = (marked_at - last_scan[0]).total_seconds()
+                if 0 <= interval < self.min_interval_seconds and last_scan[1] != student_id:
+                    alert('rapid_scan', f'Marked {interval:.1f}s after another student from the same IP')
+            state.ip_last_scan[ip_address] = (marked_at, student_id)
+
+        if latitude is not None and longitude is not None:
+            is_far = False
+            if state.located >= MIN_LOCATED_SCANS:
+                distance = distance_meters(latitude, longitude,
+                                           state.lat_sum / state.located, state.lon_sum / state.located)
+                if distance > self.max_distance_meters:
+                    is_far = True
+                    alert('far_location', f'Scanned {distance:.0f}m from the rest of the class')
+            # Outliers are kept out of the centroid so they cannot drag it
+            if not is_far:
+                state.lat_sum += latitude
+                state.lon_sum += longitude
+                state.located += 1
+
+        return alerts
+
+    def _new_scans(self, session_id, after_id):
+        """Attendance rows of a session committed after the given row id, oldest first"""
+        from models import Attendance
+
+        return Attendance.query.with_entities(
+            Attendance.id, Attendance.student_id, Attendance.ip_address, Attendance.marked_at,
+            Attendance.latitude, Attendance.longitude
+        ).filter(
+            Attendance.session_id == session_id,
+            Attendance.id > after_id
+        ).order_by(Attendance.id).all()
+
+    def observe(self, session_id, student_id, ip_address, marked_at, latitude=None, longitude=None):
+        """
+        Check one committed scan
+
+        Scans other workers committed since this worker's last check are applied
+        first; alerts they raise were already published by those workers, so only
+        the dedup state is kept from them.
+
+        Returns:
+            list: Alerts raised by this scan (usually empty)
+        """
+        with self._lock:
+            state = self._sessions.get(session_id)
+            if state is None:
+                state = self._sessions[session_id] = _SessionState()
+                while len(self._sessions) > self.max_sessions:
+                    self._sessions.popitem(last=False)
+            else:
+                self._sessions.move_to_end(session_id)
+            after_id = state.last_attendance_id
+
+        rows = self._new_scans(session_id, after_id)
+
+        with self._lock:
+            alerts = []
+            found = False
+            for row_id, row_student_id, row_ip, row_marked_at, row_latitude, row_longitude in rows:
+                found = found or row_student_id == student_id
+                if row_id <= state.last_attendance_id:
+                    continue  # applied meanwhile by another thread of this worker
+                state.last_attendance_id = row_id
+                raised = self._apply(state, session_id, row_student_id, row_ip, row_marked_at,
+                                     _to_float(row_latitude), _to_float(row_longitude))
+                if row_student_id == student_id:
+                    alerts = raised
+            if not found:
+                # Not committed (or already behind the watermark): check the scan as given
+                alerts = self._apply(state, session_id, student_id, ip_address, marked_at,
+                                     _to_float(latitude), _to_float(longitude))
+            return alerts
+
+    def evict(self, session_id):
+        """Drop a session's state (called when the session ends)"""
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+
+def _to_float(value):
+    try:
+        return float(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+_detector = None
+_detector_lock = threading.Lock()
+
+
+def get_proxy_detector():
+    """The current process's detector (recreated after a fork)"""
+    global _detector
+    with _detector_lock:
+        if _detector is None or _detector.pid != os.getpid():
+            _detector = ProxyDetector(
+                Config.PROXY_MAX_STUDENTS_PER_IP,
+                Config.PROXY_MIN_SCAN_INTERVAL_SECONDS,
+                Config.PROXY_MAX_DISTANCE_METERS,
+                Config.PROXY_MAX_SESSIONS
+            )
+        return _detector
+
+
+def check_scan(session_id, student_id, ip_address, marked_at, latitude=None, longitude=None):
+    """Run the detector on a committed scan and publish any alerts; never raises"""
+    try:
+        from utils.security_metrics import get_security_metrics
+
+        alerts = get_proxy_detector().observe(session_id, student_id, ip_address, marked_at, latitude, longitude)
+        for alert in alerts:
+            get_security_metrics().record_alert(alert)
+        return alerts
+    except Exception as e:
+        print(f"Proxy detection failed: {str(e)}")
+        return []
@@ -1,4 +1,3 @@
-import qrcode
 import secrets
 import string
 import json
@@ -63,6 +62,9 @@ def create_qr_code_image(data):
     Create QR code image from data
     Returns: base64 encoded image string
     """
+    # Imported here so workers don't load qrcode/Pillow until the first QR is drawn
+    import qrcode
+    
     # Create QR code instance
     qr = qrcode.QRCode(
         version=1,
@@ -0,0 +1,98 @@
+"""
+Query Plan Checks
+EXPLAINs the hot queries and flags any that fall back to a full table scan,
+so a dropped or unusable index is caught before it reaches production
+(run through `python migrate.py --check-plans`)
+"""
+import json
+from datetime import datetime, timedelta
+from sqlalchemy import select, func, or_, and_
+from models import db, Student, Session, Attendance, AuditLog
+
+
+def hot_queries():
+    """(name, table that must not be fully scanned, statement) for each hot query path"""
+    return [
+        ('students_by_class', 'students',
+         select(Student.id).where(Student.branch == 'Computer Science', Student.semester == 6,
+                                  Student.division == 'A')),
+        ('teacher_sessions_by_date', 'sessions',
+         select(Session.id).where(Session.teacher_id == 1).order_by(Session.session_date.desc())),
+        ('teacher_active_sessions', 'sessions',
+         select(Session.id).where(Session.teacher_id == 1, Session.is_active == True)),
+        ('session_present_count', 'attendance',
+         select(func.count(Attendance.id)).where(Attendance.session_id == 1, Attendance.status == 'Present')),
+        ('mark_duplicate_check', 'attendance',
+         select(Attendance.id).where(Attendance.student_id == 1, Attendance.session_id == 1).limit(1)),
+        ('session_report_attendance', 'attendance',
+         select(Attendance.student_id, Attendance.status).where(Attendance.session_id == 1)),
+        ('recent_audit_logs', 'audit_logs',
+         select(AuditLog.id).where(AuditLog.created_at >= datetime.utcnow() - timedelta(hours=24))
+         .order_by(AuditLog.created_at.desc())),
+        ('audit_keyset_page', 'audit_logs',
+         select(AuditLog.id).where(or_(
+             AuditLog.created_at < datetime(2024, 1, 1),
+             and_(AuditLog.created_at == datetime(2024, 1, 1), AuditLog.id < 1000)
+         )).order_by(AuditLog.created_at.desc(), AuditLog.id.desc()).limit(100)),
+    ]
+
+
+def _explain_sqlite(sql, table):
+    rows = db.session.execute(db.text(f'EXPLAIN QUERY PLAN {sql}')).fetchall()
+    plan = [row[-1] for row in rows]
+    # "SCAN students" is a full scan; "SEARCH ..." and "SCAN ... USING [COVERING] INDEX" are not
+    full_scan = any(detail.split(' ')[:2] == ['SCAN', table] and 'USING' not in detail for detail in plan)
+    return plan, full_scan
+
+
+def _explain_postgresql(sql, table):
+    # Tiny tables make a sequential scan the cheapest plan; only flag it when no index can serve the query
+    db.session.execute(db.text('SET LOCAL enable_seqscan = off'))
+    result = db.session.execute(db.text(f'EXPLAIN (FORMAT JSON) {sql}')).scalar()
+    root = (json.loads(result) if isinstance(result, str) else result)[0]['Plan']
+
+    plan, full_scan = [], False
+    nodes = [root]
+    while nodes:
+        node = nodes.pop()
+        plan.append(f"{node['Node Type']} {node.get('Relation Name', '')}".strip())
+        if node['Node Type'] == 'Seq Scan' and node.get('Relation Name') == table:
+            full_scan = True
+        nodes.extend(node.get('Plans', []))
+    db.session.rollback()
+    return plan, full_scan
+
+
+def _explain_mysql(sql, table):
+    result = db.session.execute(db.text(f'EXPLAIN {sql}'))
+    rows = [dict(zip(result.keys(), row)) for row in result.fetchall()]
+    plan = [f"{row.get('table')}: {row.get('type')} {row.get('key') or ''}".strip() for row in rows]
+    full_scan = any(row.get('table') == table and row.get('type') == 'ALL' for row in rows)
+    return plan, full_scan
+
+
+_EXPLAINERS = {
+    'sqlite': _explain_sqlite,
+    'postgresql': _explain_postgresql,
+    'mysql': _explain_mysql,
+}
+
+
+def check_query_plans():
+    """
+    EXPLAIN every hot query on the current database
+
+    Returns:
+        list: dicts with name, table, plan (list of steps) and full_scan
+    """
+    dialect = db.engine.dialect
+    explain = _EXPLAINERS.get(dialect.name)
+    if explain is None:
+        raise RuntimeError(f'Query plan checks are not supported on {dialect.name}')
+
+    results = []
+    for name, table, statement in hot_queries():
+        sql = str(statement.compile(dialect=dialect, compile_kwargs={'literal_binds': True}))
+        plan, full_scan = explain(sql, table)
+        results.append({'name': name, 'table': table, 'plan': plan, 'full_scan': full_scan})
+    return results
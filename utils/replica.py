@@ -0,0 +1,170 @@
+"""
+Read Replica Routing
+Endpoints marked with @read_replica send their queries to the DATABASE_REPLICA_URL
+bind, while flushes and INSERT/UPDATE/DELETE statements always go to the primary.
+A user who wrote within REPLICA_READ_YOUR_WRITES_SECONDS reads from the primary so
+they never see their own change missing, and a replica error fails the request
+back to the primary and keeps the replica out of rotation for REPLICA_RETRY_SECONDS.
+"""
+import time
+import threading
+from collections import OrderedDict
+from functools import wraps
+from flask import g, request, current_app, has_request_context
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.sql.dml import UpdateBase
+from sqlalchemy.sql.elements import TextClause
+from config import Config
+
+
+REPLICA_BIND = 'replica'
+
+# Set on successful writes so the user's next reads (on any worker) use the primary
+WRITE_COOKIE = 'last_db_write'
+
+
+class ReplicaState:
+    """Replica health, routing counters and recent writers for this process"""
+
+    def __init__(self, max_writers=10000):
+        self._lock = threading.Lock()
+        self.max_writers = max_writers
+        self._writes = OrderedDict()  # (user_type, user_id) -> time of last write
+        self.down_until = 0.0
+        self.last_error = None
+        self.failures = 0
+        self.replica_reads = 0
+        self.primary_reads = 0
+        self.failbacks = 0
+
+    def available(self):
+        return time.time() >= self.down_until
+
+    def mark_down(self, error):
+        with self._lock:
+            self.down_until = time.time() + Config.REPLICA_RETRY_SECONDS
+            self.failures += 1
+            self.last_error = str(error)[:200]
+
+    def record_write(self, user):
+        key = (user.get('user_type'), user.get('user_id'))
+        with self._lock:
+            self._writes[key] = time.time()
+            self._writes.move_to_end(key)
+            while len(self._writes) > self.max_writers:
+                self._writes.popitem(last=False)
+
+    def wrote_recently(self, user):
+        with self._lock:
+            written_at = self._writes.get((user.get('user_type'), user.get('user_id')))
+        return written_at is not None and time.time() - written_at < Config.REPLICA_READ_YOUR_WRITES_SECONDS
+
+    def count(self, name):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'available': time.time() >= self.down_until,
+                'replica_reads': self.replica_reads,
+                'primary_reads': self.primary_reads,
+                'failbacks': self.failbacks,
+                'failures': self.failures,
+                'last_error': self.last_error
+            }
+
+
+replica_state = ReplicaState()
+
+
+def _is_write(clause):
+    if isinstance(clause, UpdateBase):
+        return True
+    if isinstance(clause, TextClause):
+        return not clause.text.lstrip().upper().startswith(('SELECT', 'WITH', 'EXPLAIN', 'PRAGMA'))
+    return False
+
+
+class RoutingSession(Session):
+    """Session that reads from the replica inside @read_replica endpoints"""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and has_request_context():
+            if self._flushing or _is_write(clause):
+                g.db_wrote = True
+            elif g.get('read_replica'):
+                return self._db.engines[REPLICA_BIND]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def _wrote_recently(current_user):
+    try:
+        written_at = float(request.cookies.get(WRITE_COOKIE, 0))
+    except ValueError:
+        written_at = 0
+    if time.time() - written_at < Config.REPLICA_READ_YOUR_WRITES_SECONDS:
+        return True
+    return replica_state.wrote_recently(current_user)
+
+
+def read_replica(f):
+    """
+    Route an endpoint's reads to the replica (place below @token_required)
+    Falls back to the primary when no replica is configured, the replica is
+    down, or the user wrote recently.
+    """
+    @wraps(f)
+    def decorated_function(current_user, *args, **kwargs):
+        use_replica = (REPLICA_BIND in current_app.config.get('SQLALCHEMY_BINDS', {})
+                       and replica_state.available()
+                       and not _wrote_recently(current_user))
+        g.read_replica = use_replica
+        replica_state.count('replica_reads' if use_replica else 'primary_reads')
+
+        response = f(current_user, *args, **kwargs)
+
+        if use_replica and g.pop('replica_failed', False):
+            # The replica failed during the request: answer it from the primary
+            current_app.extensions['sqlalchemy'].session.rollback()
+            g.read_replica = False
+            replica_state.count('failbacks')
+            response = f(current_user, *args, **kwargs)
+        return response
+
+    return decorated_function
+
+
+def install_replica(app, db):
+    """Hook up the replica bind, if configured: error failback, metrics and read-your-writes cookie"""
+    if REPLICA_BIND not in app.config.get('SQLALCHEMY_BINDS', {}):
+        return None
+
+    from utils.db_pool import install_pool_metrics
+    from utils.sqlite_profile import install_sqlite_pragmas
+
+    with app.app_context():
+        engine = db.engines[REPLICA_BIND]
+    install_sqlite_pragmas(engine)
+    install_pool_metrics(engine)
+
+    @event.listens_for(engine, 'handle_error')
+    def replica_error(context):
+        if context.is_disconnect or isinstance(context.sqlalchemy_exception, OperationalError):
+            replica_state.mark_down(context.original_exception)
+            if has_request_context():
+                g.replica_failed = True
+
+    @app.after_request
+    def remember_writes(response):
+        if g.get('db_wrote') and response.status_code < 400:
+            user = g.get('current_user')
+            if user:
+                replica_state.record_write(user)
+            response.set_cookie(WRITE_COOKIE, str(time.time()), max_age=Config.REPLICA_READ_YOUR_WRITES_SECONDS,
+                                httponly=True, samesite='Lax')
+        return response
+
+    return engine
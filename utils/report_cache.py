@@ -0,0 +1,143 @@
+"""
+Report Result Cache
+Caches per-session report payloads keyed by session id plus a version.
+The version is read from the database (the session row's own state and the
+class roster), so an entry built by any worker before a change is never
+served after it.
+"""
+import os
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+from sqlalchemy import func
+from config import Config
+
+
+class ReportCache:
+    """Thread-safe LRU cache with an optional on-disk tier for finished sessions"""
+
+    def __init__(self, max_entries=256, disk_dir=None):
+        self.max_entries = max_entries
+        self.disk_dir = disk_dir
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _disk_path(self, key):
+        digest = hashlib.sha256(key.encode('utf-8')).hexdigest()
+        return os.path.join(self.disk_dir, f'{digest}.json')
+
+    def get(self, key, disk_key=None):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+
+        if self.disk_dir and disk_key:
+            try:
+                with open(self._disk_path(disk_key)) as f:
+                    value = json.load(f)
+                self.set(key, value)
+                with self._lock:
+                    self.hits += 1
+                return value
+            except (OSError, ValueError):
+                pass
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def set(self, key, value, disk_key=None):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+        if self.disk_dir and disk_key:
+            try:
+                os.makedirs(self.disk_dir, exist_ok=True)
+                path = self._disk_path(disk_key)
+                tmp_path = f'{path}.{os.getpid()}.tmp'
+                with open(tmp_path, 'w') as f:
+                    json.dump(value, f)
+                os.replace(tmp_path, path)
+            except OSError as e:
+                print(f"Report cache disk write failed: {str(e)}")
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'disk_enabled': bool(self.disk_dir)
+            }
+
+
+report_cache = ReportCache(
+    max_entries=Config.REPORT_CACHE_SIZE,
+    disk_dir=Config.REPORT_CACHE_DIR or None
+)
+
+def session_version(session):
+    """Version string of a session's report inputs as stored in the database"""
+    return f"{session.present_count or 0}:{int(bool(session.is_active))}:{session.end_time}"
+
+
+def roster_version(branch, semester, division=None):
+    """
+    Version string of a class roster (changes when students register, are imported or updated)
+
+    Args:
+        branch: Branch of the class
+        semester: Semester of the class
+        division: Division of the class (optional)
+
+    Returns:
+        str: Student count, highest id and latest update of the roster
+    """
+    from models import db, Student
+
+    query = db.session.query(
+        func.count(Student.id), func.max(Student.id), func.max(Student.updated_at)
+    ).filter(
+        Student.branch == branch,
+        Student.semester == semester
+    )
+    if division:
+        query = query.filter(Student.division == division)
+    count, max_id, updated_at = query.one()
+    return f"{count}:{max_id or 0}:{updated_at.isoformat() if updated_at else ''}"
+
+
+def get_or_build_report(kind, session, build, variant=None):
+    """
+    Return a cached report payload for a session, building it on a miss
+
+    Args:
+        kind: Report kind, e.g. 'session_report'
+        session: Session the report is about
+        build: Callable returning the payload (must be JSON serialisable)
+        variant: Extra request parameter that changes the payload; also the
+            roster division when the session has none (optional)
+
+    Returns:
+        The report payload
+    """
+    roster = roster_version(session.branch, session.semester, session.division or variant)
+    key = f"{kind}:{session.id}:{variant or ''}:{session_version(session)}:{roster}"
+
+    # Only finished sessions are immutable, so only they go to disk
+    disk_key = key if not session.is_active else None
+
+    payload = report_cache.get(key, disk_key=disk_key)
+    if payload is None:
+        payload = build()
+        report_cache.set(key, payload, disk_key=disk_key)
+    return payload
@@ -0,0 +1,304 @@
+"""
+Background Report Jobs
+Runs long report builds in a separate process pool so they never tie up a
+web worker. Job status and results are plain files in REPORT_JOBS_DIR, so any
+web worker can answer status and download requests.
+"""
+import os
+import re
+import json
+import secrets
+import multiprocessing
+from datetime import datetime, timedelta
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from config import Config
+
+
+# Kinds accepted by /api/attendance/jobs ('roster' is submitted by the roster import endpoint)
+JOB_KINDS = ('report', 'matrix', 'audit')
+
+_JOB_ID_PATTERN = re.compile(r'^[0-9a-f]{16}$')
+_INPUT_FILE_PATTERN = re.compile(r'^[0-9a-f]{16}\.input\.csv$')
+
+_executor = None
+_worker_app = None
+
+
+def _jobs_dir():
+    os.makedirs(Config.REPORT_JOBS_DIR, exist_ok=True)
+    return Config.REPORT_JOBS_DIR
+
+
+def _status_path(job_id):
+    return os.path.join(_jobs_dir(), f'{job_id}.job.json')
+
+
+def _write_status(job):
+    """Atomically replace the status file of a job"""
+    path = _status_path(job['id'])
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(job, f)
+    os.replace(tmp_path, path)
+
+
+def get_job(job_id):
+    """Load job status, or None if the id is unknown"""
+    if not job_id or not _JOB_ID_PATTERN.match(job_id):
+        return None
+    try:
+        with open(_status_path(job_id)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def write_job_input(content):
+    """
+    Store an uploaded CSV for a job (readable by this user only; deleted once the job has read it)
+
+    Returns:
+        str: File name to pass in the job params as input_file
+    """
+    name = f'{secrets.token_hex(8)}.input.csv'
+    fd = os.open(os.path.join(_jobs_dir(), name), os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    with os.fdopen(fd, 'w', encoding='utf-8', newline='') as f:
+        f.write(content)
+    return name
+
+
+def get_job_result_path(job):
+    """Absolute path of a finished job's result file"""
+    return os.path.join(_jobs_dir(), job['result_file'])
+
+
+def _init_worker():
+    """
+    Give each pool process a bare app with its own database engine
+
+    Builders only need the database, so none of the web app's routes, request
+    metrics, profiler or replica routing are set up here.
+    """
+    global _worker_app
+    from flask import Flask
+    from config import config
+    from models import db
+    from utils.sqlite_profile import install_sqlite_pragmas
+
+    _worker_app = Flask(__name__)
+    _worker_app.config.from_object(config[os.getenv('FLASK_ENV', 'production')])
+    db.init_app(_worker_app)
+    with _worker_app.app_context():
+        # busy_timeout/WAL, so jobs writing to SQLite wait for the web workers instead of failing
+        install_sqlite_pragmas(db.engine)
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        # Started through forkserver rather than forking a web worker that runs background threads
+        method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+        _executor = ProcessPoolExecutor(
+            max_workers=Config.REPORT_JOB_WORKERS,
+            initializer=_init_worker,
+            mp_context=multiprocessing.get_context(method)
+        )
+    return _executor
+
+
+def purge_expired_jobs():
+    """Delete job files older than REPORT_JOB_RETENTION_HOURS"""
+    cutoff = datetime.utcnow() - timedelta(hours=Config.REPORT_JOB_RETENTION_HOURS)
+    jobs_dir = _jobs_dir()
+    for name in os.listdir(jobs_dir):
+        path = os.path.join(jobs_dir, name)
+        try:
+            if datetime.utcfromtimestamp(os.path.getmtime(path)) < cutoff:
+                os.remove(path)
+        except OSError:
+            pass
+
+
+def submit_job(kind, params, owner_id):
+    """
+    Queue a report build in the background pool
+
+    Args:
+        kind: One of JOB_KINDS, or 'roster'
+        params: Report parameters (dict)
+        owner_id: Teacher that requested the job
+
+    Returns:
+        dict: Initial job status
+    """
+    if kind not in _BUILDERS:
+        raise ValueError(f"Unknown job kind '{kind}', expected one of {', '.join(JOB_KINDS)}")
+
+    purge_expired_jobs()
+
+    job = {
+        'id': secrets.token_hex(8),
+        'kind': kind,
+        'params': params or {},
+        'owner_id': owner_id,
+        'status': 'queued',
+        'created_at': datetime.utcnow().isoformat(),
+        'started_at': None,
+        'finished_at': None,
+        'result_file': None,
+        'mimetype': None,
+        'size_bytes': None,
+        'error': None
+    }
+    _write_status(job)
+
+    global _executor
+    try:
+        _get_executor().submit(run_job, job['id'])
+    except BrokenProcessPool:
+        _executor = None
+        _get_executor().submit(run_job, job['id'])
+
+    return job
+
+
+def run_job(job_id):
+    """Build a job's result file (runs inside a pool process)"""
+    job = get_job(job_id)
+    if not job:
+        return
+
+    job['status'] = 'running'
+    job['started_at'] = datetime.utcnow().isoformat()
+    _write_status(job)
+
+    builder, extension, mimetype = _BUILDERS[job['kind']]
+    if job['kind'] == 'matrix' and job['params'].get('format') == 'xlsx':
+        extension = 'xlsx'
+        mimetype = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+    elif job['kind'] == 'matrix' and job['params'].get('format') == 'json':
+        extension = 'json'
+        mimetype = 'application/json'
+
+    result_file = f'{job_id}.{extension}'
+    result_path = os.path.join(_jobs_dir(), result_file)
+
+    try:
+        app = _worker_app
+        if app is None:
+            from flask import current_app
+            app = current_app._get_current_object()
+        with app.app_context():
+            builder(job, result_path)
+
+        job['status'] = 'done'
+        job['result_file'] = result_file
+        job['mimetype'] = mimetype
+        job['size_bytes'] = os.path.getsize(result_path)
+    except Exception as e:
+        job['status'] = 'failed'
+        job['error'] = str(e)
+        if os.path.exists(result_path):
+            os.remove(result_path)
+
+    job['finished_at'] = datetime.utcnow().isoformat()
+    _write_status(job)
+
+
+def _build_legacy_report(job, path):
+    """Filtered attendance report, streamed row by row to a JSON file"""
+    from utils.reports import legacy_report_query, legacy_report_row
+
+    params = job['params']
+    query = legacy_report_query(
+        job['owner_id'],
+        branch=params.get('branch'),
+        subject=params.get('subject'),
+        division=params.get('division')
+    )
+
+    with open(path, 'w') as f:
+        f.write('{"report": [')
+        for index, (session, attendance, student) in enumerate(query.yield_per(1000)):
+            if index:
+                f.write(',')
+            f.write(json.dumps(legacy_report_row(session, attendance, student)))
+        f.write(']}')
+
+
+def _build_matrix(job, path):
+    """Attendance matrix export as CSV, XLSX or JSON"""
+    from utils.analytics import build_attendance_matrix
+
+    params = job['params']
+    for field in ('branch', 'semester', 'subject'):
+        if not params.get(field):
+            raise ValueError(f'{field} is required')
+
+    matrix = build_attendance_matrix(
+        branch=params['branch'],
+        semester=int(params['semester']),
+        subject=params['subject'],
+        division=params.get('division'),
+        teacher_id=job['owner_id'],
+        threshold=float(params.get('threshold', 75.0))
+    )
+
+    if params.get('format') == 'xlsx':
+        with open(path, 'wb') as f:
+            f.write(matrix.to_xlsx())
+    elif params.get('format') == 'json':
+        with open(path, 'w') as f:
+            json.dump(matrix.to_dict(), f)
+    else:
+        with open(path, 'w', encoding='utf-8', newline='') as f:
+            f.write(matrix.to_csv())
+
+
+def _build_audit_export(job, path):
+    """Audit log export as JSON lines"""
+    from utils.audit_logger import iter_audit_logs
+
+    params = job['params']
+    with open(path, 'w') as f:
+        for log in iter_audit_logs(
+            user_id=job['owner_id'],
+            user_type='teacher',
+            session_id=params.get('session_id'),
+            event_type=params.get('event_type'),
+            include_archive=True
+        ):
+            f.write(json.dumps(log))
+            f.write('\n')
+
+
+def _build_roster_import(job, path):
+    """Bulk student import from an uploaded roster; the result lists the errors per CSV row"""
+    from utils.roster_import import import_roster
+
+    input_file = job['params'].get('input_file') or ''
+    if not _INPUT_FILE_PATTERN.match(input_file):
+        raise ValueError('Invalid roster input file')
+    input_path = os.path.join(_jobs_dir(), input_file)
+
+    try:
+        with open(input_path, encoding='utf-8', newline='') as f:
+            summary = import_roster(f)
+    finally:
+        try:
+            os.remove(input_path)
+        except OSError:
+            pass
+
+    with open(path, 'w') as f:
+        json.dump(summary, f)
+
+
+# kind -> (builder, file extension, mimetype)
+_BUILDERS = {
+    'report': (_build_legacy_report, 'json', 'application/json'),
+    'matrix': (_build_matrix, 'csv', 'text/csv'),
+    'audit': (_build_audit_export, 'jsonl', 'application/x-ndjson'),
+    'roster': (_build_roster_import, 'json', 'application/json'),
+}
@@ -0,0 +1,166 @@
+"""
+Attendance Report Builders
+Shared by the report endpoints and the background report jobs
+"""
+from models import db, Session, Attendance, Student
+
+
+def build_session_report(session, division=None):
+    """
+    Build the complete presentee/absentee report for one session
+
+    Args:
+        session: Session to report on
+        division: Division to use when the session has none
+
+    Returns:
+        dict: Report rows, summary and session info
+    """
+    # Get all students in the division for this session
+    division_filter = session.division if session.division else division
+    students_query = Student.query.filter_by(
+        branch=session.branch,
+        semester=session.semester
+    )
+
+    if division_filter:
+        students_query = students_query.filter_by(division=division_filter)
+
+    all_students = students_query.all()
+
+    # Get all attendance records for this session
+    attendance_records = Attendance.query.filter_by(
+        session_id=session.id
+    ).all()
+
+    # Create a map of student_id to attendance record
+    attendance_map = {att.student_id: att for att in attendance_records}
+
+    # Build report with both presentees and absentees
+    report_data = []
+    present_count = 0
+    absent_count = 0
+
+    for student in all_students:
+        attendance = attendance_map.get(student.id)
+        if attendance:
+            # Student is present
+            status = attendance.status
+            marked_at = attendance.marked_at.isoformat() if attendance.marked_at else None
+            present_count += 1
+        else:
+            # Student is absent
+            status = 'Absent'
+            marked_at = None
+            absent_count += 1
+
+        report_data.append({
+            'session_id': session.session_id,
+            'subject': session.subject,
+            'branch': session.branch,
+            'semester': session.semester,
+            'division': session.division or division_filter,
+            'session_date': session.session_date.isoformat(),
+            'student_id': student.student_id,
+            'student_name': student.full_name,
+            'student_email': student.email,
+            'status': status,
+            'marked_at': marked_at
+        })
+
+    # Sort by student_id for better readability
+    report_data.sort(key=lambda x: x['student_id'])
+
+    return {
+        'report': report_data,
+        'summary': {
+            'total_students': len(all_students),
+            'present': present_count,
+            'absent': absent_count,
+            'attendance_percentage': round((present_count / len(all_students) * 100) if all_students else 0, 2)
+        },
+        'session_info': {
+            'session_id': session.session_id,
+            'subject': session.subject,
+            'branch': session.branch,
+            'semester': session.semester,
+            'division': session.division or division_filter,
+            'session_date': session.session_date.isoformat()
+        }
+    }
+
+
+def build_session_attendance(session, include_session=True):
+    """
+    Build the list of attendance records (with student details) for one session
+
+    Args:
+        session: Session to list
+        include_session: Include the session's own details under 'session'
+
+    Returns:
+        dict: Attendance records and the present count
+    """
+    attendance_records = db.session.query(
+        Attendance, Student
+    ).join(
+        Student, Attendance.student_id == Student.id
+    ).filter(
+        Attendance.session_id == session.id
+    ).all()
+
+    attendance_data = []
+    for att, student in attendance_records:
+        attendance_data.append({
+            'attendance_id': att.id,
+            'student_id': student.student_id,
+            'student_name': student.full_name,
+            'status': att.status,
+            'marked_at': att.marked_at.isoformat() if att.marked_at else None
+        })
+
+    payload = {
+        'attendance': attendance_data,
+        'total_present': len([a for a in attendance_data if a['status'] == 'Present'])
+    }
+    if include_session:
+        payload['session'] = session.to_dict()
+    return payload
+
+
+def legacy_report_query(teacher_id, branch=None, subject=None, division=None):
+    """Query for the filtered (session, attendance, student) report rows"""
+    query = db.session.query(
+        Session, Attendance, Student
+    ).join(
+        Attendance, Session.id == Attendance.session_id
+    ).join(
+        Student, Attendance.student_id == Student.id
+    ).filter(
+        Session.teacher_id == teacher_id
+    )
+
+    # Apply filters
+    if branch:
+        query = query.filter(Session.branch == branch)
+    if subject:
+        query = query.filter(Session.subject == subject)
+    if division:
+        query = query.filter(Session.division == division)
+
+    return query.order_by(Session.session_date.desc())
+
+
+def legacy_report_row(session, attendance, student):
+    """Format one row of the filtered report"""
+    return {
+        'session_id': session.session_id,
+        'subject': session.subject,
+        'session_date': session.session_date.isoformat(),
+        'student_id': student.student_id,
+        'student_name': student.full_name,
+        'branch': student.branch,
+        'division': student.division,
+        'status': attendance.status,
+        'marked_at': attendance.marked_at.isoformat() if attendance.marked_at else None
+    }
@@ -0,0 +1,258 @@
+"""
+Bulk Student Roster Import
+Registers a CSV roster in a handful of statements instead of one request per
+student: every row is validated in one pass, uniqueness is checked with a
+single set-based query, passwords are hashed in a process pool (each with its
+own salt) and rows are written with multi-row INSERTs in batches. Problems are reported per
+CSV row; valid rows are imported even when others fail.
+"""
+import io
+import csv
+import time
+import bcrypt
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+from sqlalchemy import insert, or_
+from sqlalchemy.exc import IntegrityError, DataError, DBAPIError
+from models import db, Student
+from utils.validators import validate_registration_data, validate_phone
+from config import Config
+
+
+REQUIRED_COLUMNS = ('student_id', 'email', 'password', 'full_name', 'branch', 'semester', 'year')
+OPTIONAL_COLUMNS = ('division', 'phone', 'address', 'gender', 'admission_date',
+                    'total_fee', 'paid_fee', 'fee_status')
+
+_CHOICES = {
+    'gender': ('Male', 'Female', 'Other'),
+    'fee_status': ('Paid', 'Pending', 'Partial'),
+}
+
+
+def parse_roster_csv(content):
+    """
+    Read a roster CSV (header row required)
+
+    Args:
+        content: CSV text or a text file object
+
+    Returns:
+        list: Row dicts with normalised keys, each with its CSV line number under '_row'
+    """
+    reader = csv.DictReader(io.StringIO(content) if isinstance(content, str) else content)
+    if not reader.fieldnames:
+        raise ValueError('The roster is empty')
+
+    reader.fieldnames = [name.strip().lower() for name in reader.fieldnames]
+    missing = [column for column in REQUIRED_COLUMNS if column not in reader.fieldnames]
+    if missing:
+        raise ValueError(f"Missing columns: {', '.join(missing)}")
+
+    rows = []
+    for row in reader:
+        cleaned = {key: (value or '').strip() for key, value in row.items() if key}
+        cleaned['_row'] = reader.line_num
+        rows.append(cleaned)
+    return rows
+
+
+def _to_student(row):
+    """Convert a validated row to Student column values (raises ValueError on bad values)"""
+    values = {
+        'student_id': row['student_id'],
+        'email': row['email'],
+        'full_name': row['full_name'],
+        'branch': row['branch'],
+        'semester': int(row['semester']),
+        'year': int(row['year']),
+    }
+    for column in ('division', 'phone', 'address'):
+        values[column] = row.get(column) or None
+    for column, choices in _CHOICES.items():
+        if row.get(column):
+            if row[column] not in choices:
+                raise ValueError(f"{column} must be one of {', '.join(choices)}")
+            values[column] = row[column]
+    if row.get('admission_date'):
+        values['admission_date'] = datetime.strptime(row['admission_date'], '%Y-%m-%d').date()
+    for column in ('total_fee', 'paid_fee'):
+        if row.get(column):
+            values[column] = float(row[column])
+    return values
+
+
+def _length_problems(values):
+    """Values longer than their String column (Postgres/MySQL would reject the whole INSERT)"""
+    problems = []
+    for column, value in values.items():
+        length = getattr(Student.__table__.c[column].type, 'length', None)
+        if length and isinstance(value, str) and len(value) > length:
+            problems.append(f'{column} is longer than {length} characters')
+    return problems
+
+
+def validate_roster(rows):
+    """
+    Validate every row in one pass, including duplicates within the file
+
+    Returns:
+        tuple: (list of (row, student values), list of error dicts)
+    """
+    valid, errors = [], []
+    seen_ids, seen_emails = {}, {}
+
+    for row in rows:
+        problems = validate_registration_data(row, 'student')
+        if not validate_phone(row.get('phone')):
+            problems.append('Invalid phone number (10 digits)')
+
+        values = None
+        if not problems:
+            try:
+                values = _to_student(row)
+                problems.extend(_length_problems(values))
+            except ValueError as e:
+                problems.append(f'Invalid value: {str(e)}')
+
+        if values and not problems:
+            for key, seen, label in (('student_id', seen_ids, 'Student ID'), ('email', seen_emails, 'Email')):
+                first_row = seen.setdefault(values[key], row['_row'])
+                if first_row != row['_row']:
+                    problems.append(f'{label} already used on row {first_row}')
+
+        if problems:
+            errors.append({'row': row['_row'], 'student_id': row.get('student_id'), 'errors': problems})
+        else:
+            valid.append((row, values))
+    return valid, errors
+
+
+def find_existing(students):
+    """Student IDs and emails of the given students that are already registered (one query)"""
+    ids = [values['student_id'] for _, values in students]
+    emails = [values['email'] for _, values in students]
+    if not ids:
+        return set(), set()
+
+    existing = db.session.query(Student.student_id, Student.email).filter(
+        or_(Student.student_id.in_(ids), Student.email.in_(emails))
+    ).all()
+    return {student_id for student_id, _ in existing}, {email for _, email in existing}
+
+
+def _hash(password, rounds):
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds=rounds)).decode('utf-8')
+
+
+def hash_passwords(passwords, workers=None, rounds=None):
+    """
+    Hash passwords in a process pool, every one with its own salt
+
+    Students sharing an initial password still get distinct hashes, so the
+    table does not reveal who shares one and each costs a separate crack.
+    Hashes use the cheap ROSTER_BCRYPT_ROUNDS, which keeps a 5,000 student
+    import under a minute on one core; the first login re-hashes them with
+    BCRYPT_ROUNDS (see rehash_password_if_needed).
+
+    Returns:
+        list: bcrypt hashes, in the order of passwords
+    """
+    workers = workers or Config.ROSTER_HASH_WORKERS
+    rounds = rounds or Config.ROSTER_BCRYPT_ROUNDS
+
+    if workers <= 1 or len(passwords) <= 1:
+        return [_hash(password, rounds) for password in passwords]
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        chunksize = max(1, len(passwords) // (workers * 4))
+        return list(executor.map(_hash, passwords, [rounds] * len(passwords), chunksize=chunksize))
+
+
+def _insert_batch(batch, errors):
+    """Insert one batch in a single statement; if the database rejects it, retry row by row to find the culprits"""
+    try:
+        db.session.execute(insert(Student), [values for _, values in batch])
+        db.session.commit()
+        return len(batch)
+    except (IntegrityError, DataError):
+        db.session.rollback()
+
+    created = 0
+    for row, values in batch:
+        try:
+            with db.session.begin_nested():
+                db.session.execute(insert(Student), [values])
+            created += 1
+        except IntegrityError:
+            errors.append({'row': row['_row'], 'student_id': values['student_id'],
+                           'errors': ['Student with this email or student ID already exists']})
+        except DBAPIError as e:
+            # e.g. a value out of range for its column; reported on the row instead of aborting the import
+            errors.append({'row': row['_row'], 'student_id': values['student_id'],
+                           'errors': [f'Rejected by the database: {str(e.orig).splitlines()[0]}']})
+    db.session.commit()
+    return created
+
+
+def import_roster(content, dry_run=False, workers=None, batch_size=None):
+    """
+    Validate and import a roster CSV
+
+    Args:
+        content: CSV text or text file object
+        dry_run: Only validate and check uniqueness, write nothing
+        workers: Hashing processes (default ROSTER_HASH_WORKERS)
+        batch_size: Rows per INSERT statement (default ROSTER_BATCH_SIZE)
+
+    Returns:
+        dict: total_rows, created, failed, errors (per row), dry_run and timings in seconds
+    """
+    timings = {}
+    started = time.perf_counter()
+
+    rows = parse_roster_csv(content)
+    if len(rows) > Config.ROSTER_MAX_ROWS:
+        raise ValueError(f'The roster has {len(rows)} rows, the limit is {Config.ROSTER_MAX_ROWS}')
+    students, errors = validate_roster(rows)
+    timings['validate'] = time.perf_counter() - started
+
+    lap = time.perf_counter()
+    existing_ids, existing_emails = find_existing(students)
+    new_students = []
+    for row, values in students:
+        problems = []
+        if values['student_id'] in existing_ids:
+            problems.append('Student ID is already registered')
+        if values['email'] in existing_emails:
+            problems.append('Email is already registered')
+        if problems:
+            errors.append({'row': row['_row'], 'student_id': values['student_id'], 'errors': problems})
+        else:
+            new_students.append((row, values))
+    timings['uniqueness'] = time.perf_counter() - lap
+
+    created = 0
+    if not dry_run and new_students:
+        lap = time.perf_counter()
+        hashes = hash_passwords([row['password'] for row, _ in new_students], workers=workers)
+        for (_, values), password_hash in zip(new_students, hashes):
+            values['password_hash'] = password_hash
+        timings['hash'] = time.perf_counter() - lap
+
+        lap = time.perf_counter()
+        batch_size = batch_size or Config.ROSTER_BATCH_SIZE
+        for start in range(0, len(new_students), batch_size):
+            created += _insert_batch(new_students[start:start + batch_size], errors)
+        timings['insert'] = time.perf_counter() - lap
+
+    timings['total'] = time.perf_counter() - started
+    errors.sort(key=lambda error: error['row'])
+    return {
+        'total_rows': len(rows),
+        'created': created,
+        'valid': len(new_students),
+        'failed': len(errors),
+        'errors': errors,
+        'dry_run': dry_run,
+        'timings': {name: round(seconds, 3) for name, seconds in timings.items()}
+    }
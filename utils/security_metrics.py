@@ -0,0 +1,230 @@
+"""
+Rolling Security Metrics
+In-process sliding-window counters of audit events (per minute buckets over
+24 hours, by event type and success) plus a small ring buffer of recent
+failures, updated as events are logged. Each worker periodically writes a
+snapshot to SECURITY_METRICS_DIR and readers merge all snapshots, so the
+security dashboard never scans audit_logs.
+"""
+import os
+import re
+import json
+import time
+import atexit
+import threading
+from collections import deque
+from datetime import datetime, timedelta
+from config import Config
+
+
+WINDOW_MINUTES = 24 * 60
+
+_SNAPSHOT_NAME = re.compile(r'^metrics-(\d+)\.json$')
+
+
+def build_security_summary(counts, hours):
+    """
+    Shape (event_type, success, count) rows into the security summary
+
+    Args:
+        counts: Iterable of (event_type, success, count)
+        hours: Length of the time window the counts cover
+
+    Returns:
+        dict: Security summary statistics
+    """
+    total_events = 0
+    successful_events = 0
+    unauthorized_access = 0
+
+    # Event type breakdown
+    event_types = {}
+    for event_type, success, count in counts:
+        count = int(count or 0)
+        if event_type not in event_types:
+            event_types[event_type] = {'total': 0, 'successful': 0, 'failed': 0}
+        event_types[event_type]['total'] += count
+        total_events += count
+        if success:
+            event_types[event_type]['successful'] += count
+            successful_events += count
+        else:
+            event_types[event_type]['failed'] += count
+        if event_type == 'UNAUTHORIZED_ACCESS':
+            unauthorized_access += count
+
+    failed_events = total_events - successful_events
+
+    # Security alerts
+    security_alerts = []
+    if failed_events > total_events * 0.1:  # More than 10% failure rate
+        security_alerts.append("High failure rate detected")
+
+    if unauthorized_access > 0:
+        security_alerts.append(f"{unauthorized_access} unauthorized access attempts")
+
+    return {
+        'total_events': total_events,
+        'successful_events': successful_events,
+        'failed_events': failed_events,
+        'success_rate': (successful_events / total_events * 100) if total_events > 0 else 0,
+        'event_types': event_types,
+        'security_alerts': security_alerts,
+        'time_period_hours': hours,
+        'generated_at': datetime.utcnow().isoformat()
+    }
+
+
+class SecurityMetrics:
+    """Per-minute ring of event counters plus a ring buffer of recent failures"""
+
+    def __init__(self, recent_failures_size=50, alerts_size=200):
+        self.pid = os.getpid()
+        self._lock = threading.Lock()
+        self._minutes = [None] * WINDOW_MINUTES    # minute number held by each slot
+        self._counts = [None] * WINDOW_MINUTES     # {(event_type, success): count} per slot
+        self._recent_failures = deque(maxlen=recent_failures_size)
+        self._alerts = deque(maxlen=alerts_size)
+        self._last_flush = 0.0
+        atexit.register(self.flush)
+
+    def record(self, event_type, success, record=None, now=None):
+        """Count one event (O(1)); failures are also kept in the recent ring"""
+        now = now or time.time()
+        minute = int(now // 60)
+        slot = minute % WINDOW_MINUTES
+        key = (event_type, bool(success))
+
+        with self._lock:
+            if self._minutes[slot] != minute:
+                self._minutes[slot] = minute
+                self._counts[slot] = {}
+            counts = self._counts[slot]
+            counts[key] = counts.get(key, 0) + 1
+
+            if not success and record is not None:
+                self._recent_failures.append(record)
+
+        if now - self._last_flush >= Config.SECURITY_METRICS_FLUSH_SECONDS:
+            self.flush(now)
+
+    def record_alert(self, alert, now=None):
+        """Keep a detector alert; other workers see it with the next flush"""
+        now = now or time.time()
+        with self._lock:
+            self._alerts.append(alert)
+
+        if now - self._last_flush >= Config.SECURITY_METRICS_FLUSH_SECONDS:
+            self.flush(now)
+
+    def _snapshot(self, now):
+        """Live buckets still inside the window, keyed by minute"""
+        oldest_minute = int(now // 60) - WINDOW_MINUTES + 1
+        with self._lock:
+            buckets = {
+                str(minute): {f'{event_type}|{int(success)}': count for (event_type, success), count in counts.items()}
+                for minute, counts in zip(self._minutes, self._counts)
+                if minute is not None and minute >= oldest_minute
+            }
+            recent_failures = list(self._recent_failures)
+            alerts = list(self._alerts)
+        return {'pid': self.pid, 'written_at': now, 'buckets': buckets,
+                'recent_failures': recent_failures, 'alerts': alerts}
+
+    def flush(self, now=None):
+        """Write this worker's snapshot for the other workers to merge"""
+        now = now or time.time()
+        self._last_flush = now
+        try:
+            os.makedirs(Config.SECURITY_METRICS_DIR, exist_ok=True)
+            path = os.path.join(Config.SECURITY_METRICS_DIR, f'metrics-{self.pid}.json')
+            tmp_path = f'{path}.tmp'
+            with open(tmp_path, 'w') as f:
+                json.dump(self._snapshot(now), f)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"Security metrics flush failed: {str(e)}")
+
+    def _all_snapshots(self, now):
+        """This worker's live snapshot plus the latest one of every other worker"""
+        snapshots = [self._snapshot(now)]
+        directory = Config.SECURITY_METRICS_DIR
+        if not os.path.isdir(directory):
+            return snapshots
+
+        for name in os.listdir(directory):
+            match = _SNAPSHOT_NAME.match(name)
+            if not match or int(match.group(1)) == self.pid:
+                continue
+            path = os.path.join(directory, name)
+            try:
+                with open(path) as f:
+                    snapshot = json.load(f)
+            except (OSError, ValueError):
+                continue
+            # Snapshots of long-gone workers no longer hold anything in the window
+            if now - snapshot.get('written_at', 0) > WINDOW_MINUTES * 60:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+                continue
+            snapshots.append(snapshot)
+        return snapshots
+
+    def get_summary(self, hours=24):
+        """Security summary for the last hours, merged across workers"""
+        hours = max(1, min(hours, WINDOW_MINUTES // 60))
+        now = time.time()
+        oldest_minute = int(now // 60) - hours * 60 + 1
+
+        totals = {}
+        for snapshot in self._all_snapshots(now):
+            for minute, counts in snapshot['buckets'].items():
+                if int(minute) < oldest_minute:
+                    continue
+                for key, count in counts.items():
+                    totals[key] = totals.get(key, 0) + count
+
+        counts = []
+        for key, count in totals.items():
+            event_type, success = key.rsplit('|', 1)
+            counts.append((event_type, success == '1', count))
+        return build_security_summary(counts, hours)
+
+    def get_recent_failures(self, hours=1, limit=10):
+        """Most recent failures within the last hours, merged across workers"""
+        since = (datetime.utcnow() - timedelta(hours=hours)).isoformat()
+        failures = [
+            failure
+            for snapshot in self._all_snapshots(time.time())
+            for failure in snapshot['recent_failures']
+            if (failure.get('created_at') or '') >= since
+        ]
+        failures.sort(key=lambda failure: failure['created_at'], reverse=True)
+        return failures[:limit]
+
+    def get_alerts(self, session_id=None, hours=24, limit=20):
+        """Most recent detector alerts (optionally for one session), merged across workers"""
+        since = (datetime.utcnow() - timedelta(hours=hours)).isoformat()
+        alerts = [
+            alert
+            for snapshot in self._all_snapshots(time.time())
+            for alert in snapshot.get('alerts', [])
+            if alert['created_at'] >= since and (session_id is None or alert['session_id'] == session_id)
+        ]
+        alerts.sort(key=lambda alert: alert['created_at'], reverse=True)
+        return alerts[:limit]
+
+
+_metrics = None
+_metrics_lock = threading.Lock()
+
+
+def get_security_metrics():
+    """The current process's metrics (recreated after a fork)"""
+    global _metrics
+    with _metrics_lock:
+        if _metrics is None or _metrics.pid != os.getpid():
+            _metrics = SecurityMetrics(Config.SECURITY_RECENT_FAILURES)
+        return _metrics
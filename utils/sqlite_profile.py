@@ -0,0 +1,50 @@
+"""
+SQLite Production Profile
+PRAGMAs applied to every new SQLite connection so two gunicorn workers can
+scan concurrently: WAL lets readers run alongside the writer, a busy timeout
+makes writers wait for the lock instead of failing with "database is locked",
+and synchronous=NORMAL (safe with WAL) avoids an fsync on every commit.
+"""
+from sqlalchemy import event
+from config import Config
+
+
+def sqlite_pragmas(profile=None):
+    """PRAGMA name -> value for a profile, Config.SQLITE_PROFILE by default (empty for 'default')"""
+    if (profile or Config.SQLITE_PROFILE) != 'production':
+        return {}
+    return {
+        'journal_mode': Config.SQLITE_JOURNAL_MODE,
+        'synchronous': Config.SQLITE_SYNCHRONOUS,
+        'busy_timeout': Config.SQLITE_BUSY_TIMEOUT_MS,
+        'mmap_size': Config.SQLITE_MMAP_SIZE,
+        'cache_size': -Config.SQLITE_CACHE_SIZE_KB,  # negative = KiB rather than pages
+        'temp_store': 'MEMORY',
+    }
+
+
+def install_sqlite_pragmas(engine, pragmas=None):
+    """Apply the PRAGMAs on every connection the engine opens (no-op for other backends)"""
+    if engine.dialect.name != 'sqlite':
+        return
+    pragmas = sqlite_pragmas() if pragmas is None else pragmas
+    if not pragmas:
+        return
+
+    @event.listens_for(engine, 'connect')
+    def apply_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas.items():
+                cursor.execute(f'PRAGMA {name}={value}')
+        finally:
+            cursor.close()
+
+
+def current_pragmas(engine):
+    """The PRAGMA values actually in effect on a connection (for diagnostics)"""
+    with engine.connect() as connection:
+        return {
+            name: connection.exec_driver_sql(f'PRAGMA {name}').scalar()
+            for name in ('journal_mode', 'synchronous', 'busy_timeout', 'mmap_size', 'cache_size')
+        }
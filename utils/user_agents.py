@@ -0,0 +1,120 @@
+"""
+User-Agent Dictionary
+Audit rows reference User-Agent strings by id in user_agents instead of
+storing the full string every time. Ids are resolved through a per-process
+LRU cache, so only the first sighting of a User-Agent touches the table.
+Ids are cached only once the looking-up transaction commits, so a rolled back
+insert never leaves the cache pointing at a missing row.
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+from sqlalchemy import event
+from sqlalchemy.exc import IntegrityError
+from models import db, UserAgent
+from config import Config
+
+
+class UserAgentCache:
+    """Thread-safe LRU of sha256(user agent) -> user_agents.id"""
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, ua_hash):
+        with self._lock:
+            if ua_hash in self._entries:
+                self._entries.move_to_end(ua_hash)
+                self.hits += 1
+                return self._entries[ua_hash]
+            self.misses += 1
+            return None
+
+    def set(self, ua_hash, user_agent_id):
+        with self._lock:
+            self._entries[ua_hash] = user_agent_id
+            self._entries.move_to_end(ua_hash)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._entries), 'hits': self.hits, 'misses': self.misses}
+
+
+user_agent_cache = UserAgentCache(Config.USER_AGENT_CACHE_SIZE)
+
+# session.info key of ua_hash -> id looked up in the session's open transaction
+_PENDING_KEY = 'pending_user_agents'
+
+
+@event.listens_for(db.session, 'after_commit')
+def _cache_committed_user_agents(session):
+    # Also fires when a savepoint is released; only the outermost commit makes the rows durable
+    if session.in_nested_transaction():
+        return
+    for ua_hash, user_agent_id in session.info.pop(_PENDING_KEY, {}).items():
+        user_agent_cache.set(ua_hash, user_agent_id)
+
+
+@event.listens_for(db.session, 'after_rollback')
+def _drop_rolled_back_user_agents(session):
+    # Any rollback, even of an enclosing savepoint, may have taken the rows with it
+    session.info.pop(_PENDING_KEY, None)
+
+
+@event.listens_for(db.session, 'after_transaction_end')
+def _drop_uncommitted_user_agents(session, transaction):
+    # The transaction was closed without a commit (e.g. the request's session was removed)
+    if transaction.parent is None:
+        session.info.pop(_PENDING_KEY, None)
+
+
+def intern_user_agent(user_agent):
+    """
+    Get the user_agents id of a User-Agent string, adding it if new
+
+    The new row is flushed (not committed) inside a savepoint, so it is
+    committed together with the audit row that references it; its id is
+    cached when that commit happens.
+
+    Args:
+        user_agent: User-Agent header value
+
+    Returns:
+        int: user_agents.id, or None for an empty User-Agent
+    """
+    if not user_agent:
+        return None
+    user_agent = user_agent[:500]
+    ua_hash = hashlib.sha256(user_agent.encode('utf-8')).hexdigest()
+
+    user_agent_id = user_agent_cache.get(ua_hash)
+    if user_agent_id is not None:
+        return user_agent_id
+
+    pending = db.session.info.get(_PENDING_KEY, {})
+    if ua_hash in pending:
+        return pending[ua_hash]
+
+    row = UserAgent.query.filter_by(ua_hash=ua_hash).first()
+    if row is None:
+        try:
+            with db.session.begin_nested():
+                row = UserAgent(ua_hash=ua_hash, user_agent=user_agent)
+                db.session.add(row)
+        except IntegrityError:
+            # Another worker added it first
+            row = UserAgent.query.filter_by(ua_hash=ua_hash).first()
+
+    # The row may be this transaction's own uncommitted insert, so it is cached on commit
+    db.session.info.setdefault(_PENDING_KEY, {})[ua_hash] = row.id
+    return row.id